@@ -0,0 +1,53 @@
+# Per-state certificate number allocation in hi/lo blocks
+import os
+import asyncio
+from typing import Dict, List
+
+from pymongo import ReturnDocument
+
+CERTIFICATE_NUMBER_BLOCK_SIZE = int(os.environ.get('CERTIFICATE_NUMBER_BLOCK_SIZE', '100'))
+
+def format_certificate_number(state_code: str, number: int) -> str:
+    return f"DZ-{state_code}-{number:07d}"
+
+class CertificateNumberAllocator:
+    """Hand out certificate numbers from blocks reserved on ``certificate_counters``.
+
+    Each state's counter document, keyed by wilaya code, holds the highest
+    reserved number. A worker reserves a block with one atomic ``$inc`` and
+    serves numbers from memory until the block runs out, so concurrent
+    workers never share a number. Numbers left in a block when the process stops are
+    skipped; sequences are unique and increasing, not gap-free.
+    """
+
+    def __init__(self, db_client, block_size: int = CERTIFICATE_NUMBER_BLOCK_SIZE):
+        self.db = db_client.driving_school_platform
+        self.block_size = block_size
+        # state code -> [next number to hand out, last number of the reserved block]
+        self._blocks: Dict[str, List[int]] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    async def _reserve(self, state_code: str, size: int) -> List[int]:
+        counter = await self.db.certificate_counters.find_one_and_update(
+            {"_id": state_code},
+            {"$inc": {"next": size}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        return [counter["next"] - size + 1, counter["next"]]
+
+    async def allocate(self, state_code: str, count: int = 1) -> List[str]:
+        """Return ``count`` unused numbers for a state, reserving blocks as needed"""
+        lock = self._locks.setdefault(state_code, asyncio.Lock())
+        numbers = []
+        async with lock:
+            while len(numbers) < count:
+                block = self._blocks.get(state_code)
+                if block is None or block[0] > block[1]:
+                    # Large requests reserve what they need in a single round trip
+                    block = await self._reserve(state_code, max(self.block_size, count - len(numbers)))
+                    self._blocks[state_code] = block
+                take = min(count - len(numbers), block[1] - block[0] + 1)
+                numbers.extend(range(block[0], block[0] + take))
+                block[0] += take
+        return [format_certificate_number(state_code, number) for number in numbers]
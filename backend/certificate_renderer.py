@@ -0,0 +1,309 @@
+# Certificate PDF rendering on a process pool
+import io
+import os
+import math
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+from reportlab.graphics import renderPDF
+from reportlab.graphics.barcode.qr import QrCodeWidget
+from reportlab.graphics.shapes import Drawing
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.units import inch
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+
+CERTIFICATE_WORKERS = int(os.environ.get('CERTIFICATE_WORKERS', str(min(4, os.cpu_count() or 1))))
+
+PAGE_WIDTH, PAGE_HEIGHT = A4
+CENTER_X = PAGE_WIDTH / 2
+TABLE_LABELS = ["Certificate Number:", "Issue Date:", "Valid Until:", "Student ID:", "School Location:"]
+
+# The standard PDF fonts have no Arabic glyphs; DejaVu Sans does and ships with matplotlib
+ARABIC_FONT_NAME = "DejaVuSans"
+ARABIC_FONT_PATHS = [
+    os.environ.get('CERTIFICATE_ARABIC_FONT', ''),
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+]
+ARABIC_SUBTITLE = "شهادة رخصة القيادة"
+
+ALGERIA_GREEN = colors.HexColor("#006233")
+ALGERIA_RED = colors.HexColor("#D21034")
+
+# Presentation forms of each Arabic letter as (first form, joins to the next letter);
+# the forms follow in the order isolated, final, initial, medial
+_ARABIC_FORMS = {
+    "\u0627": (0xFE8D, False), "\u0628": (0xFE8F, True), "\u0629": (0xFE93, False), "\u062A": (0xFE95, True),
+    "\u062B": (0xFE99, True), "\u062C": (0xFE9D, True), "\u062D": (0xFEA1, True), "\u062E": (0xFEA5, True),
+    "\u062F": (0xFEA9, False), "\u0630": (0xFEAB, False), "\u0631": (0xFEAD, False), "\u0632": (0xFEAF, False),
+    "\u0633": (0xFEB1, True), "\u0634": (0xFEB5, True), "\u0635": (0xFEB9, True), "\u0636": (0xFEBD, True),
+    "\u0637": (0xFEC1, True), "\u0638": (0xFEC5, True), "\u0639": (0xFEC9, True), "\u063A": (0xFECD, True),
+    "\u0641": (0xFED1, True), "\u0642": (0xFED5, True), "\u0643": (0xFED9, True), "\u0644": (0xFEDD, True),
+    "\u0645": (0xFEE1, True), "\u0646": (0xFEE5, True), "\u0647": (0xFEE9, True), "\u0648": (0xFEED, False),
+    "\u0649": (0xFEEF, False), "\u064A": (0xFEF1, True),
+}
+_LAM, _ALEF = "\u0644", "\u0627"
+
+def shape_arabic(text: str) -> str:
+    """Contextual letter forms in visual (left to right) order for an Arabic-only line.
+
+    ReportLab draws code points as given and does not shape right-to-left
+    text, so the glyph for each letter's position in its word is picked here.
+    """
+    shaped = []
+    i = 0
+    joined_from_right = False
+    while i < len(text):
+        char = text[i]
+        if char == _LAM and i + 1 < len(text) and text[i + 1] == _ALEF:
+            # Lam-alef ligature, which never joins the following letter
+            shaped.append(chr(0xFEFC if joined_from_right else 0xFEFB))
+            joined_from_right = False
+            i += 2
+            continue
+        if char not in _ARABIC_FORMS:
+            shaped.append(char)
+            joined_from_right = False
+            i += 1
+            continue
+        first, dual = _ARABIC_FORMS[char]
+        next_char = text[i + 1] if i + 1 < len(text) else ""
+        joins_left = dual and next_char in _ARABIC_FORMS
+        # isolated, final, initial or medial
+        shaped.append(chr(first + (1 if joined_from_right else 0) + (2 if joins_left else 0)))
+        joined_from_right = joins_left
+        i += 1
+    return "".join(reversed(shaped))
+
+def _register_arabic_font() -> bool:
+    paths = list(ARABIC_FONT_PATHS)
+    try:
+        import matplotlib
+        paths.append(os.path.join(matplotlib.get_data_path(), "fonts", "ttf", "DejaVuSans.ttf"))
+    except ImportError:
+        pass
+    for path in paths:
+        if path and os.path.exists(path):
+            pdfmetrics.registerFont(TTFont(ARABIC_FONT_NAME, path))
+            return True
+    return False
+
+class CertificateLayout:
+    """Positions and static text of the certificate, computed once per process.
+
+    Only the student specific fields are laid out per certificate; the rest
+    is replayed from this precomputed list of drawing operations.
+    """
+
+    def __init__(self):
+        self.static_text = []
+        top = PAGE_HEIGHT - 72
+
+        # (text, font, size, color, y) of the fixed lines, centered on the page
+        for text, font, size, color, offset in [
+            ("REPUBLIC OF ALGERIA", "Helvetica-Bold", 24, colors.darkblue, 24),
+            ("MINISTRY OF TRANSPORT", "Helvetica-Bold", 18, colors.blue, 70),
+            ("DRIVING LICENSE CERTIFICATE", "Helvetica-Bold", 24, colors.darkblue, 140),
+            ("Scan QR Code to Verify Certificate:", "Helvetica", 12, colors.black, 560),
+            ("Authorized by the Ministry of Transport, Algeria", "Helvetica", 12, colors.black, 700),
+            ("This certificate is valid for 5 years from the date of issue.", "Helvetica", 12, colors.black, 718),
+        ]:
+            self.static_text.append((CENTER_X - stringWidth(text, font, size) / 2, top - offset, text, font, size, color))
+
+        if _register_arabic_font():
+            subtitle = shape_arabic(ARABIC_SUBTITLE)
+            self.static_text.append((
+                CENTER_X - stringWidth(subtitle, ARABIC_FONT_NAME, 18) / 2, top - 170,
+                subtitle, ARABIC_FONT_NAME, 18, colors.blue
+            ))
+
+        # Flag to the left of the first title line
+        self.flag_height = 20
+        self.flag_width = 30
+        title_x, title_y = self.static_text[0][0], self.static_text[0][1]
+        self.flag_x = title_x - self.flag_width - 10
+        self.flag_y = title_y - 3
+
+        self.body_y = [top - 220, top - 238]
+
+        # Details table: label column, value column and row baselines
+        self.table_x = CENTER_X - 2.5 * inch
+        self.table_label_width = 2 * inch
+        self.table_value_width = 3 * inch
+        self.row_height = 28
+        self.table_top = top - 280
+        self.row_y = [self.table_top - (i + 1) * self.row_height for i in range(len(TABLE_LABELS))]
+
+        self.qr_size = 100
+        self.qr_x = CENTER_X - self.qr_size / 2
+        self.qr_y = top - 680
+
+    def draw_static(self, pdf: canvas.Canvas):
+        for x, y, text, font, size, color in self.static_text:
+            pdf.setFont(font, size)
+            pdf.setFillColor(color)
+            pdf.drawString(x, y, text)
+
+        self.draw_flag(pdf)
+
+        # Table grid with the label column shaded
+        pdf.setStrokeColor(colors.black)
+        pdf.setLineWidth(1)
+        for y in self.row_y:
+            pdf.setFillColor(colors.lightblue)
+            pdf.rect(self.table_x, y, self.table_label_width, self.row_height, stroke=1, fill=1)
+            pdf.setFillColor(colors.white)
+            pdf.rect(self.table_x + self.table_label_width, y, self.table_value_width, self.row_height, stroke=1, fill=1)
+
+        pdf.setFillColor(colors.black)
+        pdf.setFont("Helvetica", 10)
+        for label, y in zip(TABLE_LABELS, self.row_y):
+            pdf.drawString(self.table_x + 6, y + 10, label)
+
+    def draw_flag(self, pdf: canvas.Canvas):
+        """Algerian flag as vector shapes: green and white halves, red crescent and star"""
+        x, y, width, height = self.flag_x, self.flag_y, self.flag_width, self.flag_height
+        pdf.saveState()
+        pdf.setLineWidth(0.5)
+        pdf.setStrokeColor(colors.grey)
+        pdf.setFillColor(ALGERIA_GREEN)
+        pdf.rect(x, y, width / 2, height, stroke=0, fill=1)
+        pdf.setFillColor(colors.white)
+        pdf.rect(x + width / 2, y, width / 2, height, stroke=0, fill=1)
+        pdf.rect(x, y, width, height, stroke=1, fill=0)
+
+        # Crescent: the outer circle minus an inner circle shifted toward the fly
+        cx, cy = x + width / 2, y + height / 2
+        outer, inner, shift = height * 0.3, height * 0.24, height * 0.09
+        meet_x = (outer ** 2 - inner ** 2 + shift ** 2) / (2 * shift)
+        meet_y = math.sqrt(outer ** 2 - meet_x ** 2)
+        outer_angle = math.degrees(math.atan2(meet_y, meet_x))
+        inner_angle = math.degrees(math.atan2(meet_y, meet_x - shift))
+        path = pdf.beginPath()
+        path.arc(cx - outer, cy - outer, cx + outer, cy + outer, outer_angle, 360 - 2 * outer_angle)
+        path.arcTo(cx + shift - inner, cy - inner, cx + shift + inner, cy + inner, -inner_angle, -(360 - 2 * inner_angle))
+        path.close()
+        pdf.setFillColor(ALGERIA_RED)
+        pdf.drawPath(path, stroke=0, fill=1)
+
+        # Five-pointed star inside the crescent's opening
+        star_x, star_y = cx + height * 0.12, cy
+        star_outer, star_inner = height * 0.13, height * 0.05
+        path = pdf.beginPath()
+        for point in range(10):
+            radius = star_outer if point % 2 == 0 else star_inner
+            angle = math.radians(180 + point * 36)
+            px, py = star_x + radius * math.cos(angle), star_y + radius * math.sin(angle)
+            if point == 0:
+                path.moveTo(px, py)
+            else:
+                path.lineTo(px, py)
+        path.close()
+        pdf.drawPath(path, stroke=0, fill=1)
+        pdf.restoreState()
+
+_layout: Optional[CertificateLayout] = None
+
+def _get_layout() -> CertificateLayout:
+    global _layout
+    if _layout is None:
+        _layout = CertificateLayout()
+    return _layout
+
+def _centered(pdf: canvas.Canvas, y: float, parts: List[tuple]):
+    """Draw (text, font) runs at 12pt as one centered line"""
+    width = sum(stringWidth(text, font, 12) for text, font in parts)
+    x = CENTER_X - width / 2
+    for text, font in parts:
+        pdf.setFont(font, 12)
+        pdf.drawString(x, y, text)
+        x += stringWidth(text, font, 12)
+
+def render_certificate(data: Dict) -> bytes:
+    """Render one certificate PDF. Runs in a worker process.
+
+    ``data`` holds student_name, school_name, certificate_number,
+    issue_date, expiry_date, student_id, school_location and optionally
+    qr_payload (defaults to ``VERIFY:<certificate_number>``).
+    """
+    layout = _get_layout()
+    buffer = io.BytesIO()
+    # invariant: byte-identical output for identical data, so re-renders dedupe in storage
+    pdf = canvas.Canvas(buffer, pagesize=A4, pageCompression=1, invariant=1)
+    pdf.setTitle(f"Certificate {data['certificate_number']}")
+
+    layout.draw_static(pdf)
+
+    pdf.setFillColor(colors.black)
+    _centered(pdf, layout.body_y[0], [
+        ("This certifies that ", "Helvetica"),
+        (data["student_name"], "Helvetica-Bold"),
+        (" has successfully completed", "Helvetica")
+    ])
+    _centered(pdf, layout.body_y[1], [
+        ("the comprehensive driving education program at ", "Helvetica"),
+        (data["school_name"], "Helvetica-Bold")
+    ])
+
+    values = [
+        data["certificate_number"],
+        data["issue_date"].strftime('%B %d, %Y'),
+        data["expiry_date"].strftime('%B %d, %Y'),
+        data["student_id"],
+        data["school_location"]
+    ]
+    pdf.setFont("Helvetica", 10)
+    for value, y in zip(values, layout.row_y):
+        pdf.drawString(layout.table_x + layout.table_label_width + 6, y + 10, str(value))
+
+    # Vector QR code: no PNG encode/decode round trip
+    widget = QrCodeWidget(data.get("qr_payload") or f"VERIFY:{data['certificate_number']}")
+    x1, y1, x2, y2 = widget.getBounds()
+    drawing = Drawing(layout.qr_size, layout.qr_size, transform=[
+        layout.qr_size / (x2 - x1), 0, 0, layout.qr_size / (y2 - y1), 0, 0
+    ])
+    drawing.add(widget)
+    renderPDF.draw(drawing, pdf, layout.qr_x, layout.qr_y)
+
+    pdf.showPage()
+    pdf.save()
+    return buffer.getvalue()
+
+def render_certificates(items: List[Dict]) -> List[bytes]:
+    """Render several certificates in one worker call to amortize the IPC"""
+    return [render_certificate(data) for data in items]
+
+class CertificateRenderer:
+    """Render certificates off the event loop in a lazily started process pool"""
+
+    def __init__(self, max_workers: int = CERTIFICATE_WORKERS):
+        self.max_workers = max_workers
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._executor
+
+    async def render(self, data: Dict) -> bytes:
+        return await asyncio.get_running_loop().run_in_executor(self._get_executor(), render_certificate, data)
+
+    async def render_many(self, items: List[Dict], chunk_size: int = 20) -> List[bytes]:
+        """Render many certificates in parallel, in chunks spread over the workers"""
+        loop = asyncio.get_running_loop()
+        chunks = [items[i:i + chunk_size] for i in range(0, len(items), chunk_size)]
+        results = await asyncio.gather(*(
+            loop.run_in_executor(self._get_executor(), render_certificates, chunk) for chunk in chunks
+        ))
+        return [pdf for chunk in results for pdf in chunk]
+
+    def shutdown(self):
+        if self._executor:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+certificate_renderer = CertificateRenderer()
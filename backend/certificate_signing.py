@@ -0,0 +1,137 @@
+# Signed certificate payloads for QR verification without database access
+import os
+import hmac
+import base64
+import asyncio
+import hashlib
+import logging
+from datetime import datetime
+from typing import Optional, Set
+
+logger = logging.getLogger(__name__)
+
+PAYLOAD_VERSION = "1"
+# Truncated HMAC-SHA256; 128 bits keeps the QR code small and is ample against forgery
+SIGNATURE_BYTES = 16
+
+class InvalidCertificateToken(ValueError):
+    pass
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+def _b64decode(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+class CertificateSigner:
+    """Create and check compact HMAC-signed certificate tokens.
+
+    A token is ``<payload>.<signature>`` where the payload is the
+    URL-safe base64 of ``version|id|number|holder|issued|expires`` with
+    dates as YYYYMMDD.
+    """
+
+    def __init__(self, key: str):
+        self.key = key.encode()
+
+    def _signature(self, payload: bytes) -> bytes:
+        return hmac.new(self.key, payload, hashlib.sha256).digest()[:SIGNATURE_BYTES]
+
+    def sign(self, certificate_id: str, certificate_number: str, holder_name: str,
+             issue_date: datetime, expiry_date: datetime) -> str:
+        fields = [
+            PAYLOAD_VERSION,
+            certificate_id,
+            certificate_number,
+            holder_name.replace("|", " "),
+            issue_date.strftime("%Y%m%d"),
+            expiry_date.strftime("%Y%m%d")
+        ]
+        payload = "|".join(fields).encode()
+        return f"{_b64encode(payload)}.{_b64encode(self._signature(payload))}"
+
+    def verify(self, token: str) -> dict:
+        """Return the signed fields, or raise InvalidCertificateToken"""
+        try:
+            encoded_payload, encoded_signature = token.strip().split(".")
+            payload = _b64decode(encoded_payload)
+            signature = _b64decode(encoded_signature)
+        except ValueError:
+            raise InvalidCertificateToken("Malformed certificate token")
+
+        if not hmac.compare_digest(signature, self._signature(payload)):
+            raise InvalidCertificateToken("Invalid certificate signature")
+
+        fields = payload.decode().split("|")
+        if len(fields) != 6 or fields[0] != PAYLOAD_VERSION:
+            raise InvalidCertificateToken("Unsupported certificate token")
+
+        return {
+            "certificate_id": fields[1],
+            "certificate_number": fields[2],
+            "student_name": fields[3],
+            "issue_date": datetime.strptime(fields[4], "%Y%m%d"),
+            "expiry_date": datetime.strptime(fields[5], "%Y%m%d")
+        }
+
+class RevocationList:
+    """In-memory set of revoked certificate ids, refreshed from MongoDB in the background.
+
+    Every worker keeps its own copy; revocations made elsewhere show up
+    after at most one refresh interval.
+    """
+
+    def __init__(self, refresh_seconds: int = 30):
+        self.refresh_seconds = refresh_seconds
+        self._revoked: Set[str] = set()
+        self._synced_at: Optional[datetime] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def __contains__(self, certificate_id: str) -> bool:
+        return certificate_id in self._revoked
+
+    def add(self, certificate_id: str):
+        self._revoked.add(certificate_id)
+
+    async def refresh(self, db):
+        """Load revocations since the last refresh (everything on the first run)"""
+        query = {"status": "revoked"}
+        started = datetime.utcnow()
+        if self._synced_at:
+            query["revoked_at"] = {"$gte": self._synced_at}
+        async for certificate in db.certificates.find(query, {"_id": 0, "id": 1}):
+            self._revoked.add(certificate["id"])
+        self._synced_at = started
+
+    async def start(self, db):
+        if self._task is None:
+            await self.refresh(db)
+            self._task = asyncio.create_task(self._run(db))
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self, db):
+        while True:
+            await asyncio.sleep(self.refresh_seconds)
+            try:
+                await self.refresh(db)
+            except Exception as e:
+                logger.error(f"Certificate revocation refresh error: {str(e)}")
+
+certificate_signer = CertificateSigner(
+    os.environ.get('CERTIFICATE_SIGNING_KEY') or os.environ.get('SECRET_KEY', 'your-secret-key-here')
+)
+revocation_list = RevocationList(int(os.environ.get('CERTIFICATE_REVOCATION_REFRESH_SECONDS', '30')))
+
+# Where QR codes point; the token is appended as ?token=
+CERTIFICATE_VERIFY_URL = os.environ.get('CERTIFICATE_VERIFY_URL', '')
+
+def certificate_qr_content(token: str) -> str:
+    return f"{CERTIFICATE_VERIFY_URL}?token={token}" if CERTIFICATE_VERIFY_URL else token
@@ -0,0 +1,188 @@
+# Course sequencing and session-completion progress, usable without the API app
+import uuid
+from datetime import datetime
+from enum import Enum
+from typing import List, Optional
+
+from pymongo import UpdateOne, ReturnDocument
+
+class CourseType(str, Enum):
+    THEORY = "theory"
+    PARK = "park"
+    ROAD = "road"
+
+class CourseStatus(str, Enum):
+    LOCKED = "locked"  # Can't start yet
+    AVAILABLE = "available"  # Can start
+    IN_PROGRESS = "in_progress"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+class ExamStatus(str, Enum):
+    NOT_AVAILABLE = "not_available"
+    AVAILABLE = "available"
+    PASSED = "passed"
+    FAILED = "failed"
+
+class SessionStatus(str, Enum):
+    SCHEDULED = "scheduled"
+    IN_PROGRESS = "in_progress"
+    COMPLETED = "completed"
+    CANCELLED = "cancelled"
+    NO_SHOW = "no_show"
+
+# Course sequence order
+COURSE_SEQUENCE = [CourseType.THEORY, CourseType.PARK, CourseType.ROAD]
+COURSE_SESSIONS = {CourseType.THEORY: 10, CourseType.PARK: 5, CourseType.ROAD: 15}
+
+def plan_enrollment_progression(courses: List[dict]) -> tuple:
+    """Compute every course transition of one enrollment in memory.
+
+    Courses are taken in COURSE_SEQUENCE order. A course unlocks once the
+    previous exam is passed, and completes when all its sessions are done,
+    which opens its exam. Returns ``(changes, certificate_eligible)`` with
+    changes mapping course ids to the fields to set.
+    """
+    order = {course_type: i for i, course_type in enumerate(COURSE_SEQUENCE)}
+    courses = sorted(courses, key=lambda x: order[x["course_type"]])
+
+    changes = {}
+    previous_passed = True  # First course (theory) is always available
+    for course in courses:
+        status = course["status"]
+        change = {}
+        if not previous_passed:
+            # Lock the course if previous not completed
+            if status != CourseStatus.LOCKED:
+                change["status"] = CourseStatus.LOCKED
+        else:
+            if status == CourseStatus.LOCKED:
+                status = change["status"] = CourseStatus.AVAILABLE
+            sessions_done = course["total_sessions"] > 0 and course["completed_sessions"] >= course["total_sessions"]
+            if sessions_done and status in (CourseStatus.AVAILABLE, CourseStatus.IN_PROGRESS):
+                change["status"] = CourseStatus.COMPLETED
+                if course["exam_status"] == ExamStatus.NOT_AVAILABLE:
+                    change["exam_status"] = ExamStatus.AVAILABLE
+
+        if change:
+            changes[course["id"]] = change
+        previous_passed = course["exam_status"] == ExamStatus.PASSED
+
+    certificate_eligible = (
+        [course["course_type"] for course in courses] == COURSE_SEQUENCE and
+        all(course["exam_status"] == ExamStatus.PASSED for course in courses)
+    )
+    return changes, certificate_eligible
+
+def build_sequential_courses(enrollment_id: str) -> List[dict]:
+    """Build the course documents of a new enrollment"""
+    now = datetime.utcnow()
+    courses = [
+        {
+            "id": str(uuid.uuid4()),
+            "enrollment_id": enrollment_id,
+            "course_type": course_type,
+            "status": CourseStatus.LOCKED,
+            "teacher_id": None,
+            "scheduled_sessions": [],
+            "completed_sessions": 0,
+            "total_sessions": COURSE_SESSIONS[course_type],
+            "exam_status": ExamStatus.NOT_AVAILABLE,
+            "exam_score": None,
+            "created_at": now,
+            "updated_at": now
+        }
+        for course_type in COURSE_SEQUENCE
+    ]
+
+    # The progression engine decides which course starts available
+    changes, _ = plan_enrollment_progression(courses)
+    for course in courses:
+        course.update(changes.get(course["id"], {}))
+    return courses
+
+async def progress_enrollments(db, enrollment_ids: List[str]) -> List[str]:
+    """Apply the course transitions of many enrollments with one read and one bulk write.
+
+    Returns the ids of enrollments whose courses are all passed.
+    """
+    courses_by_enrollment = {}
+    async for course in db.courses.find({"enrollment_id": {"$in": list(enrollment_ids)}}):
+        courses_by_enrollment.setdefault(course["enrollment_id"], []).append(course)
+
+    now = datetime.utcnow()
+    updates = []
+    eligible = []
+    for enrollment_id, courses in courses_by_enrollment.items():
+        changes, certificate_eligible = plan_enrollment_progression(courses)
+        updates.extend(
+            UpdateOne({"id": course_id}, {"$set": {**change, "updated_at": now}})
+            for course_id, change in changes.items()
+        )
+        if certificate_eligible:
+            eligible.append(enrollment_id)
+
+    if updates:
+        await db.courses.bulk_write(updates, ordered=False)
+    return eligible
+
+async def advance_course_progress(db, course_id: str) -> Optional[dict]:
+    """Count one completed session in a single atomic update.
+
+    The course is marked completed and its exam opened by the same update
+    once the threshold is reached, so concurrent completions never lose
+    an increment. As in ``plan_enrollment_progression`` only available or
+    in-progress courses count sessions; locked, completed or failed courses
+    and courses with every session done are not matched, so the count
+    never exceeds ``total_sessions``. None is returned then and for unknown
+    courses. Otherwise returns the updated course with ``just_completed``
+    set for the one call that reached the threshold.
+    """
+    reached = {"$gte": [{"$add": ["$completed_sessions", 1]}, "$total_sessions"]}
+    course = await db.courses.find_one_and_update(
+        {
+            "id": course_id,
+            "status": {"$in": [CourseStatus.AVAILABLE, CourseStatus.IN_PROGRESS]},
+            "$expr": {"$lt": ["$completed_sessions", "$total_sessions"]}
+        },
+        [{"$set": {
+            "completed_sessions": {"$add": ["$completed_sessions", 1]},
+            "status": {"$cond": [reached, CourseStatus.COMPLETED, "$status"]},
+            "exam_status": {"$cond": [
+                {"$and": [reached, {"$eq": ["$exam_status", ExamStatus.NOT_AVAILABLE]}]},
+                ExamStatus.AVAILABLE,
+                "$exam_status"
+            ]},
+            "updated_at": datetime.utcnow()
+        }}],
+        return_document=ReturnDocument.AFTER
+    )
+    if course:
+        # Increments are serialized on the document, so exactly one caller sees the threshold itself
+        course["just_completed"] = course["completed_sessions"] == course["total_sessions"]
+    return course
+
+async def record_session_completion(db, session_id: str, notes: str = "") -> Optional[dict]:
+    """Mark a session completed and count it towards its course.
+
+    The session is claimed with a conditional update, so repeated or
+    concurrent requests count it once. Returns the session as it was
+    before completion, or None when it is unknown or already completed.
+    """
+    session = await db.sessions.find_one_and_update(
+        {"id": session_id, "status": {"$ne": SessionStatus.COMPLETED}},
+        {
+            "$set": {
+                "status": SessionStatus.COMPLETED,
+                "notes": notes,
+                "updated_at": datetime.utcnow()
+            }
+        }
+    )
+    if not session:
+        return None
+
+    course = await advance_course_progress(db, session["course_id"])
+    if course and course["just_completed"]:
+        await progress_enrollments(db, [course["enrollment_id"]])
+    return session
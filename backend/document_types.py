@@ -0,0 +1,27 @@
+# Document types and the per-user document bitmasks derived from them
+from enum import Enum
+
+class DocumentType(str, Enum):
+    PROFILE_PHOTO = "profile_photo"
+    ID_CARD = "id_card"
+    MEDICAL_CERTIFICATE = "medical_certificate"
+    DRIVING_LICENSE = "driving_license"
+    TEACHING_LICENSE = "teaching_license"
+
+# One bit per document type for the per-user document masks; new types must be appended
+DOCUMENT_TYPE_BITS = {doc_type.value: 1 << i for i, doc_type in enumerate(DocumentType)}
+
+def document_mask(document_types) -> int:
+    """Combine document types into a bitmask"""
+    mask = 0
+    for document_type in document_types:
+        mask |= DOCUMENT_TYPE_BITS[document_type]
+    return mask
+
+def verified_mask_expression() -> dict:
+    """Aggregation expression deriving ``verified_documents_mask`` from a user's
+    ``verified_document_ids`` (verified document ids per type)"""
+    return {"$add": [
+        {"$cond": [{"$gt": [{"$size": {"$ifNull": [f"$verified_document_ids.{document_type}", []]}}, 0]}, bit, 0]}
+        for document_type, bit in DOCUMENT_TYPE_BITS.items()
+    ]}
@@ -7,12 +7,19 @@ from email.mime.base import MIMEBase
 from email import encoders
 from datetime import datetime, timedelta
 from typing import Optional, List, Dict
+from collections import deque
 import json
+import time
+import uuid
 import asyncio
 import logging
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne, UpdateMany
+from pymongo.errors import BulkWriteError
 from enum import Enum
 
+from notification_hub import notification_hub
+
 logger = logging.getLogger(__name__)
 
 class NotificationPriority(str, Enum):
@@ -27,7 +34,35 @@ class NotificationChannel(str, Enum):
     PUSH = "push"
     IN_APP = "in_app"
 
+class DeliveryRateLimiter:
+    """Sliding one-hour window of outbound deliveries per user and channel"""
+
+    def __init__(self, max_per_hour: int):
+        self.max_per_hour = max_per_hour
+        self._sent: Dict[tuple, deque] = {}
+
+    def allow(self, user_id: str, channel: str) -> bool:
+        """Record a delivery if the user is under the cap, otherwise refuse it"""
+        now = time.monotonic()
+        sent = self._sent.setdefault((user_id, channel), deque())
+        while sent and now - sent[0] > 3600:
+            sent.popleft()
+        if len(sent) >= self.max_per_hour:
+            return False
+        sent.append(now)
+        return True
+
+delivery_rate_limiter = DeliveryRateLimiter(int(os.environ.get('NOTIFICATION_MAX_DELIVERIES_PER_HOUR', '10')))
+
 class EnhancedNotificationService:
+    # Candidates processed per anti-join / insert_many round trip
+    REMINDER_BATCH_SIZE = int(os.environ.get('REMINDER_BATCH_SIZE', '1000'))
+    # Notifications delivered at the same time by _deliver_notifications
+    DELIVERY_CONCURRENCY = int(os.environ.get('NOTIFICATION_DELIVERY_CONCURRENCY', '20'))
+    # Read notifications older than this move to the cold archive
+    READ_RETENTION_DAYS = int(os.environ.get('NOTIFICATION_READ_RETENTION_DAYS', '30'))
+    ARCHIVE_BATCH_SIZE = int(os.environ.get('NOTIFICATION_ARCHIVE_BATCH_SIZE', '1000'))
+
     def __init__(self, db_client):
         self.db = db_client.driving_school_platform
         self.smtp_server = os.environ.get('SMTP_SERVER', 'smtp.gmail.com')
@@ -35,6 +70,13 @@ class EnhancedNotificationService:
         self.smtp_username = os.environ.get('SMTP_USERNAME')
         self.smtp_password = os.environ.get('SMTP_PASSWORD')
         self.from_email = os.environ.get('FROM_EMAIL', self.smtp_username)
+        
+        # Digest windows in seconds per channel; 0 sends each notification on its own
+        self.digest_windows = {
+            NotificationChannel.EMAIL.value: int(os.environ.get('NOTIFICATION_DIGEST_WINDOW_EMAIL', '0')),
+            NotificationChannel.SMS.value: int(os.environ.get('NOTIFICATION_DIGEST_WINDOW_SMS', '0')),
+            NotificationChannel.PUSH.value: int(os.environ.get('NOTIFICATION_DIGEST_WINDOW_PUSH', '0')),
+        }
 
     async def create_notification(
         self,
@@ -50,9 +92,52 @@ class EnhancedNotificationService:
     ) -> str:
         """Create an enhanced notification with multiple delivery channels"""
         
-        notification_id = str(__import__('uuid').uuid4())
+        notification_doc = self._build_notification_doc(
+            user_id=user_id,
+            notification_type=notification_type,
+            title=title,
+            message=message,
+            priority=priority,
+            channels=channels,
+            metadata=metadata,
+            scheduled_at=scheduled_at,
+            expires_at=expires_at
+        )
+        
+        await self.db.enhanced_notifications.insert_one(notification_doc)
+        notification_hub.publish(notification_doc, "enhanced_notifications")
+        
+        # If not scheduled for later, send immediately
+        if not scheduled_at or scheduled_at <= datetime.utcnow():
+            await self._deliver_notification(notification_doc)
+        
+        return notification_doc["id"]
+
+    async def create_notifications(self, notifications: List[Dict]) -> int:
+        """Create many notifications in one insert and deliver them in bulk.
+
+        Each item takes the keyword arguments of ``create_notification``.
+        """
+        docs = [self._build_notification_doc(**notification) for notification in notifications]
+        return await self._insert_and_deliver(docs)
+
+    def _build_notification_doc(
+        self,
+        user_id: str,
+        notification_type: str,
+        title: str,
+        message: str,
+        priority: NotificationPriority = NotificationPriority.MEDIUM,
+        channels: List[NotificationChannel] = [NotificationChannel.IN_APP],
+        metadata: Optional[Dict] = None,
+        scheduled_at: Optional[datetime] = None,
+        expires_at: Optional[datetime] = None,
+        idempotency_key: Optional[str] = None
+    ) -> dict:
+        """Build a notification document without storing it"""
+        now = datetime.utcnow()
         notification_doc = {
-            "id": notification_id,
+            "id": str(uuid.uuid4()),
             "user_id": user_id,
             "type": notification_type,
             "title": title,
@@ -63,38 +148,82 @@ class EnhancedNotificationService:
             "is_read": False,
             "is_delivered": False,
             "delivery_status": {},
-            "scheduled_at": scheduled_at or datetime.utcnow(),
+            "scheduled_at": scheduled_at or now,
             "expires_at": expires_at,
-            "created_at": datetime.utcnow(),
-            "updated_at": datetime.utcnow()
+            "created_at": now,
+            "updated_at": now
         }
-        
-        await self.db.enhanced_notifications.insert_one(notification_doc)
-        
-        # If not scheduled for later, send immediately
-        if not scheduled_at or scheduled_at <= datetime.utcnow():
-            await self._deliver_notification(notification_doc)
-        
-        return notification_id
+        if idempotency_key:
+            notification_doc["idempotency_key"] = idempotency_key
+        return notification_doc
 
     async def _deliver_notification(self, notification: dict):
         """Deliver notification through specified channels"""
-        delivery_status = {}
-        
         # Get user details
         user = await self.db.users.find_one({"id": notification["user_id"]})
         if not user:
             logger.error(f"User not found for notification {notification['id']}")
             return
         
+        delivery_status = await self._deliver_to_user(user, notification)
+        
+        # Update notification with delivery status
+        await self.db.enhanced_notifications.update_one(
+            {"id": notification["id"]},
+            {"$set": self._delivery_update(delivery_status)}
+        )
+
+    async def _deliver_notifications(self, notifications: list):
+        """Deliver many notifications with one user lookup and one status write"""
+        if not notifications:
+            return
+        
+        user_ids = list({notification["user_id"] for notification in notifications})
+        users_cursor = self.db.users.find({"id": {"$in": user_ids}})
+        users = {user["id"]: user async for user in users_cursor}
+        
+        # Channel sends run concurrently, bounded so a large batch cannot flood the providers
+        semaphore = asyncio.Semaphore(self.DELIVERY_CONCURRENCY)
+        
+        async def deliver(user: dict, notification: dict) -> UpdateOne:
+            async with semaphore:
+                delivery_status = await self._deliver_to_user(user, notification)
+            return UpdateOne(
+                {"id": notification["id"]},
+                {"$set": self._delivery_update(delivery_status)}
+            )
+        
+        deliveries = []
+        for notification in notifications:
+            user = users.get(notification["user_id"])
+            if not user:
+                logger.error(f"User not found for notification {notification['id']}")
+                continue
+            deliveries.append(deliver(user, notification))
+        
+        updates = await asyncio.gather(*deliveries)
+        if updates:
+            await self.db.enhanced_notifications.bulk_write(updates, ordered=False)
+
+    async def _deliver_to_user(self, user: dict, notification: dict) -> dict:
+        """Deliver a notification to an already loaded user, returning per-channel status"""
+        delivery_status = {}
+        
         # Deliver through each channel
         for channel in notification["channels"]:
+            if not self._can_reach(user, channel):
+                # No address for this channel: neither deferred nor counted against the rate cap
+                continue
             try:
-                if channel == NotificationChannel.EMAIL and user.get("email"):
+                if channel != NotificationChannel.IN_APP and self._should_defer(user, channel, notification):
+                    # Picked up by flush_digests and coalesced with the user's other pending items
+                    delivery_status[channel] = {"success": False, "digest_pending": True, "queued_at": datetime.utcnow()}
+                
+                elif channel == NotificationChannel.EMAIL:
                     success = await self._send_email(user, notification)
                     delivery_status[channel] = {"success": success, "delivered_at": datetime.utcnow()}
                 
-                elif channel == NotificationChannel.SMS and user.get("phone"):
+                elif channel == NotificationChannel.SMS:
                     success = await self._send_sms(user, notification)
                     delivery_status[channel] = {"success": success, "delivered_at": datetime.utcnow()}
                 
@@ -110,17 +239,32 @@ class EnhancedNotificationService:
                 logger.error(f"Failed to deliver notification via {channel}: {str(e)}")
                 delivery_status[channel] = {"success": False, "error": str(e)}
         
-        # Update notification with delivery status
-        await self.db.enhanced_notifications.update_one(
-            {"id": notification["id"]},
-            {
-                "$set": {
-                    "is_delivered": any(status.get("success", False) for status in delivery_status.values()),
-                    "delivery_status": delivery_status,
-                    "updated_at": datetime.utcnow()
-                }
-            }
-        )
+        return delivery_status
+
+    def _can_reach(self, user: dict, channel: NotificationChannel) -> bool:
+        """Whether the user has the contact detail a channel needs"""
+        if channel == NotificationChannel.EMAIL:
+            return bool(user.get("email"))
+        if channel == NotificationChannel.SMS:
+            return bool(user.get("phone"))
+        return True
+
+    def _should_defer(self, user: dict, channel: NotificationChannel, notification: dict) -> bool:
+        """Decide whether a channel delivery goes into the user's digest instead of out now"""
+        if notification["priority"] == NotificationPriority.URGENT:
+            return False
+        if self.digest_windows.get(NotificationChannel(channel).value, 0) > 0:
+            return True
+        # No digest window: send now unless the user hit the per-channel rate cap
+        return not delivery_rate_limiter.allow(user["id"], NotificationChannel(channel).value)
+
+    def _delivery_update(self, delivery_status: dict) -> dict:
+        """Build the $set document recording a delivery attempt"""
+        return {
+            "is_delivered": any(status.get("success", False) for status in delivery_status.values()),
+            "delivery_status": delivery_status,
+            "updated_at": datetime.utcnow()
+        }
 
     async def _send_email(self, user: dict, notification: dict) -> bool:
         """Send email notification"""
@@ -128,59 +272,53 @@ class EnhancedNotificationService:
             logger.warning("SMTP credentials not configured")
             return False
         
+        # Create HTML email body
+        html_body = self._create_email_template(user, notification)
+        msg = self._build_email_message(user, f"🚗 {notification['title']} - Driving School Platform", html_body)
+        
+        results = await asyncio.to_thread(self._smtp_send, [msg])
+        return results[0]
+
+    def _build_email_message(self, user: dict, subject: str, html_body: str) -> MIMEMultipart:
+        msg = MIMEMultipart()
+        msg['From'] = self.from_email
+        msg['To'] = user["email"]
+        msg['Subject'] = subject
+        msg.attach(MIMEText(html_body, 'html'))
+        return msg
+
+    def _smtp_send(self, messages: List[MIMEMultipart]) -> List[bool]:
+        """Send messages over a single SMTP connection (blocking, run in a thread)"""
+        sent = [False] * len(messages)
         try:
-            msg = MIMEMultipart()
-            msg['From'] = self.from_email
-            msg['To'] = user["email"]
-            msg['Subject'] = f"🚗 {notification['title']} - Driving School Platform"
-            
-            # Create HTML email body
-            html_body = self._create_email_template(user, notification)
-            msg.attach(MIMEText(html_body, 'html'))
-            
             # Connect and send email
             server = smtplib.SMTP(self.smtp_server, self.smtp_port)
             server.starttls()
             server.login(self.smtp_username, self.smtp_password)
-            text = msg.as_string()
-            server.sendmail(self.from_email, user["email"], text)
+            for i, msg in enumerate(messages):
+                try:
+                    server.sendmail(self.from_email, msg['To'], msg.as_string())
+                    sent[i] = True
+                    logger.info(f"Email sent successfully to {msg['To']}")
+                except Exception as e:
+                    logger.error(f"Failed to send email to {msg['To']}: {str(e)}")
             server.quit()
-            
-            logger.info(f"Email sent successfully to {user['email']}")
-            return True
-            
         except Exception as e:
             logger.error(f"Failed to send email: {str(e)}")
-            return False
+        return sent
+
+    PRIORITY_COLORS = {
+        "low": "#28a745",
+        "medium": "#ffc107",
+        "high": "#fd7e14",
+        "urgent": "#dc3545"
+    }
 
     def _create_email_template(self, user: dict, notification: dict) -> str:
         """Create HTML email template"""
-        priority_colors = {
-            "low": "#28a745",
-            "medium": "#ffc107", 
-            "high": "#fd7e14",
-            "urgent": "#dc3545"
-        }
-        
-        priority_color = priority_colors.get(notification["priority"], "#007bff")
+        priority_color = self.PRIORITY_COLORS.get(notification["priority"], "#007bff")
         
-        template = f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <meta charset="utf-8">
-            <meta name="viewport" content="width=device-width, initial-scale=1.0">
-            <title>{notification['title']}</title>
-        </head>
-        <body style="font-family: Arial, sans-serif; margin: 0; padding: 20px; background-color: #f4f4f4;">
-            <div style="max-width: 600px; margin: 0 auto; background-color: white; border-radius: 8px; overflow: hidden; box-shadow: 0 2px 10px rgba(0,0,0,0.1);">
-                
-                <!-- Header -->
-                <div style="background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); color: white; padding: 30px; text-align: center;">
-                    <h1 style="margin: 0; font-size: 28px;">🚗 Driving School Platform</h1>
-                    <p style="margin: 10px 0 0 0; opacity: 0.9;">مدرسة تعليم القيادة الجزائرية</p>
-                </div>
-                
+        content = f"""
                 <!-- Priority Badge -->
                 <div style="padding: 20px; border-left: 4px solid {priority_color}; background-color: #f8f9fa;">
                     <div style="display: inline-block; background-color: {priority_color}; color: white; padding: 4px 12px; border-radius: 12px; font-size: 12px; font-weight: bold; text-transform: uppercase;">
@@ -196,7 +334,49 @@ class EnhancedNotificationService:
                     <!-- Metadata -->
                     {self._format_metadata_for_email(notification.get('metadata', {}))}
                 </div>
+        """
+        return self._render_email_layout(notification['title'], content)
+
+    def _create_digest_email_template(self, user: dict, notifications: list) -> str:
+        """Create one HTML email summarising several notifications"""
+        items = ""
+        for notification in notifications:
+            priority_color = self.PRIORITY_COLORS.get(notification["priority"], "#007bff")
+            items += f"""
+                    <div style="padding: 15px 20px; margin-bottom: 12px; border-left: 4px solid {priority_color}; background-color: #f8f9fa; border-radius: 4px;">
+                        <h3 style="color: #333; margin: 0 0 6px 0; font-size: 17px;">{notification['title']}</h3>
+                        <p style="color: #666; line-height: 1.5; margin: 0; font-size: 15px;">{notification['message']}</p>
+                    </div>"""
+        
+        title = f"You have {len(notifications)} new notifications"
+        content = f"""
+                <!-- Content -->
+                <div style="padding: 30px;">
+                    <h2 style="color: #333; margin-top: 0;">{title}</h2>
+                    {items}
+                </div>
+        """
+        return self._render_email_layout(title, content)
+
+    def _render_email_layout(self, title: str, content: str) -> str:
+        """Wrap email content in the platform header, call to action and footer"""
+        template = f"""
+        <!DOCTYPE html>
+        <html>
+        <head>
+            <meta charset="utf-8">
+            <meta name="viewport" content="width=device-width, initial-scale=1.0">
+            <title>{title}</title>
+        </head>
+        <body style="font-family: Arial, sans-serif; margin: 0; padding: 20px; background-color: #f4f4f4;">
+            <div style="max-width: 600px; margin: 0 auto; background-color: white; border-radius: 8px; overflow: hidden; box-shadow: 0 2px 10px rgba(0,0,0,0.1);">
                 
+                <!-- Header -->
+                <div style="background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); color: white; padding: 30px; text-align: center;">
+                    <h1 style="margin: 0; font-size: 28px;">🚗 Driving School Platform</h1>
+                    <p style="margin: 10px 0 0 0; opacity: 0.9;">مدرسة تعليم القيادة الجزائرية</p>
+                </div>
+                {content}
                 <!-- CTA Button -->
                 <div style="padding: 0 30px 30px;">
                     <a href="{os.environ.get('FRONTEND_URL', 'http://localhost:3000')}/dashboard" 
@@ -245,65 +425,234 @@ class EnhancedNotificationService:
         return True  # Simulated success
 
     async def schedule_reminders(self):
-        """Schedule automatic reminders for various events"""
+        """Schedule automatic reminders for various events.
+
+        Works set-wise: candidates are read in batches, anti-joined against
+        existing reminders with one ``$in`` query per batch, inserted with
+        ``insert_many`` and handed to bulk delivery.
+        """
         now = datetime.utcnow()
+        created = 0
         
         # Session reminders (24 hours before)
         tomorrow = now + timedelta(days=1)
-        sessions_cursor = self.db.sessions.find({
-            "scheduled_at": {
-                "$gte": tomorrow.replace(hour=0, minute=0, second=0),
-                "$lt": tomorrow.replace(hour=23, minute=59, second=59)
+        sessions_cursor = self.db.sessions.find(
+            {
+                "scheduled_at": {
+                    "$gte": tomorrow.replace(hour=0, minute=0, second=0),
+                    "$lt": tomorrow.replace(hour=23, minute=59, second=59)
+                },
+                "status": "scheduled"
             },
-            "status": "scheduled"
-        })
+            {"_id": 0, "id": 1, "student_id": 1, "session_type": 1, "scheduled_at": 1}
+        ).batch_size(self.REMINDER_BATCH_SIZE)
         
-        async for session in sessions_cursor:
-            # Check if reminder already sent
-            existing_reminder = await self.db.enhanced_notifications.find_one({
-                "user_id": session["student_id"],
-                "type": "session_reminder",
-                "metadata.session_id": session["id"]
-            })
+        async for batch in self._iter_batches(sessions_cursor):
+            already_reminded = set(await self.db.enhanced_notifications.distinct(
+                "metadata.session_id",
+                {
+                    "type": "session_reminder",
+                    "metadata.session_id": {"$in": [session["id"] for session in batch]}
+                }
+            ))
             
-            if not existing_reminder:
-                await self.create_notification(
+            notifications = [
+                self._build_notification_doc(
                     user_id=session["student_id"],
                     notification_type="session_reminder",
                     title="Session Reminder",
                     message=f"You have a {session['session_type']} session scheduled for tomorrow at {session['scheduled_at'].strftime('%H:%M')}",
                     priority=NotificationPriority.HIGH,
                     channels=[NotificationChannel.EMAIL, NotificationChannel.IN_APP],
-                    metadata={"session_id": session["id"], "session_type": session["session_type"]}
+                    metadata={"session_id": session["id"], "session_type": session["session_type"]},
+                    idempotency_key=f"session_reminder:{session['id']}"
                 )
+                for session in batch
+                if session["id"] not in already_reminded
+            ]
+            created += await self._insert_and_deliver(notifications)
         
         # Payment reminders (for pending payments older than 3 days)
         three_days_ago = now - timedelta(days=3)
-        enrollments_cursor = self.db.enrollments.find({
-            "payment_status": "pending",
-            "created_at": {"$lt": three_days_ago}
-        })
+        enrollments_cursor = self.db.enrollments.find(
+            {
+                "payment_status": "pending",
+                "created_at": {"$lt": three_days_ago}
+            },
+            {"_id": 0, "id": 1, "student_id": 1, "driving_school_id": 1, "amount": 1}
+        ).batch_size(self.REMINDER_BATCH_SIZE)
         
-        async for enrollment in enrollments_cursor:
-            # Check if reminder already sent in last 24 hours
-            recent_reminder = await self.db.enhanced_notifications.find_one({
-                "user_id": enrollment["student_id"],
-                "type": "payment_reminder",
-                "metadata.enrollment_id": enrollment["id"],
-                "created_at": {"$gte": now - timedelta(hours=24)}
-            })
+        day_bucket = now.strftime("%Y-%m-%d")
+        async for batch in self._iter_batches(enrollments_cursor):
+            # One reminder per enrollment per 24 hours
+            recently_reminded = set(await self.db.enhanced_notifications.distinct(
+                "metadata.enrollment_id",
+                {
+                    "type": "payment_reminder",
+                    "metadata.enrollment_id": {"$in": [enrollment["id"] for enrollment in batch]},
+                    "created_at": {"$gte": now - timedelta(hours=24)}
+                }
+            ))
+            pending = [enrollment for enrollment in batch if enrollment["id"] not in recently_reminded]
+            if not pending:
+                continue
+            
+            school_ids = list({enrollment["driving_school_id"] for enrollment in pending})
+            schools_cursor = self.db.driving_schools.find(
+                {"id": {"$in": school_ids}}, {"_id": 0, "id": 1, "name": 1}
+            )
+            school_names = {school["id"]: school["name"] async for school in schools_cursor}
             
-            if not recent_reminder:
-                school = await self.db.driving_schools.find_one({"id": enrollment["driving_school_id"]})
-                await self.create_notification(
+            notifications = [
+                self._build_notification_doc(
                     user_id=enrollment["student_id"],
                     notification_type="payment_reminder",
                     title="Payment Reminder",
-                    message=f"Your enrollment payment for {school['name'] if school else 'driving school'} is still pending. Please complete your payment to continue.",
+                    message=f"Your enrollment payment for {school_names.get(enrollment['driving_school_id'], 'driving school')} is still pending. Please complete your payment to continue.",
                     priority=NotificationPriority.MEDIUM,
                     channels=[NotificationChannel.EMAIL, NotificationChannel.IN_APP],
-                    metadata={"enrollment_id": enrollment["id"], "amount": enrollment["amount"]}
+                    metadata={"enrollment_id": enrollment["id"], "amount": enrollment.get("amount")},
+                    idempotency_key=f"payment_reminder:{enrollment['id']}:{day_bucket}"
                 )
+                for enrollment in pending
+            ]
+            created += await self._insert_and_deliver(notifications)
+        
+        logger.info(f"Scheduled {created} reminders")
+        return created
+
+    async def _iter_batches(self, cursor):
+        """Yield lists of at most REMINDER_BATCH_SIZE documents from a cursor"""
+        batch = []
+        async for doc in cursor:
+            batch.append(doc)
+            if len(batch) >= self.REMINDER_BATCH_SIZE:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    async def _insert_and_deliver(self, notifications: list) -> int:
+        """Insert notifications in one round trip and deliver the ones that were stored"""
+        if not notifications:
+            return 0
+        
+        try:
+            await self.db.enhanced_notifications.insert_many(notifications, ordered=False)
+            inserted = notifications
+        except BulkWriteError as e:
+            # Duplicate idempotency keys mean another run already created them
+            if any(error.get("code") != 11000 for error in e.details.get("writeErrors", [])):
+                raise
+            failed = {error["index"] for error in e.details.get("writeErrors", [])}
+            inserted = [n for i, n in enumerate(notifications) if i not in failed]
+        
+        for notification in inserted:
+            notification_hub.publish(notification, "enhanced_notifications")
+        
+        await self._deliver_notifications(inserted)
+        return len(inserted)
+
+    async def flush_digests(self, max_users: int = 500) -> int:
+        """Coalesce each user's pending channel deliveries into one message per channel.
+
+        A user's digest is sent once their oldest pending item is older than
+        the channel's digest window. Digests count against the per-user
+        delivery cap; users over it keep their items pending until a later
+        flush. Returns the number of digests sent.
+        """
+        now = datetime.utcnow()
+        digests_sent = 0
+        
+        for channel in (NotificationChannel.EMAIL, NotificationChannel.SMS, NotificationChannel.PUSH):
+            pending_field = f"delivery_status.{channel.value}"
+            window = timedelta(seconds=self.digest_windows.get(channel.value, 0))
+            
+            groups = await self.db.enhanced_notifications.aggregate([
+                {"$match": {f"{pending_field}.digest_pending": True}},
+                {"$sort": {"created_at": 1}},
+                {"$group": {
+                    "_id": "$user_id",
+                    "oldest": {"$min": f"${pending_field}.queued_at"},
+                    "notifications": {"$push": {
+                        "id": "$id",
+                        "title": "$title",
+                        "message": "$message",
+                        "priority": "$priority"
+                    }}
+                }},
+                {"$match": {"oldest": {"$lte": now - window}}},
+                {"$limit": max_users}
+            ]).to_list(length=None)
+            if not groups:
+                continue
+            
+            users_cursor = self.db.users.find({"id": {"$in": [group["_id"] for group in groups]}})
+            users = {user["id"]: user async for user in users_cursor}
+            
+            # Render every digest first, then send them over one connection
+            outcomes = {}
+            emails = []
+            rate_limited = set()
+            for group in groups:
+                user = users.get(group["_id"])
+                if not user:
+                    outcomes[group["_id"]] = False
+                    continue
+                if not delivery_rate_limiter.allow(user["id"], channel.value):
+                    # Over the hourly cap: leave the items pending for a later flush
+                    rate_limited.add(user["id"])
+                    continue
+                
+                notifications = group["notifications"]
+                if channel == NotificationChannel.EMAIL:
+                    if not user.get("email") or not self.smtp_username or not self.smtp_password:
+                        outcomes[user["id"]] = False
+                        continue
+                    html_body = self._create_digest_email_template(user, notifications)
+                    subject = f"🚗 {len(notifications)} new notifications - Driving School Platform"
+                    emails.append((user["id"], self._build_email_message(user, subject, html_body)))
+                else:
+                    summary = {
+                        "id": notifications[-1]["id"],
+                        "title": f"{len(notifications)} new notifications",
+                        "message": "; ".join(n["title"] for n in notifications)
+                    }
+                    if channel == NotificationChannel.SMS:
+                        outcomes[user["id"]] = bool(user.get("phone")) and await self._send_sms(user, summary)
+                    else:
+                        outcomes[user["id"]] = await self._send_push_notification(user, summary)
+            
+            if emails:
+                # One SMTP session for the whole batch
+                results = await asyncio.to_thread(self._smtp_send, [msg for _, msg in emails])
+                for (user_id, _), success in zip(emails, results):
+                    outcomes[user_id] = success
+            
+            delivered_at = datetime.utcnow()
+            updates = []
+            for group in groups:
+                if group["_id"] in rate_limited:
+                    continue
+                success = outcomes.get(group["_id"], False)
+                update = {
+                    "$set": {
+                        pending_field: {"success": success, "delivered_at": delivered_at, "digest": True},
+                        "updated_at": delivered_at
+                    }
+                }
+                if success:
+                    update["$set"]["is_delivered"] = True
+                updates.append(UpdateMany(
+                    {"id": {"$in": [n["id"] for n in group["notifications"]]}, f"{pending_field}.digest_pending": True},
+                    update
+                ))
+                digests_sent += 1 if success else 0
+            
+            if updates:
+                await self.db.enhanced_notifications.bulk_write(updates, ordered=False)
+        
+        return digests_sent
 
     async def get_user_notifications(
         self,
@@ -427,4 +776,57 @@ class EnhancedNotificationService:
             "unread_notifications": unread_notifications,
             "unread_by_priority": priority_counts,
             "read_percentage": round((total_notifications - unread_notifications) / total_notifications * 100, 1) if total_notifications > 0 else 0
-        }
\ No newline at end of file
+        }
+
+    async def archive_read_notifications(self, retention_days: Optional[int] = None) -> dict:
+        """Move old read notifications into cold archive collections.
+
+        Expired notifications are removed by the TTL index on ``expires_at``;
+        this compacts the remaining read ones so the hot collections and
+        their indexes only hold recent or unread notifications.
+        """
+        cutoff = datetime.utcnow() - timedelta(days=retention_days or self.READ_RETENTION_DAYS)
+        
+        archived = {
+            "enhanced_notifications": await self._archive_collection(
+                self.db.enhanced_notifications,
+                self.db.enhanced_notifications_archive,
+                {"is_read": True, "read_at": {"$lt": cutoff}}
+            ),
+            # Legacy rows were marked read without a read_at timestamp
+            "notifications": await self._archive_collection(
+                self.db.notifications,
+                self.db.notifications_archive,
+                {"is_read": True, "$or": [
+                    {"read_at": {"$lt": cutoff}},
+                    {"read_at": {"$exists": False}, "created_at": {"$lt": cutoff}}
+                ]}
+            )
+        }
+        
+        logger.info(f"Archived read notifications: {archived}")
+        return archived
+
+    async def _archive_collection(self, source, archive, query: dict) -> int:
+        """Copy matching documents to the archive and delete them, one batch at a time"""
+        total = 0
+        while True:
+            batch = await source.find(query).limit(self.ARCHIVE_BATCH_SIZE).to_list(length=self.ARCHIVE_BATCH_SIZE)
+            if not batch:
+                break
+            
+            archived_at = datetime.utcnow()
+            for doc in batch:
+                doc["archived_at"] = archived_at
+            
+            try:
+                await archive.insert_many(batch, ordered=False)
+            except BulkWriteError as e:
+                # Rows already archived by an interrupted run keep their _id
+                if any(error.get("code") != 11000 for error in e.details.get("writeErrors", [])):
+                    raise
+            
+            await source.delete_many({"_id": {"$in": [doc["_id"] for doc in batch]}})
+            total += len(batch)
+        
+        return total
@@ -3,13 +3,20 @@ import os
 import json
 import hmac
 import hashlib
-import requests
 from datetime import datetime, timedelta
-from typing import Optional, Dict, List
+from typing import Optional, Dict, List, AsyncIterator, TextIO
 from enum import Enum
+import re
+import csv
 import uuid
+import asyncio
 import logging
+from itertools import islice
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from external_integrations.http_client import get_provider_client
 
 logger = logging.getLogger(__name__)
 
@@ -35,7 +42,47 @@ class RefundStatus(str, Enum):
     COMPLETED = "completed"
     DENIED = "denied"
 
+class WebhookEventStatus(str, Enum):
+    RECEIVED = "received"
+    RETRY = "retry"
+    PROCESSED = "processed"
+    FAILED = "failed"
+
+# Allowed payment status transitions; anything else is a no-op
+PAYMENT_TRANSITIONS = {
+    PaymentStatus.PENDING: {PaymentStatus.PROCESSING, PaymentStatus.COMPLETED, PaymentStatus.FAILED, PaymentStatus.EXPIRED},
+    PaymentStatus.PROCESSING: {PaymentStatus.COMPLETED, PaymentStatus.FAILED, PaymentStatus.EXPIRED},
+    PaymentStatus.FAILED: {PaymentStatus.PROCESSING, PaymentStatus.COMPLETED},
+    PaymentStatus.EXPIRED: {PaymentStatus.COMPLETED},
+    PaymentStatus.COMPLETED: {PaymentStatus.REFUNDED},
+    PaymentStatus.REFUNDED: set(),
+}
+
+# Payment references as issued by _create_ccp_payment / _create_bank_transfer_details.
+# CCP instructions show the reference without its prefix, so bare ones are accepted too.
+STATEMENT_REFERENCE_PATTERN = re.compile(r"(?<![0-9A-Z])(CCP[0-9A-F]{8}-[0-9A-F]|BANK[0-9A-F]{8}|[0-9A-F]{8}-[0-9A-F])(?![0-9A-Z])")
+
+async def iter_statement_batches(stream: TextIO, batch_size: int = 1000) -> AsyncIterator[List[dict]]:
+    """Read a CSV statement in row batches without loading the file.
+
+    Blocking reads happen in a worker thread; memory stays bounded by one batch.
+    """
+    reader = csv.DictReader(stream)
+    while True:
+        batch = await asyncio.to_thread(lambda: list(islice(reader, batch_size)))
+        if not batch:
+            break
+        yield batch
+
 class EnhancedPaymentService:
+    # Payments handled per bulk_write in sweeps
+    SWEEP_BATCH_SIZE = int(os.environ.get('PAYMENT_SWEEP_BATCH_SIZE', '500'))
+    WEBHOOK_PROVIDERS = ("baridimob", "ccp")
+    WEBHOOK_MAX_ATTEMPTS = int(os.environ.get('WEBHOOK_MAX_ATTEMPTS', '5'))
+    WEBHOOK_WORKER_CONCURRENCY = int(os.environ.get('WEBHOOK_WORKER_CONCURRENCY', '20'))
+    # Lease on one payment's event queue, renewed after every applied event
+    WEBHOOK_LOCK_SECONDS = int(os.environ.get('WEBHOOK_LOCK_SECONDS', '60'))
+
     def __init__(self, db_client):
         self.db = db_client.driving_school_platform
         
@@ -116,6 +163,7 @@ class EnhancedPaymentService:
         
         # Save payment intent
         await self.db.enhanced_payments.insert_one(payment_doc)
+        await self._bump_payment_stats([(payment_doc, payment_doc["status"], 1)])
         
         # Update enrollment payment status
         await self.db.enrollments.update_one(
@@ -159,15 +207,18 @@ class EnhancedPaymentService:
                 "Content-Type": "application/json"
             }
             
-            response = requests.post(
-                f"{self.baridimob_base_url}/v1/payments",
+            # Shared pooled client: bounded timeout, bulkhead and circuit breaker;
+            # any refusal or failure lands in the simulation fallback below
+            client = get_provider_client("baridimob", base_url=self.baridimob_base_url)
+            response = await client.request(
+                "POST",
+                "/v1/payments",
                 json=payload,
-                headers=headers,
-                timeout=30
+                headers=headers
             )
             
-            if response.status_code == 200:
-                data = response.json()
+            if response.status == 200:
+                data = response.data or {}
                 return {
                     "payment_id": data.get("payment_id"),
                     "payment_url": data.get("payment_url"),
@@ -213,13 +264,166 @@ class EnhancedPaymentService:
             "instructions": "Include the reference number in your transfer description"
         }
 
-    async def process_webhook(self, provider: str, payload: dict, signature: str) -> Dict:
-        """Process payment webhook from providers"""
+    async def ingest_webhook(self, provider: str, payload: dict, signature: str) -> Dict:
+        """Verify and persist a webhook event so it can be acknowledged immediately.
+
+        The event is stored once per ``(provider, event_id)``; provider retries
+        of the same event are acknowledged as duplicates without reprocessing.
+        State changes are applied later by ``process_webhook_events``.
+        """
         
         # Verify webhook signature
         if not self._verify_webhook_signature(provider, payload, signature):
             raise ValueError("Invalid webhook signature")
         
+        if provider not in self.WEBHOOK_PROVIDERS:
+            raise ValueError(f"Unsupported payment provider: {provider}")
+        
+        # Providers that don't send an event id are deduplicated on the payload itself
+        event_id = str(payload.get("event_id") or hashlib.sha256(
+            json.dumps(payload, sort_keys=True).encode()
+        ).hexdigest())
+        
+        event_doc = {
+            "id": str(uuid.uuid4()),
+            "provider": provider,
+            "event_id": event_id,
+            "payment_id": payload.get("order_id"),
+            "payload": payload,
+            "status": WebhookEventStatus.RECEIVED,
+            "attempts": 0,
+            "error": None,
+            "received_at": datetime.utcnow(),
+            "processed_at": None
+        }
+        
+        try:
+            await self.db.payment_webhook_events.insert_one(event_doc)
+        except DuplicateKeyError:
+            return {"status": "duplicate", "event_id": event_id}
+        
+        return {"status": "accepted", "event_id": event_id}
+
+    async def process_webhook_events(self, limit: int = 500) -> Dict[str, int]:
+        """Apply stored webhook events, in order per payment.
+
+        Payments are processed concurrently, but each payment's events are
+        applied sequentially in arrival order under a per-payment lease in
+        ``payment_webhook_locks``, so two workers (or an overrunning run and
+        the next one) never apply the same payment's events at once. The
+        first failure stops that payment's queue until the next run, so
+        later events never overtake it.
+
+        Returns ``{"processed": n, "failed": m}``: events applied, and events
+        that failed and were left for retry or marked failed.
+        """
+        pending = {
+            "status": {"$in": [WebhookEventStatus.RECEIVED, WebhookEventStatus.RETRY]},
+            "attempts": {"$lt": self.WEBHOOK_MAX_ATTEMPTS}
+        }
+        events = await self.db.payment_webhook_events.find(
+            pending, {"_id": 0, "id": 1, "payment_id": 1}
+        ).sort("received_at", 1).limit(limit).to_list(length=limit)
+        if not events:
+            return {"processed": 0, "failed": 0}
+        
+        # Events without a payment id are their own queue
+        queues = {}
+        for event in events:
+            if event.get("payment_id"):
+                queues[event["payment_id"]] = {"payment_id": event["payment_id"]}
+            else:
+                queues[event["id"]] = {"id": event["id"]}
+        
+        owner = str(uuid.uuid4())
+        applied = []
+        failures = []
+        semaphore = asyncio.Semaphore(self.WEBHOOK_WORKER_CONCURRENCY)
+        
+        async def apply_in_order(queue_key: str, queue_filter: dict):
+            async with semaphore:
+                if not await self._lock_payment_queue(queue_key, owner):
+                    # Another worker is applying this payment's events
+                    return
+                try:
+                    # Re-read under the lease: events may have been applied since the scan
+                    payment_events = await self.db.payment_webhook_events.find(
+                        {**queue_filter, **pending}
+                    ).sort("received_at", 1).to_list(length=None)
+                    for event in payment_events:
+                        if not await self._lock_payment_queue(queue_key, owner):
+                            logger.warning(f"Lost webhook lease for {queue_key}, leaving the rest for the next run")
+                            break
+                        try:
+                            await self.process_webhook(event["provider"], event["payload"])
+                            await self.db.payment_webhook_events.update_one(
+                                {"id": event["id"]},
+                                {"$set": {"status": WebhookEventStatus.PROCESSED, "processed_at": datetime.utcnow(), "error": None},
+                                 "$inc": {"attempts": 1}}
+                            )
+                            applied.append(event["id"])
+                        except Exception as e:
+                            logger.error(f"Webhook event {event['event_id']} failed: {str(e)}")
+                            failed = event["attempts"] + 1 >= self.WEBHOOK_MAX_ATTEMPTS
+                            await self.db.payment_webhook_events.update_one(
+                                {"id": event["id"]},
+                                {"$set": {"status": WebhookEventStatus.FAILED if failed else WebhookEventStatus.RETRY, "error": str(e)},
+                                 "$inc": {"attempts": 1}}
+                            )
+                            failures.append(event["id"])
+                            break
+                finally:
+                    await self.db.payment_webhook_locks.delete_one({"_id": queue_key, "owner": owner})
+        
+        await asyncio.gather(*(apply_in_order(key, queue_filter) for key, queue_filter in queues.items()))
+        return {"processed": len(applied), "failed": len(failures)}
+
+    async def _lock_payment_queue(self, queue_key: str, owner: str) -> bool:
+        """Take or renew the lease on a payment's webhook queue"""
+        now = datetime.utcnow()
+        try:
+            lock = await self.db.payment_webhook_locks.find_one_and_update(
+                {"_id": queue_key, "$or": [{"locked_until": {"$lte": now}}, {"owner": owner}]},
+                {"$set": {"owner": owner, "locked_until": now + timedelta(seconds=self.WEBHOOK_LOCK_SECONDS)}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+            return lock is not None
+        except DuplicateKeyError:
+            # Held by another worker
+            return False
+
+    async def replay_webhook_events(
+        self,
+        provider: Optional[str] = None,
+        payment_id: Optional[str] = None,
+        since: Optional[datetime] = None,
+        event_ids: Optional[List[str]] = None
+    ) -> int:
+        """Queue stored events for re-application; safe because transitions are idempotent"""
+        query = {}
+        if provider:
+            query["provider"] = provider
+        if payment_id:
+            query["payment_id"] = payment_id
+        if since:
+            query["received_at"] = {"$gte": since}
+        if event_ids:
+            query["event_id"] = {"$in": event_ids}
+        
+        result = await self.db.payment_webhook_events.update_many(
+            query,
+            {"$set": {"status": WebhookEventStatus.RECEIVED, "attempts": 0, "error": None}}
+        )
+        return result.modified_count
+
+    async def process_webhook(self, provider: str, payload: dict, signature: Optional[str] = None) -> Dict:
+        """Apply a webhook payload; the signature is checked only when given"""
+        
+        # Verify webhook signature
+        if signature is not None and not self._verify_webhook_signature(provider, payload, signature):
+            raise ValueError("Invalid webhook signature")
+        
         if provider == "baridimob":
             return await self._process_baridimob_webhook(payload)
         elif provider == "ccp":
@@ -241,17 +445,24 @@ class EnhancedPaymentService:
 
     async def _process_baridimob_webhook(self, payload: dict) -> Dict:
         """Process BaridiMob webhook"""
+        return await self._apply_gateway_status(payload)
+
+    async def _process_ccp_webhook(self, payload: dict) -> Dict:
+        """Process CCP webhook (same status vocabulary as BaridiMob)"""
+        return await self._apply_gateway_status(payload)
+
+    async def _apply_gateway_status(self, payload: dict) -> Dict:
         payment_id = payload.get("order_id")
         status = payload.get("status")
         
         if not payment_id:
             raise ValueError("Missing payment ID in webhook")
         
-        payment = await self.db.enhanced_payments.find_one({"id": payment_id})
+        payment = await self.db.enhanced_payments.find_one({"id": payment_id}, {"_id": 0, "id": 1})
         if not payment:
             raise ValueError("Payment not found")
         
-        # Map BaridiMob status to our status
+        # Map gateway status to our status
         status_mapping = {
             "completed": PaymentStatus.COMPLETED,
             "failed": PaymentStatus.FAILED,
@@ -262,16 +473,20 @@ class EnhancedPaymentService:
         new_status = status_mapping.get(status, PaymentStatus.PENDING)
         
         # Update payment
-        await self._update_payment_status(payment_id, new_status, {
+        applied = await self._update_payment_status(payment_id, new_status, {
             "gateway_transaction_id": payload.get("transaction_id"),
             "gateway_reference": payload.get("reference"),
             "gateway_fee": payload.get("fee", 0),
             "processed_at": datetime.utcnow()
         })
         
-        return {"status": "processed", "payment_id": payment_id}
+        return {"status": "processed" if applied else "ignored", "payment_id": payment_id}
+
+    def _allowed_sources(self, status: PaymentStatus) -> List[str]:
+        """Statuses a payment may move to ``status`` from"""
+        return [source for source, targets in PAYMENT_TRANSITIONS.items() if status in targets]
 
-    async def _update_payment_status(self, payment_id: str, status: PaymentStatus, metadata: Dict = None):
+    async def _update_payment_status(self, payment_id: str, status: PaymentStatus, metadata: Dict = None) -> bool:
         """Update payment status and handle side effects"""
         
         update_data = {
@@ -282,16 +497,19 @@ class EnhancedPaymentService:
         if metadata:
             update_data["gateway_metadata"] = metadata
         
-        # Update payment
-        await self.db.enhanced_payments.update_one(
-            {"id": payment_id},
-            {"$set": update_data}
+        # Update payment, only if the transition is allowed from its current status.
+        # Replayed or out-of-date events therefore change nothing and trigger no side effects.
+        previous = await self.db.enhanced_payments.find_one_and_update(
+            {"id": payment_id, "status": {"$in": self._allowed_sources(status)}},
+            {"$set": update_data},
+            return_document=ReturnDocument.BEFORE
         )
+        if not previous:
+            return False
+        payment = {**previous, **update_data}
         
-        # Get payment details
-        payment = await self.db.enhanced_payments.find_one({"id": payment_id})
-        if not payment:
-            return
+        # Move the payment between daily statistics buckets
+        await self._bump_payment_stats([(previous, previous["status"], -1), (previous, status, 1)])
         
         # Update enrollment based on payment status
         if status == PaymentStatus.COMPLETED:
@@ -322,6 +540,8 @@ class EnhancedPaymentService:
                 "amount": payment["amount"],
                 "payment_method": payment["payment_method"]
             })
+        
+        return True
 
     async def _send_payment_notification(self, user_id: str, notification_type: str, metadata: Dict):
         """Send payment-related notifications"""
@@ -414,19 +634,24 @@ class EnhancedPaymentService:
         return {"refund_id": refund_id, "status": "requested"}
 
     async def get_payment_statistics(self, school_id: str = None, date_from: datetime = None, date_to: datetime = None) -> Dict:
-        """Get payment statistics"""
+        """Get payment statistics.
+
+        Reads the per-school, per-day, per-status buckets in
+        ``payment_stats_daily`` instead of scanning payments, so the date
+        range has day granularity (by payment creation date).
+        """
         query = {}
         
         if school_id:
             query["school_id"] = school_id
         
         if date_from or date_to:
-            date_query = {}
+            day_query = {}
             if date_from:
-                date_query["$gte"] = date_from
+                day_query["$gte"] = self._stats_day(date_from)
             if date_to:
-                date_query["$lte"] = date_to
-            query["created_at"] = date_query
+                day_query["$lte"] = self._stats_day(date_to)
+            query["day"] = day_query
         
         # Aggregate statistics
         pipeline = [
@@ -434,13 +659,13 @@ class EnhancedPaymentService:
             {
                 "$group": {
                     "_id": "$status",
-                    "count": {"$sum": 1},
+                    "count": {"$sum": "$count"},
                     "total_amount": {"$sum": "$amount"}
                 }
             }
         ]
         
-        results = await self.db.enhanced_payments.aggregate(pipeline).to_list(length=None)
+        results = await self.db.payment_stats_daily.aggregate(pipeline).to_list(length=None)
         
         stats = {
             "total_payments": 0,
@@ -477,6 +702,224 @@ class EnhancedPaymentService:
         
         return stats
 
+    async def reconcile_statement(
+        self,
+        row_batches: AsyncIterator[List[dict]],
+        source: str,
+        school_id: Optional[str] = None,
+        unmatched_sample_size: int = 100
+    ) -> Dict:
+        """Match CCP/bank statement rows to pending payments and complete them.
+
+        Rows are dicts with ``reference``, ``amount`` and optionally
+        ``transaction_id``, ``date`` and ``description`` columns. Each batch
+        costs one indexed reference lookup plus bulk writes; unmatched rows
+        are stored in ``reconciliation_unmatched`` under the run id.
+        """
+        run_id = str(uuid.uuid4())
+        run = {
+            "id": run_id,
+            "source": source,
+            "school_id": school_id,
+            "status": "running",
+            "rows": 0,
+            "matched": 0,
+            "unmatched": 0,
+            "unmatched_by_reason": {},
+            "unmatched_sample": [],
+            "started_at": datetime.utcnow(),
+            "finished_at": None
+        }
+        await self.db.reconciliation_runs.insert_one(run)
+        run.pop("_id", None)
+        
+        row_number = 0
+        async for batch in row_batches:
+            unmatched = []
+            candidates = {}
+            for row in batch:
+                row_number += 1
+                reference = self._statement_reference(row)
+                if not reference:
+                    unmatched.append((row_number, row, "no_reference"))
+                else:
+                    candidates.setdefault(reference, []).append((row_number, row))
+            
+            # One indexed lookup for the whole batch
+            payments = {}
+            if candidates:
+                query = {"payment_gateway_data.reference": {"$in": list(candidates)}}
+                if school_id:
+                    query["school_id"] = school_id
+                async for payment in self.db.enhanced_payments.find(query):
+                    payments[payment["payment_gateway_data"]["reference"]] = payment
+            
+            to_complete = {}
+            for reference, rows in candidates.items():
+                payment = payments.get(reference)
+                for number, row in rows:
+                    if not payment:
+                        unmatched.append((number, row, "unknown_reference"))
+                    elif payment["status"] == PaymentStatus.COMPLETED or payment["id"] in to_complete:
+                        unmatched.append((number, row, "already_completed"))
+                    elif payment["status"] not in self._allowed_sources(PaymentStatus.COMPLETED):
+                        unmatched.append((number, row, f"payment_{payment['status']}"))
+                    elif self._statement_amount(row) is None or self._statement_amount(row) + 0.01 < payment["amount"]:
+                        unmatched.append((number, row, "amount_mismatch"))
+                    else:
+                        to_complete[payment["id"]] = (payment, {
+                            "gateway_transaction_id": row.get("transaction_id"),
+                            "gateway_reference": reference,
+                            "statement_amount": self._statement_amount(row),
+                            "statement_date": row.get("date"),
+                            "reconciliation_run_id": run_id,
+                            "processed_at": datetime.utcnow()
+                        })
+            
+            completed = await self._complete_payments_bulk(list(to_complete.values()))
+            
+            run["rows"] += len(batch)
+            run["matched"] += completed
+            run["unmatched"] += len(unmatched)
+            for _, _, reason in unmatched:
+                run["unmatched_by_reason"][reason] = run["unmatched_by_reason"].get(reason, 0) + 1
+            for number, row, reason in unmatched[:max(0, unmatched_sample_size - len(run["unmatched_sample"]))]:
+                run["unmatched_sample"].append({"row_number": number, "reason": reason, "row": row})
+            if unmatched:
+                await self.db.reconciliation_unmatched.insert_many([
+                    {"run_id": run_id, "row_number": number, "reason": reason, "row": row}
+                    for number, row, reason in unmatched
+                ])
+        
+        run["status"] = "completed"
+        run["finished_at"] = datetime.utcnow()
+        await self.db.reconciliation_runs.update_one({"id": run_id}, {"$set": run})
+        
+        logger.info(f"Reconciliation {run_id}: {run['matched']} matched, {run['unmatched']} unmatched of {run['rows']} rows")
+        return self._serialize_payment(run)
+
+    def _statement_reference(self, row: dict) -> Optional[str]:
+        """Extract a payment reference from a statement row"""
+        for column in ("reference", "description"):
+            match = STATEMENT_REFERENCE_PATTERN.search((row.get(column) or "").upper())
+            if match:
+                reference = match.group(1)
+                return reference if reference.startswith(("CCP", "BANK")) else f"CCP{reference}"
+        return None
+
+    def _statement_amount(self, row: dict) -> Optional[float]:
+        try:
+            return float((row.get("amount") or "").replace(" ", "").replace(",", "."))
+        except ValueError:
+            return None
+
+    async def _complete_payments_bulk(self, completions: list) -> int:
+        """Complete many (payment, gateway_metadata) pairs with bulk writes and bulk notifications"""
+        if not completions:
+            return 0
+        
+        now = datetime.utcnow()
+        result = await self.db.enhanced_payments.bulk_write([
+            UpdateOne(
+                {"id": payment["id"], "status": {"$in": self._allowed_sources(PaymentStatus.COMPLETED)}},
+                {"$set": {"status": PaymentStatus.COMPLETED, "updated_at": now, "gateway_metadata": metadata}}
+            )
+            for payment, metadata in completions
+        ], ordered=False)
+        
+        if result.modified_count != len(completions):
+            # Some changed status concurrently; keep only the ones this call stamped
+            stamped = set(await self.db.enhanced_payments.distinct("id", {
+                "id": {"$in": [payment["id"] for payment, _ in completions]},
+                "status": PaymentStatus.COMPLETED,
+                "updated_at": now
+            }))
+            completions = [(payment, metadata) for payment, metadata in completions if payment["id"] in stamped]
+            if not completions:
+                return 0
+        
+        await self.db.enrollments.bulk_write([
+            UpdateOne(
+                {"id": payment["enrollment_id"]},
+                {"$set": {
+                    "payment_status": "completed",
+                    "enrollment_status": "pending_documents",
+                    "paid_at": now
+                }}
+            )
+            for payment, _ in completions
+        ], ordered=False)
+        
+        await self._bump_payment_stats(
+            [(payment, payment["status"], -1) for payment, _ in completions] +
+            [(payment, PaymentStatus.COMPLETED, 1) for payment, _ in completions]
+        )
+        
+        from enhanced_notifications import EnhancedNotificationService, NotificationPriority, NotificationChannel
+        
+        await EnhancedNotificationService(self.db._client).create_notifications([
+            {
+                "user_id": payment["user_id"],
+                "notification_type": "payment_completed",
+                "title": "Payment Successful! 💳",
+                "message": f"Your payment of {payment['amount']} DZD has been processed successfully. You can now upload your documents to complete enrollment.",
+                "priority": NotificationPriority.HIGH,
+                "channels": [NotificationChannel.EMAIL, NotificationChannel.IN_APP],
+                "metadata": {
+                    "amount": payment["amount"],
+                    "payment_method": payment["payment_method"],
+                    "reference": metadata["gateway_reference"]
+                }
+            }
+            for payment, metadata in completions
+        ])
+        
+        return len(completions)
+
+    def _stats_day(self, moment: datetime) -> str:
+        return moment.strftime("%Y-%m-%d")
+
+    async def _bump_payment_stats(self, changes: list):
+        """Apply (payment, status, +1/-1) changes to the daily statistics buckets"""
+        operations = [
+            UpdateOne(
+                {
+                    "school_id": payment.get("school_id"),
+                    "day": self._stats_day(payment["created_at"]),
+                    "status": status
+                },
+                {"$inc": {"count": sign, "amount": sign * payment.get("amount", 0)}},
+                upsert=True
+            )
+            for payment, status, sign in changes
+        ]
+        if operations:
+            await self.db.payment_stats_daily.bulk_write(operations, ordered=False)
+
+    async def rebuild_payment_statistics(self) -> int:
+        """Recompute every statistics bucket from the payments collection (backfill/repair)"""
+        buckets = await self.db.enhanced_payments.aggregate([
+            {
+                "$group": {
+                    "_id": {
+                        "school_id": "$school_id",
+                        "day": {"$dateToString": {"format": "%Y-%m-%d", "date": "$created_at"}},
+                        "status": "$status"
+                    },
+                    "count": {"$sum": 1},
+                    "amount": {"$sum": "$amount"}
+                }
+            }
+        ], allowDiskUse=True).to_list(length=None)
+        
+        await self.db.payment_stats_daily.delete_many({})
+        if buckets:
+            await self.db.payment_stats_daily.insert_many([
+                {**bucket["_id"], "count": bucket["count"], "amount": bucket["amount"]}
+                for bucket in buckets
+            ])
+        return len(buckets)
+
     def _serialize_payment(self, payment: dict) -> dict:
         """Serialize payment for JSON response"""
         serialized = {}
@@ -489,24 +932,71 @@ class EnhancedPaymentService:
                 serialized[key] = value
         return serialized
 
-    async def cleanup_expired_payments(self):
-        """Clean up expired payments"""
+    async def cleanup_expired_payments(self) -> int:
+        """Expire pending payments whose window has passed.
+
+        Streams the expired set in cursor batches and applies each batch with
+        one bulk_write on payments and one on enrollments. Updates are
+        conditional, so payments completed concurrently are left alone.
+        """
         now = datetime.utcnow()
         
         # Find expired pending payments
-        expired_payments = await self.db.enhanced_payments.find({
-            "status": {"$in": [PaymentStatus.PENDING, PaymentStatus.PROCESSING]},
-            "expires_at": {"$lt": now}
-        }).to_list(length=None)
+        expired_cursor = self.db.enhanced_payments.find(
+            {
+                "status": {"$in": [PaymentStatus.PENDING, PaymentStatus.PROCESSING]},
+                "expires_at": {"$lt": now}
+            },
+            {"_id": 0, "id": 1, "enrollment_id": 1, "school_id": 1, "status": 1, "amount": 1, "created_at": 1}
+        ).batch_size(self.SWEEP_BATCH_SIZE)
+        
+        expired_count = 0
+        batch = []
+        async for payment in expired_cursor:
+            batch.append(payment)
+            if len(batch) >= self.SWEEP_BATCH_SIZE:
+                expired_count += await self._expire_payment_batch(batch, now)
+                batch = []
+        if batch:
+            expired_count += await self._expire_payment_batch(batch, now)
+        
+        logger.info(f"Marked {expired_count} payments as expired")
+        return expired_count
+
+    async def _expire_payment_batch(self, payments: list, now: datetime) -> int:
+        payment_ops = [
+            UpdateOne(
+                {"id": payment["id"], "status": {"$in": [PaymentStatus.PENDING, PaymentStatus.PROCESSING]}},
+                {"$set": {"status": PaymentStatus.EXPIRED, "updated_at": now}}
+            )
+            for payment in payments
+        ]
+        result = await self.db.enhanced_payments.bulk_write(payment_ops, ordered=False)
+        
+        expired = payments
+        if result.modified_count != len(payments):
+            # Some changed status concurrently; keep only the ones this sweep stamped
+            stamped = set(await self.db.enhanced_payments.distinct("id", {
+                "id": {"$in": [payment["id"] for payment in payments]},
+                "status": PaymentStatus.EXPIRED,
+                "updated_at": now
+            }))
+            expired = [payment for payment in payments if payment["id"] in stamped]
+        
+        await self._bump_payment_stats(
+            [(payment, payment["status"], -1) for payment in expired] +
+            [(payment, PaymentStatus.EXPIRED, 1) for payment in expired]
+        )
         
-        for payment in expired_payments:
-            await self._update_payment_status(payment["id"], PaymentStatus.EXPIRED)
-            
-            # Update enrollment
-            await self.db.enrollments.update_one(
-                {"id": payment["enrollment_id"]},
+        # Update enrollment
+        enrollment_ops = [
+            UpdateOne(
+                {"id": payment["enrollment_id"], "payment_id": payment["id"], "payment_status": {"$ne": "completed"}},
                 {"$set": {"payment_status": "failed"}}
             )
+            for payment in expired
+        ]
+        if enrollment_ops:
+            await self.db.enrollments.bulk_write(enrollment_ops, ordered=False)
         
-        logger.info(f"Marked {len(expired_payments)} payments as expired")
-        return len(expired_payments)
\ No newline at end of file
+        return result.modified_count
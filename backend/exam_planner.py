@@ -0,0 +1,354 @@
+# Batch planning of exam days: experts, time slots and locations for a whole state
+import os
+import uuid
+import logging
+from datetime import datetime, date, timedelta
+from typing import Dict, List, Optional, Set, Tuple
+
+from pymongo import UpdateOne
+
+from expert_assignment import ExpertAssignmentService
+
+logger = logging.getLogger(__name__)
+
+EXAM_DAY_START_HOUR = int(os.environ.get('EXAM_DAY_START_HOUR', '8'))
+EXAM_DAY_END_HOUR = int(os.environ.get('EXAM_DAY_END_HOUR', '18'))
+EXAM_DURATION_MINUTES = 90
+SLOTS_PER_DAY = (EXAM_DAY_END_HOUR - EXAM_DAY_START_HOUR) * 60 // EXAM_DURATION_MINUTES
+
+# Plan costs: one more exam on the expert's day, a location the expert is not
+# already at that day, and taking the exam away from its current expert
+LOAD_COST = 1.0
+TRAVEL_COST = 3.0
+REASSIGN_COST = 0.5
+
+def slot_time(day: date, index: int) -> datetime:
+    return datetime.combine(day, datetime.min.time()) + timedelta(
+        hours=EXAM_DAY_START_HOUR, minutes=index * EXAM_DURATION_MINUTES
+    )
+
+def slot_index(scheduled_at: datetime) -> Optional[int]:
+    """Slot an existing exam occupies, or None outside the exam day"""
+    minutes = (scheduled_at - slot_time(scheduled_at.date(), 0)).total_seconds() / 60
+    index = int(minutes // EXAM_DURATION_MINUTES)
+    return index if 0 <= index < SLOTS_PER_DAY else None
+
+def plan_exam_days(exams: List[dict], experts: List[dict], days: List[date],
+                   busy: Optional[Dict[Tuple[str, date], Set[int]]] = None,
+                   max_per_day: int = SLOTS_PER_DAY) -> dict:
+    """Assign exams to experts, days and time slots with a greedy pass and a repair pass.
+
+    ``exams`` carry id, exam_type, location, scheduled_at (the requested
+    time) and external_expert_id; ``experts`` carry id and specialization.
+    ``busy`` holds slots taken by exams outside this plan. Exams are placed
+    most constrained first on their requested day with the cheapest
+    expert. Exams that do not fit are repaired by moving one exam of a full
+    expert to another expert with room, then by shifting to the nearest
+    day of the horizon with capacity. Exams keep their requested time when
+    it is still free on their expert's day; the others get the free slot
+    closest to the time of day they asked for.
+
+    Returns ``{"assignments": {exam_id: (expert_id, scheduled_at)},
+    "unassigned": [exam_id], "moved_days": int, "repaired": int}``.
+    """
+    busy = busy or {}
+    horizon = set(days)
+    experts_by_type: Dict[str, List[str]] = {}
+    for expert in experts:
+        for exam_type in expert.get("specialization", []):
+            experts_by_type.setdefault(exam_type, []).append(expert["id"])
+
+    def capacity(expert_id: str, day: date) -> int:
+        return min(max_per_day, SLOTS_PER_DAY - len(busy.get((expert_id, day), ())))
+
+    # (expert_id, day) -> exams placed there
+    placed: Dict[Tuple[str, date], List[dict]] = {}
+    where: Dict[str, Tuple[str, date]] = {}
+
+    def cost(exam: dict, expert_id: str, day: date) -> float:
+        day_exams = placed.get((expert_id, day), [])
+        travel = TRAVEL_COST if day_exams and all(e["location"] != exam["location"] for e in day_exams) else 0.0
+        reassign = REASSIGN_COST if expert_id != exam.get("external_expert_id") else 0.0
+        return LOAD_COST * len(day_exams) + travel + reassign
+
+    def best_expert(exam: dict, day: date) -> Optional[str]:
+        candidates = [
+            expert_id for expert_id in experts_by_type.get(exam["exam_type"], [])
+            if len(placed.get((expert_id, day), ())) < capacity(expert_id, day)
+        ]
+        return min(candidates, key=lambda expert_id: cost(exam, expert_id, day)) if candidates else None
+
+    def place(exam: dict, expert_id: str, day: date):
+        placed.setdefault((expert_id, day), []).append(exam)
+        where[exam["id"]] = (expert_id, day)
+
+    def unplace(exam: dict):
+        expert_id, day = where.pop(exam["id"])
+        placed[(expert_id, day)].remove(exam)
+
+    # Greedy: fewest eligible experts first, then by requested time
+    order = sorted(exams, key=lambda e: (len(experts_by_type.get(e["exam_type"], [])), e["scheduled_at"]))
+    unassigned = []
+    for exam in order:
+        day = exam["scheduled_at"].date()
+        expert_id = best_expert(exam, day) if day in horizon else None
+        if expert_id:
+            place(exam, expert_id, day)
+        else:
+            unassigned.append(exam)
+
+    # Repair 1: free a full expert on the requested day by moving one of its exams to another expert
+    repaired = 0
+    still_unassigned = []
+    for exam in unassigned:
+        day = exam["scheduled_at"].date()
+        done = False
+        spare = {
+            expert["id"] for expert in experts
+            if len(placed.get((expert["id"], day), ())) < capacity(expert["id"], day)
+        } if day in horizon else set()
+        if spare:
+            for expert_id in experts_by_type.get(exam["exam_type"], []):
+                for other in list(placed.get((expert_id, day), [])):
+                    alternatives = [
+                        alt for alt in experts_by_type.get(other["exam_type"], [])
+                        if alt in spare and alt != expert_id
+                    ]
+                    if alternatives:
+                        unplace(other)
+                        place(other, min(alternatives, key=lambda alt: cost(other, alt, day)), day)
+                        place(exam, expert_id, day)
+                        repaired += 1
+                        done = True
+                        break
+                if done:
+                    break
+        if not done:
+            still_unassigned.append(exam)
+
+    # Repair 2: nearest other day of the horizon with capacity, later days first on ties
+    moved_days = 0
+    final_unassigned = []
+    for exam in still_unassigned:
+        requested = exam["scheduled_at"].date()
+        for day in sorted(days, key=lambda d: (abs((d - requested).days), d < requested)):
+            if day == requested:
+                continue
+            expert_id = best_expert(exam, day)
+            if expert_id:
+                place(exam, expert_id, day)
+                moved_days += 1
+                break
+        else:
+            final_unassigned.append(exam["id"])
+
+    # Time slots: exams keep their requested time when it is free on the expert's day,
+    # the others take the free slot nearest to their requested time of day
+    duration = timedelta(minutes=EXAM_DURATION_MINUTES)
+    assignments = {}
+    for (expert_id, day), day_exams in placed.items():
+        day_start = slot_time(day, 0)
+        day_end = day_start + timedelta(hours=EXAM_DAY_END_HOUR - EXAM_DAY_START_HOUR)
+        taken = [slot_time(day, index) for index in busy.get((expert_id, day), ())]
+
+        def overlaps(start: datetime, others: List[datetime]) -> bool:
+            return any(start < other + duration and other < start + duration for other in others)
+
+        kept = []
+        for exam in sorted(day_exams, key=lambda e: e["scheduled_at"]):
+            start = exam["scheduled_at"]
+            if day_start <= start and start + duration <= day_end and not overlaps(start, taken + [e["scheduled_at"] for e in kept]):
+                kept.append(exam)
+        rest = [exam for exam in day_exams if exam not in kept]
+
+        def free_slots() -> List[int]:
+            starts = taken + [exam["scheduled_at"] for exam in kept]
+            return [index for index in range(SLOTS_PER_DAY) if not overlaps(slot_time(day, index), starts)]
+
+        # A kept time between two slots blocks both; give such times up until everyone fits
+        free = free_slots()
+        while len(free) < len(rest):
+            off_grid = [exam for exam in kept if slot_index(exam["scheduled_at"]) is None or
+                        slot_time(day, slot_index(exam["scheduled_at"])) != exam["scheduled_at"]]
+            kept.remove(off_grid[-1])
+            rest.append(off_grid[-1])
+            free = free_slots()
+
+        for exam in kept:
+            assignments[exam["id"]] = (expert_id, exam["scheduled_at"])
+        for exam in sorted(rest, key=lambda e: e["scheduled_at"]):
+            wanted = datetime.combine(day, exam["scheduled_at"].time())
+            index = min(free, key=lambda i: (abs(slot_time(day, i) - wanted), i))
+            free.remove(index)
+            assignments[exam["id"]] = (expert_id, slot_time(day, index))
+
+    return {
+        "assignments": assignments,
+        "unassigned": final_unassigned,
+        "moved_days": moved_days,
+        "repaired": repaired
+    }
+
+class ExamPlanner:
+    """Re-plan the ungraded exams of a state over a horizon of days and store the result"""
+
+    def __init__(self, db_client):
+        self.db = db_client.driving_school_platform
+
+    async def plan_state(self, state: str, start: date, days: int, apply: bool = True,
+                         max_per_day: Optional[int] = None) -> dict:
+        horizon = [start + timedelta(days=i) for i in range(days)]
+        range_start = datetime.combine(start, datetime.min.time())
+        range_end = range_start + timedelta(days=days)
+
+        exams = await self.db.exam_schedules.find(
+            {"state": state, "status": "available", "scheduled_at": {"$gte": range_start, "$lt": range_end}},
+            {"_id": 0, "id": 1, "student_id": 1, "exam_type": 1, "location": 1, "scheduled_at": 1, "external_expert_id": 1}
+        ).to_list(length=None)
+        experts = await self.db.external_experts.find(
+            {"available_states": state, "is_available": True},
+            {"_id": 0, "id": 1, "specialization": 1}
+        ).to_list(length=None)
+        if not exams:
+            return {"plan_id": None, "exams": 0, "assigned": 0, "unassigned": [], "moved_days": 0, "repaired": 0}
+
+        # Slots the same experts already hold in other states stay untouched
+        busy: Dict[Tuple[str, date], Set[int]] = {}
+        async for exam in self.db.exam_schedules.find(
+            {
+                "external_expert_id": {"$in": [expert["id"] for expert in experts]},
+                "scheduled_at": {"$gte": range_start, "$lt": range_end},
+                "state": {"$ne": state}
+            },
+            {"_id": 0, "external_expert_id": 1, "scheduled_at": 1}
+        ):
+            index = slot_index(exam["scheduled_at"])
+            if index is not None:
+                busy.setdefault((exam["external_expert_id"], exam["scheduled_at"].date()), set()).add(index)
+
+        plan = plan_exam_days(
+            exams, experts, horizon, busy,
+            max_per_day=max_per_day or ExpertAssignmentService.MAX_EXAMS_PER_DAY
+        )
+        plan_id = str(uuid.uuid4())
+        result = {
+            "plan_id": plan_id,
+            "exams": len(exams),
+            "assigned": len(plan["assignments"]),
+            "unassigned": plan["unassigned"],
+            "moved_days": plan["moved_days"],
+            "repaired": plan["repaired"]
+        }
+        if apply:
+            await self._apply(plan_id, exams, plan["assignments"])
+        return result
+
+    async def _apply(self, plan_id: str, exams: List[dict], assignments: Dict[str, tuple]):
+        """Write the plan with one bulk write, shift the daily load counters and notify about moved exams.
+
+        Exams graded or cancelled since they were read do not match the
+        update; only exams that now carry this plan's id count as moved.
+        """
+        now = datetime.utcnow()
+        updates = []
+        changed = {}
+        for exam in exams:
+            if exam["id"] not in assignments:
+                continue
+            expert_id, scheduled_at = assignments[exam["id"]]
+            if expert_id == exam.get("external_expert_id") and scheduled_at == exam["scheduled_at"]:
+                continue
+            updates.append(UpdateOne(
+                {"id": exam["id"], "status": "available"},
+                {"$set": {
+                    "external_expert_id": expert_id,
+                    "scheduled_at": scheduled_at,
+                    "plan_id": plan_id,
+                    "planned_at": now
+                }}
+            ))
+            changed[exam["id"]] = exam
+
+        if not updates:
+            logger.info(f"Exam plan {plan_id}: 0 exams rescheduled")
+            return
+        await self.db.exam_schedules.bulk_write(updates, ordered=False)
+        moved = [changed[exam_id] for exam_id in await self.db.exam_schedules.distinct("id", {"plan_id": plan_id})]
+
+        load_delta: Dict[Tuple[str, str], int] = {}
+        for exam in moved:
+            expert_id, scheduled_at = assignments[exam["id"]]
+            old_key = (exam.get("external_expert_id"), exam["scheduled_at"].date().isoformat())
+            new_key = (expert_id, scheduled_at.date().isoformat())
+            if old_key != new_key:
+                load_delta[old_key] = load_delta.get(old_key, 0) - 1
+                load_delta[new_key] = load_delta.get(new_key, 0) + 1
+
+        # $inc keeps reservations made by schedule_exam while the plan ran
+        load_updates = [
+            UpdateOne(
+                {"_id": f"{expert_id}:{day}"},
+                {"$inc": {"count": delta}, "$setOnInsert": {"expert_id": expert_id, "date": day}, "$set": {"updated_at": now}},
+                upsert=True
+            )
+            for (expert_id, day), delta in load_delta.items()
+            if expert_id and delta
+        ]
+        if load_updates:
+            await self.db.expert_daily_load.bulk_write(load_updates, ordered=False)
+
+        await self._notify_moved(plan_id, moved, assignments)
+        logger.info(f"Exam plan {plan_id}: {len(moved)} exams rescheduled")
+
+    async def _notify_moved(self, plan_id: str, moved: List[dict], assignments: Dict[str, tuple]):
+        """Tell students, their new experts and experts who lost an exam about each move"""
+        from enhanced_notifications import EnhancedNotificationService, NotificationPriority, NotificationChannel
+
+        expert_ids = {assignments[exam["id"]][0] for exam in moved} | {exam.get("external_expert_id") for exam in moved}
+        expert_users = {
+            expert["id"]: expert.get("user_id")
+            async for expert in self.db.external_experts.find(
+                {"id": {"$in": [expert_id for expert_id in expert_ids if expert_id]}}, {"_id": 0, "id": 1, "user_id": 1}
+            )
+        }
+
+        notifications = []
+        for exam in moved:
+            expert_id, scheduled_at = assignments[exam["id"]]
+            when = scheduled_at.strftime("%Y-%m-%d %H:%M")
+            metadata = {
+                "exam_id": exam["id"],
+                "plan_id": plan_id,
+                "scheduled_at": scheduled_at.isoformat(),
+                "previous_scheduled_at": exam["scheduled_at"].isoformat()
+            }
+            recipients = []
+            if exam.get("student_id"):
+                recipients.append((exam["student_id"], "Exam Rescheduled",
+                                   f"Your {exam['exam_type']} exam at {exam['location']} is now on {when}.",
+                                   NotificationPriority.HIGH, [NotificationChannel.EMAIL, NotificationChannel.IN_APP]))
+            if expert_users.get(expert_id):
+                recipients.append((expert_users[expert_id], "Exam Assigned",
+                                   f"You examine a {exam['exam_type']} exam at {exam['location']} on {when}.",
+                                   NotificationPriority.MEDIUM, [NotificationChannel.IN_APP]))
+            previous_expert = exam.get("external_expert_id")
+            if previous_expert != expert_id and expert_users.get(previous_expert):
+                recipients.append((expert_users[previous_expert], "Exam Reassigned",
+                                   f"The {exam['exam_type']} exam at {exam['location']} on "
+                                   f"{exam['scheduled_at'].strftime('%Y-%m-%d %H:%M')} was assigned to another expert.",
+                                   NotificationPriority.MEDIUM, [NotificationChannel.IN_APP]))
+            notifications.extend(
+                {
+                    "user_id": user_id,
+                    "notification_type": "exam_rescheduled",
+                    "title": title,
+                    "message": message,
+                    "priority": priority,
+                    "channels": channels,
+                    "metadata": metadata
+                }
+                for user_id, title, message, priority, channels in recipients
+            )
+
+        if notifications:
+            await EnhancedNotificationService(self.db._client).create_notifications(notifications)
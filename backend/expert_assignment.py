@@ -0,0 +1,138 @@
+# Load-aware assignment of external experts to exams
+import os
+import heapq
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+class ExpertAssignmentService:
+    """Pick the least-loaded eligible expert for an exam day and reserve the slot.
+
+    Each expert has a daily capacity. The number of exams booked per expert
+    and day lives in ``expert_daily_load``; a reservation is one conditional
+    upsert that only succeeds while the count is under capacity, so
+    concurrent requests (in any worker) cannot overbook an expert.
+    """
+
+    MAX_EXAMS_PER_DAY = int(os.environ.get('EXPERT_MAX_EXAMS_PER_DAY', '8'))
+
+    def __init__(self, db_client):
+        self.db = db_client.driving_school_platform
+
+    @staticmethod
+    def load_key(expert_id: str, day: str) -> str:
+        return f"{expert_id}:{day}"
+
+    async def find_eligible_experts(self, exam_type: str, state: str) -> List[dict]:
+        """Available experts covering the state and exam type (served by the available_states index)"""
+        return await self.db.external_experts.find(
+            {"available_states": state, "is_available": True, "specialization": exam_type},
+            {"_id": 0, "id": 1, "user_id": 1, "rating": 1}
+        ).to_list(length=None)
+
+    async def get_loads(self, expert_ids: List[str], days: List[str]) -> Dict[Tuple[str, str], int]:
+        """Booked exam counts per (expert_id, day) in one query; missing entries are zero"""
+        keys = [self.load_key(expert_id, day) for expert_id in expert_ids for day in days]
+        return {
+            (row["expert_id"], row["date"]): row["count"]
+            async for row in self.db.expert_daily_load.find({"_id": {"$in": keys}})
+        }
+
+    async def reserve(self, expert_id: str, day: str) -> bool:
+        """Atomically take one unit of an expert's capacity for a day"""
+        try:
+            await self.db.expert_daily_load.update_one(
+                {"_id": self.load_key(expert_id, day), "count": {"$lt": self.MAX_EXAMS_PER_DAY}},
+                {
+                    "$inc": {"count": 1},
+                    "$setOnInsert": {"expert_id": expert_id, "date": day},
+                    "$set": {"updated_at": datetime.utcnow()}
+                },
+                upsert=True
+            )
+            return True
+        except DuplicateKeyError:
+            # The day exists and is at capacity, so the filter missed and the upsert collided
+            return False
+
+    async def release(self, expert_id: str, day: str):
+        """Give back a unit of capacity, e.g. when the exam could not be stored"""
+        await self.db.expert_daily_load.update_one(
+            {"_id": self.load_key(expert_id, day), "count": {"$gt": 0}},
+            {"$inc": {"count": -1}, "$set": {"updated_at": datetime.utcnow()}}
+        )
+
+    async def rebuild_daily_loads(self) -> int:
+        """Recount every expert's booked exams per day from ``exam_schedules`` (backfill/repair).
+
+        Counts are overwritten, so reservations made while the recount runs
+        can be lost; run it before assignment is enabled or while exam
+        booking is quiet.
+        """
+        loads = await self.db.exam_schedules.aggregate([
+            {"$match": {"external_expert_id": {"$ne": None}}},
+            {
+                "$group": {
+                    "_id": {
+                        "expert_id": "$external_expert_id",
+                        "date": {"$dateToString": {"format": "%Y-%m-%d", "date": "$scheduled_at"}}
+                    },
+                    "count": {"$sum": 1}
+                }
+            }
+        ], allowDiskUse=True).to_list(length=None)
+
+        now = datetime.utcnow()
+        keys = [self.load_key(load["_id"]["expert_id"], load["_id"]["date"]) for load in loads]
+        updates = [
+            UpdateOne(
+                {"_id": key},
+                {"$set": {
+                    "expert_id": load["_id"]["expert_id"],
+                    "date": load["_id"]["date"],
+                    "count": load["count"],
+                    "updated_at": now
+                }},
+                upsert=True
+            )
+            for key, load in zip(keys, loads)
+        ]
+        # Days whose exams are all gone keep no stale count
+        await self.db.expert_daily_load.delete_many({"_id": {"$nin": keys}})
+        for i in range(0, len(updates), 1000):
+            await self.db.expert_daily_load.bulk_write(updates[i:i + 1000], ordered=False)
+        return len(updates)
+
+    async def assign(self, exam_type: str, state: str, preferred_times: List[datetime]) -> Optional[Tuple[dict, datetime]]:
+        """Reserve the least-loaded eligible expert on the first preferred day with capacity.
+
+        Returns ``(expert, scheduled_at)`` or None when every eligible expert
+        is full on every preferred day.
+        """
+        experts = await self.find_eligible_experts(exam_type, state)
+        if not experts or not preferred_times:
+            return None
+
+        days = [scheduled_at.date().isoformat() for scheduled_at in preferred_times]
+        loads = await self.get_loads([expert["id"] for expert in experts], days)
+
+        for scheduled_at, day in zip(preferred_times, days):
+            # Least loaded first, better rated on ties
+            heap = [
+                (loads.get((expert["id"], day), 0), -expert.get("rating", 0.0), expert["id"], expert)
+                for expert in experts
+                if loads.get((expert["id"], day), 0) < self.MAX_EXAMS_PER_DAY
+            ]
+            heapq.heapify(heap)
+            while heap:
+                _, _, expert_id, expert = heapq.heappop(heap)
+                if await self.reserve(expert_id, day):
+                    return expert, scheduled_at
+                # Filled up by a concurrent request since the load was read
+                logger.info(f"Expert {expert_id} reached capacity on {day}, trying the next one")
+        return None
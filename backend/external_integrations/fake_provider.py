@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+# Fake BaridiMob / Daily.co server with latency and failure injection for local benchmarking
+import argparse
+import asyncio
+import random
+import uuid
+
+from aiohttp import web
+
+class FaultConfig:
+    """Injected behaviour; every field can be overridden per request via query string"""
+
+    def __init__(self, latency_ms: float = 50, jitter_ms: float = 0, failure_rate: float = 0.0, hang_rate: float = 0.0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.failure_rate = failure_rate
+        self.hang_rate = hang_rate
+
+    def for_request(self, request: web.Request) -> "FaultConfig":
+        query = request.query
+        return FaultConfig(
+            latency_ms=float(query.get("latency_ms", self.latency_ms)),
+            jitter_ms=float(query.get("jitter_ms", self.jitter_ms)),
+            failure_rate=float(query.get("failure_rate", self.failure_rate)),
+            hang_rate=float(query.get("hang_rate", self.hang_rate))
+        )
+
+async def _inject_faults(request: web.Request):
+    config = request.app["faults"].for_request(request)
+    request.app["stats"]["requests"] += 1
+
+    if random.random() < config.hang_rate:
+        # Longer than any client timeout
+        await asyncio.sleep(3600)
+
+    delay = config.latency_ms + random.uniform(0, config.jitter_ms)
+    await asyncio.sleep(delay / 1000)
+
+    if random.random() < config.failure_rate:
+        request.app["stats"]["failures"] += 1
+        raise web.HTTPServiceUnavailable(text='{"error": "injected failure"}', content_type="application/json")
+
+async def create_payment(request: web.Request):
+    """Mimics BaridiMob POST /v1/payments"""
+    await _inject_faults(request)
+    payload = await request.json()
+    payment_id = str(uuid.uuid4())
+    return web.json_response({
+        "payment_id": payment_id,
+        "payment_url": f"http://{request.host}/pay/{payment_id}",
+        "reference": f"BM{payload.get('order_id', payment_id)[:8].upper()}",
+        "expires_at": None
+    })
+
+async def create_room(request: web.Request):
+    """Mimics Daily.co POST /rooms"""
+    await _inject_faults(request)
+    payload = await request.json()
+    name = payload.get("name") or str(uuid.uuid4())
+    return web.json_response({"id": str(uuid.uuid4()), "name": name, "url": f"http://{request.host}/{name}"})
+
+async def update_config(request: web.Request):
+    """Change the injected faults at runtime: POST /admin/faults {"latency_ms": 500, ...}"""
+    payload = await request.json()
+    faults = request.app["faults"]
+    for key in ("latency_ms", "jitter_ms", "failure_rate", "hang_rate"):
+        if key in payload:
+            setattr(faults, key, float(payload[key]))
+    return web.json_response(vars(faults))
+
+async def get_stats(request: web.Request):
+    return web.json_response(request.app["stats"])
+
+def create_app(faults: FaultConfig = None) -> web.Application:
+    app = web.Application()
+    app["faults"] = faults or FaultConfig()
+    app["stats"] = {"requests": 0, "failures": 0}
+    app.router.add_post("/v1/payments", create_payment)
+    app.router.add_post("/rooms", create_room)
+    app.router.add_post("/admin/faults", update_config)
+    app.router.add_get("/admin/stats", get_stats)
+    return app
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake payment/video provider")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--hang-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    web.run_app(
+        create_app(FaultConfig(args.latency_ms, args.jitter_ms, args.failure_rate, args.hang_rate)),
+        port=args.port
+    )
@@ -0,0 +1,230 @@
+# Shared async outbound client for third-party providers (BaridiMob, Daily.co, Cloudinary)
+import os
+import time
+import asyncio
+import logging
+from typing import Any, AsyncIterator, Callable, Dict, Optional
+
+import aiohttp
+from cloudinary.exceptions import GeneralError as CloudinaryGeneralError
+
+logger = logging.getLogger(__name__)
+
+class ProviderUnavailableError(Exception):
+    """Raised when a provider call is refused or fails; callers fall back to simulation"""
+
+# Errors that mean the provider could not be reached or failed on its side. Cloudinary's
+# SDK raises GeneralError for socket errors and 5xx, and other Error subclasses for 4xx.
+PROVIDER_FAILURES = (
+    ProviderUnavailableError,
+    aiohttp.ClientError,
+    asyncio.TimeoutError,
+    ConnectionError,
+    CloudinaryGeneralError
+)
+
+class CircuitOpenError(ProviderUnavailableError):
+    pass
+
+class BulkheadFullError(ProviderUnavailableError):
+    pass
+
+class ProviderResponse:
+    def __init__(self, status: int, data: Any, text: str):
+        self.status = status
+        self.data = data
+        self.text = text
+
+class CircuitBreaker:
+    """Open after consecutive failures, then let one trial call through after a cool-down"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+
+    def before_call(self):
+        if self.state == self.OPEN:
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                raise CircuitOpenError("Circuit open")
+            self.state = self.HALF_OPEN
+        elif self.state == self.HALF_OPEN:
+            # A trial call is already in flight
+            raise CircuitOpenError("Circuit half-open")
+
+    def record_success(self):
+        self.state = self.CLOSED
+        self.failures = 0
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+class ProviderClient:
+    """Keep-alive connection pool, timeout, bulkhead and circuit breaker for one provider"""
+
+    def __init__(
+        self,
+        name: str,
+        base_url: str = "",
+        timeout: float = 10.0,
+        max_concurrency: int = 20,
+        pool_size: int = 20,
+        acquire_timeout: float = 1.0,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0
+    ):
+        self.name = name
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.acquire_timeout = acquire_timeout
+        self.bulkhead = asyncio.Semaphore(max_concurrency)
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=30)
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout)
+            )
+        return self._session
+
+    async def _enter(self):
+        """Pass the breaker and take a bulkhead slot"""
+        self.breaker.before_call()
+        try:
+            await asyncio.wait_for(self.bulkhead.acquire(), timeout=self.acquire_timeout)
+        except asyncio.TimeoutError:
+            if self.breaker.state == CircuitBreaker.HALF_OPEN:
+                # Give the trial slot back instead of leaving the breaker stuck half-open
+                self.breaker.record_failure()
+            raise BulkheadFullError(f"{self.name}: too many concurrent calls")
+
+    def _failed(self, error: Exception) -> Exception:
+        """Record a failed call and return the exception to raise.
+
+        Transport errors, timeouts and 5xx count against the breaker and
+        become ProviderUnavailableError. Anything else (4xx, validation
+        errors) means the provider answered, so it is passed through unchanged.
+        """
+        if not isinstance(error, PROVIDER_FAILURES):
+            self.breaker.record_success()
+            return error
+        self.breaker.record_failure()
+        logger.warning(f"{self.name} call failed ({self.breaker.state}): {str(error) or type(error).__name__}")
+        if isinstance(error, ProviderUnavailableError):
+            return error
+        wrapped = ProviderUnavailableError(f"{self.name}: {str(error) or type(error).__name__}")
+        wrapped.__cause__ = error
+        return wrapped
+
+    async def _guarded(self, call: Callable):
+        """Run a coroutine factory inside the breaker and bulkhead"""
+        await self._enter()
+        try:
+            result = await call()
+        except Exception as e:
+            raise self._failed(e)
+        finally:
+            self.bulkhead.release()
+
+        self.breaker.record_success()
+        return result
+
+    async def request(self, method: str, path: str, **kwargs) -> ProviderResponse:
+        """Send an HTTP request; 5xx responses count as failures for the breaker"""
+        url = path if path.startswith("http") else f"{self.base_url}{path}"
+
+        async def call():
+            async with self._get_session().request(method, url, **kwargs) as response:
+                text = await response.text()
+                if response.status >= 500:
+                    raise ProviderUnavailableError(f"HTTP {response.status}")
+                try:
+                    data = await response.json(content_type=None)
+                except ValueError:
+                    data = None
+                return ProviderResponse(response.status, data, text)
+
+        return await self._guarded(call)
+
+    async def iter_bytes(self, url: str, chunk_size: int = 64 * 1024) -> AsyncIterator[bytes]:
+        """Stream a response body, e.g. a stored file, without buffering it.
+
+        Uses the shared pool and timeout; the breaker is not involved because
+        the call outlives a single await.
+        """
+        async with self._get_session().get(url) as response:
+            if response.status >= 400:
+                raise ProviderUnavailableError(f"{self.name}: HTTP {response.status}")
+            async for chunk in response.content.iter_chunked(chunk_size):
+                yield chunk
+
+    async def run_sync(self, func: Callable, *args, **kwargs):
+        """Run a blocking SDK call in a worker thread under the same protections.
+
+        A thread cannot be cancelled, so on timeout the caller gets an error
+        but the bulkhead slot is only released once the thread finishes.
+        """
+        await self._enter()
+        thread = asyncio.ensure_future(asyncio.to_thread(func, *args, **kwargs))
+        thread.add_done_callback(self._release_thread_slot)
+        try:
+            result = await asyncio.wait_for(asyncio.shield(thread), timeout=self.timeout)
+        except Exception as e:
+            raise self._failed(e)
+
+        self.breaker.record_success()
+        return result
+
+    def _release_thread_slot(self, thread: asyncio.Future):
+        self.bulkhead.release()
+        if not thread.cancelled() and thread.exception() is not None:
+            # Already reported to the caller, or abandoned after a timeout
+            logger.debug(f"{self.name} worker thread ended with: {str(thread.exception())}")
+
+    async def close(self):
+        if self._session and not self._session.closed:
+            await self._session.close()
+
+# Per-provider limits, overridable through the environment
+PROVIDER_SETTINGS = {
+    "baridimob": {
+        "timeout": float(os.environ.get('BARIDIMOB_TIMEOUT_SECONDS', '10')),
+        "max_concurrency": int(os.environ.get('BARIDIMOB_MAX_CONCURRENCY', '20')),
+    },
+    "daily": {
+        "timeout": float(os.environ.get('DAILY_TIMEOUT_SECONDS', '5')),
+        "max_concurrency": int(os.environ.get('DAILY_MAX_CONCURRENCY', '10')),
+    },
+    "cloudinary": {
+        "timeout": float(os.environ.get('CLOUDINARY_TIMEOUT_SECONDS', '60')),
+        "max_concurrency": int(os.environ.get('CLOUDINARY_MAX_CONCURRENCY', '8')),
+    },
+}
+
+_clients: Dict[str, ProviderClient] = {}
+
+def get_provider_client(name: str, base_url: str = "") -> ProviderClient:
+    """Return the shared client for a provider, creating it on first use"""
+    client = _clients.get(name)
+    if client is None:
+        client = ProviderClient(name, base_url=base_url, **PROVIDER_SETTINGS.get(name, {}))
+        _clients[name] = client
+    return client
+
+async def close_provider_clients():
+    for client in _clients.values():
+        await client.close()
+    _clients.clear()
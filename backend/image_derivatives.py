@@ -0,0 +1,210 @@
+# Image derivatives (thumbnails, WebP) rendered on a process pool
+import io
+import os
+import asyncio
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import BinaryIO, Dict, Optional, Union
+
+import cloudinary.utils
+from PIL import ExifTags, Image, ImageOps
+
+from storage import StorageBackend, LocalStorage, CloudinaryStorage
+
+logger = logging.getLogger(__name__)
+
+# Bounding box, encoder and quality of each derivative
+IMAGE_VARIANTS = {
+    "medium": {"max_size": 1280, "format": "WEBP", "quality": 80},
+    "thumb": {"max_size": 256, "format": "WEBP", "quality": 75},
+}
+
+IMAGE_CONTENT_TYPES = {"image/jpeg", "image/png", "image/webp", "image/gif", "image/bmp", "image/tiff"}
+
+# Refuse decompression bombs instead of exhausting a worker
+MAX_IMAGE_PIXELS = 80_000_000
+
+IMAGE_WORKERS = int(os.environ.get('IMAGE_WORKERS', str(min(4, os.cpu_count() or 1))))
+
+def render_variants(source: Union[str, bytes], variants: Dict[str, dict]) -> Dict[str, bytes]:
+    """Decode an image once and encode each variant without EXIF or other metadata.
+
+    Runs in a worker process. Variants are produced largest first, each one
+    downscaled from the previous to keep the resampling cheap.
+    """
+    Image.MAX_IMAGE_PIXELS = MAX_IMAGE_PIXELS
+    largest = max(spec["max_size"] for spec in variants.values())
+
+    with Image.open(source if isinstance(source, str) else io.BytesIO(source)) as image:
+        # Lets the JPEG decoder downscale by a power of two while decoding
+        image.draft("RGB", (largest, largest))
+        # Apply the camera orientation before the EXIF block is dropped
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if image.mode in ("P", "LA", "PA") else "RGB")
+
+        rendered = {}
+        current = image
+        for name, spec in sorted(variants.items(), key=lambda item: -item[1]["max_size"]):
+            current = current.copy()
+            current.thumbnail((spec["max_size"], spec["max_size"]), Image.LANCZOS)
+            output = io.BytesIO()
+            current.save(output, format=spec["format"], quality=spec["quality"])
+            rendered[name] = output.getvalue()
+        return rendered
+
+# Formats whose metadata strip_image_metadata removes; others are stored as uploaded
+METADATA_STRIP_FORMATS = {"JPEG", "PNG", "WEBP"}
+
+def strip_image_metadata(fileobj: BinaryIO) -> Optional[bytes]:
+    """Re-encode an uploaded image without EXIF (GPS position, camera serial) or XMP.
+
+    The camera orientation is applied to the pixels first and the colour
+    profile is kept. JPEGs that need no rotation reuse their original
+    quantization tables. Returns None when there is nothing to strip or the
+    image cannot be decoded; the caller then stores the file unchanged.
+    """
+    Image.MAX_IMAGE_PIXELS = MAX_IMAGE_PIXELS
+    fileobj.seek(0)
+    try:
+        with Image.open(fileobj) as image:
+            image_format = image.format
+            exif = image.getexif()
+            if image_format not in METADATA_STRIP_FORMATS or not (
+                exif or "xmp" in image.info or "XML:com.adobe.xmp" in image.info
+            ):
+                return None
+
+            options = {"exif": b"", "xmp": b""}
+            if image.info.get("icc_profile"):
+                options["icc_profile"] = image.info["icc_profile"]
+            if exif.get(ExifTags.Base.Orientation, 1) != 1:
+                cleaned = ImageOps.exif_transpose(image)
+                if image_format == "JPEG":
+                    options["quality"] = 95
+            else:
+                cleaned = image
+                if image_format == "JPEG":
+                    options["quality"] = "keep"
+                    options["subsampling"] = "keep"
+            if image_format == "WEBP":
+                options["lossless"] = image.info.get("lossless", False)
+                options.setdefault("quality", 90)
+
+            output = io.BytesIO()
+            cleaned.save(output, format=image_format, **options)
+            return output.getvalue()
+    except (OSError, SyntaxError, ValueError, Image.DecompressionBombError) as e:
+        logger.warning(f"Could not strip image metadata: {str(e)}")
+        return None
+    finally:
+        fileobj.seek(0)
+
+class ImageDerivativeService:
+    """Generate, store and cache derivatives of stored images.
+
+    Local files are rendered on a process pool and written back through the
+    storage backend, so identical derivatives dedupe like any upload.
+    Cloudinary images use delivery transformations instead of local work.
+    Results are cached per source key in ``file_derivatives``.
+    """
+
+    def __init__(self, db_client, storage: StorageBackend):
+        self.db = db_client.driving_school_platform
+        self.storage = storage
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=IMAGE_WORKERS)
+        return self._executor
+
+    def shutdown(self):
+        if self._executor:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def is_image(self, content_type: Optional[str]) -> bool:
+        return (content_type or "").split(";")[0].strip().lower() in IMAGE_CONTENT_TYPES
+
+    async def get_derivatives(self, source_key: str) -> Optional[Dict[str, str]]:
+        """Return variant URLs for a stored image, generating them on first use.
+
+        Concurrent requests for the same image share one rendering.
+        """
+        cached = await self.db.file_derivatives.find_one({"source_key": source_key})
+        if cached:
+            return cached["variants"]
+
+        pending = self._inflight.get(source_key)
+        if pending:
+            return await asyncio.shield(pending)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[source_key] = future
+        try:
+            variants = await self._generate(source_key)
+            future.set_result(variants)
+            return variants
+        except Exception as e:
+            future.set_exception(e)
+            # Mark the exception as retrieved when nobody else was waiting
+            future.exception()
+            raise
+        finally:
+            del self._inflight[source_key]
+
+    async def _generate(self, source_key: str) -> Optional[Dict[str, str]]:
+        if isinstance(self.storage, CloudinaryStorage):
+            variants = {
+                name: cloudinary.utils.cloudinary_url(
+                    source_key,
+                    width=spec["max_size"],
+                    height=spec["max_size"],
+                    crop="limit",
+                    format=spec["format"].lower(),
+                    quality=spec["quality"],
+                    secure=True
+                )[0]
+                for name, spec in IMAGE_VARIANTS.items()
+            }
+        elif isinstance(self.storage, LocalStorage):
+            path = self.storage.path_for(source_key)
+            if path is None or not path.exists():
+                return None
+
+            rendered = await asyncio.get_running_loop().run_in_executor(
+                self._get_executor(), render_variants, str(path), IMAGE_VARIANTS
+            )
+
+            variants = {}
+            for name, data in rendered.items():
+                spec = IMAGE_VARIANTS[name]
+                result = await self.storage.save(
+                    io.BytesIO(data),
+                    len(data),
+                    folder="derivatives",
+                    filename=f"{name}.{spec['format'].lower()}",
+                    content_type=f"image/{spec['format'].lower()}"
+                )
+                variants[name] = result["file_url"]
+        else:
+            return None
+
+        await self.db.file_derivatives.update_one(
+            {"source_key": source_key},
+            {"$set": {"variants": variants, "created_at": datetime.utcnow()}},
+            upsert=True
+        )
+        return variants
+
+    async def attach(self, collection: str, query: dict, field: str, source_key: str):
+        """Generate derivatives and record them on a document; used after uploads"""
+        try:
+            variants = await self.get_derivatives(source_key)
+            if variants:
+                await self.db[collection].update_one(query, {"$set": {field: variants}})
+        except Exception as e:
+            logger.error(f"Image derivative error for {source_key}: {str(e)}")
@@ -0,0 +1,127 @@
+# In-process pub/sub hub for real-time notification delivery
+import os
+import asyncio
+import logging
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+# Collections whose inserts are pushed to connected clients
+NOTIFICATION_COLLECTIONS = ["notifications", "enhanced_notifications"]
+
+class NotificationHub:
+    """Fan out newly created notifications to per-user subscriber queues.
+
+    In ``local`` mode (default) publishers push directly into the queues of
+    this process. In ``change_stream`` mode publishers are ignored and a
+    MongoDB change stream feeds every worker instead, so clients connected
+    to any worker receive inserts made by any other worker. Change streams
+    need a replica set (a single-node local replica set is enough).
+    """
+
+    def __init__(self, mode: Optional[str] = None, max_queue_size: int = 100):
+        self.mode = mode or os.environ.get('NOTIFICATION_HUB_MODE', 'local')
+        self.max_queue_size = max_queue_size
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = defaultdict(set)
+        self._watch_task: Optional[asyncio.Task] = None
+
+    def subscribe(self, user_id: str) -> asyncio.Queue:
+        """Register a new subscriber queue for a user"""
+        queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self._subscribers[user_id].add(queue)
+        return queue
+
+    def unsubscribe(self, user_id: str, queue: asyncio.Queue):
+        """Remove a subscriber queue"""
+        queues = self._subscribers.get(user_id)
+        if not queues:
+            return
+        queues.discard(queue)
+        if not queues:
+            del self._subscribers[user_id]
+
+    def subscriber_count(self, user_id: Optional[str] = None) -> int:
+        if user_id:
+            return len(self._subscribers.get(user_id, ()))
+        return sum(len(queues) for queues in self._subscribers.values())
+
+    def publish(self, notification: dict, collection: str = "notifications"):
+        """Publish a freshly inserted notification to its user's subscribers"""
+        if self.mode == "change_stream":
+            # The change stream watcher delivers inserts from every worker
+            return
+        self._dispatch(notification, collection)
+
+    def _dispatch(self, notification: dict, collection: str):
+        queues = self._subscribers.get(notification.get("user_id"))
+        if not queues:
+            return
+
+        event = self._serialize(notification)
+        event["source"] = collection
+        for queue in list(queues):
+            if queue.full():
+                # Slow consumer: drop the oldest event rather than block publishers
+                try:
+                    queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    pass
+            queue.put_nowait(event)
+
+    def _serialize(self, notification: dict) -> dict:
+        """Serialize a notification for the event stream"""
+        serialized = {}
+        for key, value in notification.items():
+            if key == '_id':
+                continue
+            elif isinstance(value, datetime):
+                serialized[key] = value.isoformat()
+            elif isinstance(value, dict):
+                serialized[key] = self._serialize(value)
+            else:
+                serialized[key] = value
+        return serialized
+
+    async def start(self, db):
+        """Start the change stream watcher when running in multi-worker mode"""
+        if self.mode == "change_stream" and self._watch_task is None:
+            self._watch_task = asyncio.create_task(self._watch(db))
+            logger.info("Notification hub started in change stream mode")
+
+    async def stop(self):
+        if self._watch_task:
+            self._watch_task.cancel()
+            try:
+                await self._watch_task
+            except asyncio.CancelledError:
+                pass
+            self._watch_task = None
+
+    async def _watch(self, db):
+        """Follow inserts on the notification collections, resuming after errors"""
+        pipeline = [{
+            "$match": {
+                "operationType": "insert",
+                "ns.coll": {"$in": NOTIFICATION_COLLECTIONS}
+            }
+        }]
+        resume_token = None
+        backoff = 1
+
+        while True:
+            try:
+                async with db.watch(pipeline, resume_after=resume_token) as stream:
+                    backoff = 1
+                    async for change in stream:
+                        resume_token = stream.resume_token
+                        self._dispatch(change["fullDocument"], change["ns"]["coll"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Notification change stream error: {str(e)}")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 30)
+
+notification_hub = NotificationHub()
@@ -0,0 +1,103 @@
+# In-process periodic job scheduler for maintenance tasks
+import os
+import uuid
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, List, Optional
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+class PeriodicJob:
+    def __init__(self, name: str, func: Callable[[], Awaitable], interval_seconds: float, initial_delay: float = 0):
+        self.name = name
+        self.func = func
+        self.interval_seconds = interval_seconds
+        self.initial_delay = initial_delay
+        self.last_run_at: Optional[datetime] = None
+        self.last_error: Optional[str] = None
+
+class PeriodicScheduler:
+    """Run registered coroutines on fixed intervals inside the API process.
+
+    With several workers every process runs the loop, but each tick first
+    takes a lease in ``scheduler_leases`` so a job runs on one worker per
+    interval.
+    """
+
+    def __init__(self):
+        self.enabled = os.environ.get('SCHEDULER_ENABLED', 'true').lower() == 'true'
+        self.owner = str(uuid.uuid4())
+        self._jobs: List[PeriodicJob] = []
+        self._tasks: List[asyncio.Task] = []
+        self._db = None
+
+    def add_job(self, name: str, func: Callable[[], Awaitable], interval_seconds: float, initial_delay: float = 0):
+        self._jobs.append(PeriodicJob(name, func, interval_seconds, initial_delay))
+
+    async def start(self, db):
+        if not self.enabled or self._tasks:
+            return
+        self._db = db
+        for job in self._jobs:
+            self._tasks.append(asyncio.create_task(self._run(job)))
+        logger.info(f"Scheduler started with jobs: {[job.name for job in self._jobs]}")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+
+    async def _acquire_lease(self, job: PeriodicJob) -> bool:
+        now = datetime.utcnow()
+        try:
+            lease = await self._db.scheduler_leases.find_one_and_update(
+                {"_id": job.name, "$or": [{"locked_until": {"$lte": now}}, {"owner": self.owner}]},
+                {"$set": {
+                    "owner": self.owner,
+                    # Slightly shorter than the interval so the next tick can take it again
+                    "locked_until": now + timedelta(seconds=job.interval_seconds * 0.9)
+                }},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+            return lease is not None
+        except DuplicateKeyError:
+            # Another worker holds the lease
+            return False
+
+    async def _run(self, job: PeriodicJob):
+        await asyncio.sleep(job.initial_delay)
+        while True:
+            try:
+                if await self._acquire_lease(job):
+                    await job.func()
+                    job.last_run_at = datetime.utcnow()
+                    job.last_error = None
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                job.last_error = str(e)
+                logger.error(f"Scheduled job {job.name} failed: {str(e)}")
+            await asyncio.sleep(job.interval_seconds)
+
+    def status(self) -> list:
+        return [
+            {
+                "name": job.name,
+                "interval_seconds": job.interval_seconds,
+                "last_run_at": job.last_run_at.isoformat() if job.last_run_at else None,
+                "last_error": job.last_error
+            }
+            for job in self._jobs
+        ]
+
+scheduler = PeriodicScheduler()
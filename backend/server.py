@@ -2,17 +2,20 @@ import os
 import uuid
 import logging
 import smtplib
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, date
 from typing import List, Optional, Dict
 from pathlib import Path
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-from fastapi import FastAPI, HTTPException, status, Depends, UploadFile, File, Form, APIRouter, Request
+from fastapi import FastAPI, HTTPException, status, Depends, UploadFile, File, Form, APIRouter, Request, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.staticfiles import StaticFiles
+from fastapi.responses import StreamingResponse, Response, RedirectResponse
 from pydantic import BaseModel, EmailStr
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError, BulkWriteError
 from passlib.context import CryptContext
 import jwt
 from enum import Enum
@@ -21,19 +24,42 @@ import cloudinary
 import cloudinary.uploader
 import cloudinary.api
 import aiofiles
+import aiofiles.os
+import mimetypes
 import json
+import zipfile
 import qrcode
 from io import BytesIO
 import base64
 import sys
 import os
+import asyncio
+import io
 sys.path.append(os.path.dirname(__file__))
 
-from reportlab.lib.pagesizes import letter, A4
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image, Table, TableStyle
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
-from reportlab.lib import colors
+from notification_hub import notification_hub, NOTIFICATION_COLLECTIONS
+from scheduler import scheduler
+from enhanced_notifications import EnhancedNotificationService
+from enhanced_payments import EnhancedPaymentService, iter_statement_batches
+from uploads import (
+    UploadSizeLimitMiddleware, upload_progress, upload_size, MAX_UPLOAD_BYTES, MAX_STATEMENT_UPLOAD_BYTES
+)
+from storage import storage, LocalStorage, parse_range, iter_file
+from image_derivatives import ImageDerivativeService, IMAGE_VARIANTS, strip_image_metadata
+from certificate_renderer import certificate_renderer
+from course_progress import (
+    CourseType, CourseStatus, ExamStatus, SessionStatus, build_sequential_courses, progress_enrollments,
+    advance_course_progress, record_session_completion
+)
+from session_slots import SESSION_DAY_START_HOUR, SESSION_SLOT_MINUTES, mark_busy_slots, free_slot_starts, expand_recurrence
+from document_types import DocumentType, DOCUMENT_TYPE_BITS, document_mask, verified_mask_expression
+from certificate_numbers import CertificateNumberAllocator
+from expert_assignment import ExpertAssignmentService
+from certificate_signing import certificate_signer, revocation_list, certificate_qr_content, InvalidCertificateToken
+from external_integrations.http_client import (
+    get_provider_client, close_provider_clients, ProviderUnavailableError
+)
+
 from reportlab.graphics.shapes import Drawing
 from reportlab.graphics.charts.barcharts import VerticalBarChart
 from reportlab.graphics.charts.linecharts import HorizontalLineChart
@@ -73,17 +99,36 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Cap multipart bodies of the upload routes while they stream in, before they are spooled
+app.add_middleware(UploadSizeLimitMiddleware, limits={
+    "/api/auth/register": MAX_UPLOAD_BYTES,
+    "/api/documents/upload": MAX_UPLOAD_BYTES,
+    "/api/payments/reconcile": MAX_STATEMENT_UPLOAD_BYTES
+})
+
 # Database setup
 MONGO_URL = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
 client = AsyncIOMotorClient(MONGO_URL)
 db = client.driving_school_platform
 
+# Service layer
+notification_service = EnhancedNotificationService(client)
+payment_service = EnhancedPaymentService(client)
+image_service = ImageDerivativeService(client, storage)
+certificate_numbers = CertificateNumberAllocator(client)
+expert_assignment = ExpertAssignmentService(client)
+
 # Security setup
 security = HTTPBearer()
+optional_security = HTTPBearer(auto_error=False)
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 SECRET_KEY = os.environ.get('SECRET_KEY', 'your-secret-key-here')
 ALGORITHM = "HS256"
 
+# Real-time notification stream setup
+SSE_HEARTBEAT_SECONDS = int(os.environ.get('SSE_HEARTBEAT_SECONDS', '15'))
+SSE_RETRY_MS = int(os.environ.get('SSE_RETRY_MS', '5000'))
+
 # Daily.co API setup
 DAILY_API_KEY = os.environ.get('DAILY_API_KEY')
 DAILY_API_URL = os.environ.get('DAILY_API_URL', 'https://api.daily.co/v1')
@@ -112,31 +157,6 @@ class Gender(str, Enum):
     MALE = "male"
     FEMALE = "female"
 
-class CourseType(str, Enum):
-    THEORY = "theory"
-    PARK = "park"
-    ROAD = "road"
-
-class CourseStatus(str, Enum):
-    LOCKED = "locked"  # Can't start yet
-    AVAILABLE = "available"  # Can start
-    IN_PROGRESS = "in_progress"
-    COMPLETED = "completed"
-    FAILED = "failed"
-
-class ExamStatus(str, Enum):
-    NOT_AVAILABLE = "not_available"
-    AVAILABLE = "available"
-    PASSED = "passed"
-    FAILED = "failed"
-
-class DocumentType(str, Enum):
-    PROFILE_PHOTO = "profile_photo"
-    ID_CARD = "id_card"
-    MEDICAL_CERTIFICATE = "medical_certificate"
-    DRIVING_LICENSE = "driving_license"
-    TEACHING_LICENSE = "teaching_license"
-
 class EnrollmentStatus(str, Enum):
     PENDING_DOCUMENTS = "pending_documents"
     PENDING_APPROVAL = "pending_approval"
@@ -169,18 +189,12 @@ class NotificationChannel(str, Enum):
     PUSH = "push"
     IN_APP = "in_app"
 
-class SessionStatus(str, Enum):
-    SCHEDULED = "scheduled"
-    IN_PROGRESS = "in_progress"
-    COMPLETED = "completed"
-    CANCELLED = "cancelled"
-    NO_SHOW = "no_show"
-
 class CertificateStatus(str, Enum):
     NOT_ELIGIBLE = "not_eligible"
     ELIGIBLE = "eligible"
     GENERATED = "generated"
     ISSUED = "issued"
+    REVOKED = "revoked"
 
 # Pydantic Models
 class UserBase(BaseModel):
@@ -290,6 +304,16 @@ class DocumentUpload(BaseModel):
 
 # New Models for Enhanced Functionality
 
+class BulkDocumentVerification(BaseModel):
+    document_ids: List[str]
+    is_verified: bool = True
+
+class BulkEnrollmentApproval(BaseModel):
+    enrollment_ids: List[str]
+
+class CertificateRevocation(BaseModel):
+    reason: str
+
 class Quiz(BaseModel):
     id: str
     course_type: CourseType
@@ -363,6 +387,21 @@ class SessionCreate(BaseModel):
     duration_minutes: int = 60
     location: Optional[str] = None
 
+class SessionSeriesCreate(BaseModel):
+    course_id: str
+    teacher_id: str
+    first_session_at: str  # ISO string
+    frequency: str = "weekly"  # daily, weekly
+    interval: int = 1  # every N days / weeks
+    weekdays: Optional[List[int]] = None  # weekly only, 0 = Monday; defaults to the first session's day
+    count: Optional[int] = None  # defaults to the course's remaining sessions
+    duration_minutes: int = 60
+    location: Optional[str] = None
+
+class SessionSeriesReschedule(BaseModel):
+    offset_minutes: int
+    from_date: Optional[str] = None  # ISO string; defaults to now
+
 class ExternalExpert(BaseModel):
     id: str
     user_id: str
@@ -454,7 +493,7 @@ class Review(BaseModel):
     comment: str
     created_at: datetime
 
-# Algerian States (58 wilayas)
+# Algerian States (58 wilayas), in wilaya code order
 ALGERIAN_STATES = [
     "Adrar", "Chlef", "Laghouat", "Oum El Bouaghi", "Batna", "Béjaïa", "Biskra", 
     "Béchar", "Blida", "Bouira", "Tamanrasset", "Tébessa", "Tlemcen", "Tiaret", 
@@ -468,9 +507,6 @@ ALGERIAN_STATES = [
     "In Guezzam", "Touggourt", "Djanet", "El M'Ghair", "El Meniaa"
 ]
 
-# Course sequence order
-COURSE_SEQUENCE = [CourseType.THEORY, CourseType.PARK, CourseType.ROAD]
-
 # Required documents by role
 REQUIRED_DOCUMENTS = {
     UserRole.STUDENT: [DocumentType.PROFILE_PHOTO, DocumentType.ID_CARD, DocumentType.MEDICAL_CERTIFICATE],
@@ -479,6 +515,24 @@ REQUIRED_DOCUMENTS = {
     UserRole.EXTERNAL_EXPERT: [DocumentType.PROFILE_PHOTO, DocumentType.ID_CARD, DocumentType.DRIVING_LICENSE, DocumentType.TEACHING_LICENSE]
 }
 
+# Largest cohort certified by one batch request
+MAX_COHORT_CERTIFICATES = int(os.environ.get('MAX_COHORT_CERTIFICATES', '2000'))
+# Certificates rendered and stored together by a cohort run
+COHORT_CERTIFICATE_GROUP_SIZE = int(os.environ.get('COHORT_CERTIFICATE_GROUP_SIZE', '8'))
+
+# Numbering state for students registered without one
+DEFAULT_CERTIFICATE_STATE = os.environ.get('DEFAULT_CERTIFICATE_STATE', 'Alger')
+
+# Upper bound on ids accepted by the bulk manager endpoints
+MAX_BULK_IDS = int(os.environ.get('MAX_BULK_IDS', '1000'))
+
+# Longest bookable session; bounds how far back an overlap search has to look
+MAX_SESSION_MINUTES = int(os.environ.get('MAX_SESSION_MINUTES', '240'))
+ACTIVE_SESSION_STATUSES = [SessionStatus.SCHEDULED, SessionStatus.IN_PROGRESS]
+
+# Longest free-slot search window, in days
+MAX_SLOT_SEARCH_DAYS = int(os.environ.get('MAX_SLOT_SEARCH_DAYS', '31'))
+
 # Helper functions
 def hash_password(password: str) -> str:
     return pwd_context.hash(password)
@@ -519,8 +573,23 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     return encoded_jwt
 
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    return await get_user_from_token(credentials.credentials)
+
+async def get_current_user_or_token(
+    token: Optional[str] = None,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security)
+):
+    """Like get_current_user, but also accepts the token as a ``token`` query
+    parameter for URLs opened by the browser itself (links, <img>, EventSource)"""
+    if credentials:
+        token = credentials.credentials
+    if not token:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    return await get_user_from_token(token)
+
+async def get_user_from_token(token: str):
     try:
-        payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         user_id: str = payload.get("sub")
         if user_id is None:
             raise HTTPException(status_code=401, detail="Invalid authentication credentials")
@@ -532,113 +601,280 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
         raise HTTPException(status_code=401, detail="User not found")
     return user
 
-async def check_user_documents_complete(user_id: str, role: str) -> bool:
-    """Check if user has uploaded and verified all required documents"""
-    required_docs = REQUIRED_DOCUMENTS.get(role, [])
+async def insert_notification(notification_doc: dict):
+    """Store an in-app notification and push it to connected clients"""
+    await db.notifications.insert_one(notification_doc)
+    notification_hub.publish(notification_doc)
+
+async def insert_notifications(notification_docs: List[dict]):
+    """Store many in-app notifications in one write and push them to connected clients"""
+    if not notification_docs:
+        return
+    await db.notifications.insert_many(notification_docs)
+    for notification_doc in notification_docs:
+        notification_hub.publish(notification_doc)
+
+def required_documents_mask(role: str) -> int:
+    return document_mask(doc.value for doc in REQUIRED_DOCUMENTS.get(role, []))
+
+async def update_verified_documents(documents: List[dict], is_verified: bool):
+    """Record documents as verified or not on their users and recompute the users' masks.
+
+    Each user keeps the ids of their verified documents per type. One
+    pipeline update per user changes those sets and derives the mask from
+    them, so concurrent verifications of the same user cannot leave a
+    stale bit behind.
+    """
+    by_user = {}
+    for doc in documents:
+        by_user.setdefault(doc["user_id"], {}).setdefault(doc["document_type"], []).append(doc["id"])
     
-    documents_cursor = db.documents.find({
-        "user_id": user_id,
-        "is_verified": True,
-        "document_type": {"$in": [doc.value for doc in required_docs]}
-    })
-    documents = await documents_cursor.to_list(length=None)
+    operator = "$setUnion" if is_verified else "$setDifference"
+    updates = [
+        UpdateOne({"id": user_id}, [
+            {"$set": {
+                f"verified_document_ids.{document_type}": {
+                    operator: [{"$ifNull": [f"$verified_document_ids.{document_type}", []]}, ids]
+                }
+                for document_type, ids in types.items()
+            }},
+            {"$set": {"verified_documents_mask": verified_mask_expression()}}
+        ])
+        for user_id, types in by_user.items()
+    ]
+    if updates:
+        await db.users.bulk_write(updates, ordered=False)
+
+async def get_users_with_complete_documents(user_ids: List[str], role: str) -> set:
+    """Return the subset of users who have all required documents verified"""
+    required_mask = required_documents_mask(role)
+    if not required_mask:
+        return set(user_ids)
     
-    uploaded_types = {doc["document_type"] for doc in documents}
-    required_types = {doc.value for doc in required_docs}
+    return set(await db.users.distinct("id", {
+        "id": {"$in": list(user_ids)},
+        "verified_documents_mask": {"$bitsAllSet": required_mask}
+    }))
+
+async def get_school_member_ids(user_ids: List[str], school_ids: List[str]) -> set:
+    """Return which users are students or teachers of the given schools, in one query"""
+    pipeline = [
+        {"$match": {"student_id": {"$in": list(user_ids)}, "driving_school_id": {"$in": list(school_ids)}}},
+        {"$project": {"_id": 0, "user_id": "$student_id"}},
+        {"$unionWith": {
+            "coll": "teachers",
+            "pipeline": [
+                {"$match": {"user_id": {"$in": list(user_ids)}, "driving_school_id": {"$in": list(school_ids)}}},
+                {"$project": {"_id": 0, "user_id": 1}}
+            ]
+        }}
+    ]
+    return {row["user_id"] async for row in db.enrollments.aggregate(pipeline)}
+
+async def check_stored_file_access(key: str, current_user: dict):
+    """Allow a stored file to the users it belongs to and the managers of their schools.
+
+    Profile photos are visible to any signed-in user. Document files (ID
+    scans, medical certificates) and certificate PDFs only to their owner
+    and the managers of a school the owner studies or teaches at.
+    """
+    # Local derivatives are themselves stored files, referenced by URL from their source's record
+    url = f"{storage.url_prefix}/{key}" if isinstance(storage, LocalStorage) else None
+    def derivative_of(field: str) -> List[dict]:
+        return [{f"{field}.{name}": url} for name in IMAGE_VARIANTS] if url else []
     
-    return required_types.issubset(uploaded_types)
+    if await db.users.find_one(
+        {"$or": [{"profile_photo_key": key}, *derivative_of("profile_photo_derivatives")]}, {"_id": 1}
+    ):
+        return
+    
+    # Content-addressed keys are shared by identical uploads, so a file can have several owners
+    owner_ids = set(await db.documents.distinct(
+        "user_id", {"$or": [{"storage_key": key}, *derivative_of("derivatives")]}
+    ))
+    owner_ids.update(await db.certificates.distinct("student_id", {"pdf_storage_key": key}))
+    if not owner_ids:
+        raise HTTPException(status_code=404, detail="File not found")
+    if current_user["id"] in owner_ids:
+        return
+    if current_user["role"] == "manager":
+        school_ids = await db.driving_schools.distinct("id", {"manager_id": current_user["id"]})
+        if school_ids and await get_school_member_ids(list(owner_ids), school_ids):
+            return
+    raise HTTPException(status_code=403, detail="Not authorized to access this file")
 
-async def update_course_availability(enrollment_id: str):
-    """Update course availability based on completion status"""
-    courses_cursor = db.courses.find({"enrollment_id": enrollment_id}).sort("course_type", 1)
-    courses = await courses_cursor.to_list(length=None)
+async def check_user_documents_complete(user_id: str, role: str) -> bool:
+    """Check if user has uploaded and verified all required documents"""
+    required_mask = required_documents_mask(role)
+    user = await db.users.find_one({"id": user_id}, {"_id": 0, "verified_documents_mask": 1})
+    mask = (user or {}).get("verified_documents_mask", 0)
+    return mask & required_mask == required_mask
+
+# Session scheduling
+def session_end(session: dict) -> datetime:
+    return session["scheduled_at"] + timedelta(minutes=session["duration_minutes"])
+
+async def find_session_conflicts(teacher_id: str, student_id: str, intervals: List[tuple],
+                                 exclude_ids: Optional[List[str]] = None) -> List[dict]:
+    """Return active sessions of the teacher or student overlapping any (start, end) interval.
+
+    No session is longer than MAX_SESSION_MINUTES, so only sessions
+    starting in [first start - MAX_SESSION_MINUTES, last end) can overlap;
+    that bounded range is one scan on the (teacher_id, scheduled_at) and
+    (student_id, scheduled_at) indexes.
+    """
+    if not intervals:
+        return []
+    window = {
+        "$gt": min(start for start, _ in intervals) - timedelta(minutes=MAX_SESSION_MINUTES),
+        "$lt": max(end for _, end in intervals)
+    }
+    query = {
+        "$or": [
+            {"teacher_id": teacher_id, "scheduled_at": window},
+            {"student_id": student_id, "scheduled_at": window}
+        ],
+        "status": {"$in": ACTIVE_SESSION_STATUSES}
+    }
+    if exclude_ids:
+        query["id"] = {"$nin": list(exclude_ids)}
     
-    # Sort courses by sequence
-    course_order = {CourseType.THEORY: 0, CourseType.PARK: 1, CourseType.ROAD: 2}
-    courses.sort(key=lambda x: course_order[x["course_type"]])
+    candidates = await db.sessions.find(query, {
+        "_id": 0, "id": 1, "teacher_id": 1, "student_id": 1, "scheduled_at": 1, "duration_minutes": 1, "created_at": 1
+    }).to_list(length=None)
+    return [
+        session for session in candidates
+        if any(session["scheduled_at"] < end and start < session_end(session) for start, end in intervals)
+    ]
+
+def describe_session_conflict(conflict: dict, teacher_id: str) -> str:
+    who = "Teacher" if conflict["teacher_id"] == teacher_id else "Student"
+    return f"{who} is already booked from {conflict['scheduled_at'].isoformat()} to {session_end(conflict).isoformat()}"
+
+async def insert_sessions_without_conflicts(session_docs: List[dict]):
+    """Insert sessions of one teacher and student, raising 409 if any overlaps an existing booking.
+
+    The check runs before the insert and again after it. Any overlap seen
+    after the insert can only come from a concurrent booking, so ours
+    withdraws: two racing requests may both get a 409, but never both
+    succeed.
+    """
+    teacher_id = session_docs[0]["teacher_id"]
+    student_id = session_docs[0]["student_id"]
+    intervals = [(session["scheduled_at"], session_end(session)) for session in session_docs]
     
-    for i, course in enumerate(courses):
-        if i == 0:  # First course (theory) is always available
-            if course["status"] == CourseStatus.LOCKED:
-                await db.courses.update_one(
-                    {"id": course["id"]},
-                    {"$set": {"status": CourseStatus.AVAILABLE, "updated_at": datetime.utcnow()}}
-                )
-        else:
-            # Check if previous course is completed and exam passed
-            prev_course = courses[i-1]
-            if prev_course["exam_status"] == ExamStatus.PASSED:
-                if course["status"] == CourseStatus.LOCKED:
-                    await db.courses.update_one(
-                        {"id": course["id"]},
-                        {"$set": {"status": CourseStatus.AVAILABLE, "updated_at": datetime.utcnow()}}
-                    )
-            else:
-                # Lock the course if previous not completed
-                if course["status"] != CourseStatus.LOCKED:
-                    await db.courses.update_one(
-                        {"id": course["id"]},
-                        {"$set": {"status": CourseStatus.LOCKED, "updated_at": datetime.utcnow()}}
-                    )
+    conflicts = await find_session_conflicts(teacher_id, student_id, intervals)
+    if conflicts:
+        raise HTTPException(status_code=409, detail=describe_session_conflict(conflicts[0], teacher_id))
+    
+    await db.sessions.insert_many(session_docs)
+    
+    new_ids = [session["id"] for session in session_docs]
+    concurrent = await find_session_conflicts(teacher_id, student_id, intervals, exclude_ids=new_ids)
+    if concurrent:
+        await db.sessions.delete_many({"id": {"$in": new_ids}})
+        raise HTTPException(status_code=409, detail=describe_session_conflict(concurrent[0], teacher_id))
+
+async def get_series_for_user(series_id: str, current_user: dict) -> dict:
+    """Load a session series the student who booked it or its teacher may manage"""
+    series = await db.session_series.find_one({"id": series_id})
+    if not series:
+        raise HTTPException(status_code=404, detail="Session series not found")
+    if current_user["id"] != series["student_id"]:
+        teacher = await db.teachers.find_one({"id": series["teacher_id"]})
+        if not teacher or teacher["user_id"] != current_user["id"]:
+            raise HTTPException(status_code=403, detail="Unauthorized to manage this session series")
+    return series
+
+# Course progression engine
+async def progress_enrollment(enrollment_id: str) -> Optional[str]:
+    """Apply an enrollment's course transitions and issue its certificate once every exam is passed"""
+    if await progress_enrollments(db, [enrollment_id]):
+        return await issue_certificate(enrollment_id)
+    return None
 
 async def create_sequential_courses(enrollment_id: str):
     """Create courses with proper sequential logic"""
-    courses = []
-    course_configs = [
-        {"type": CourseType.THEORY, "sessions": 10},
-        {"type": CourseType.PARK, "sessions": 5}, 
-        {"type": CourseType.ROAD, "sessions": 15}
-    ]
-    
-    for i, course_config in enumerate(course_configs):
-        course_id = str(uuid.uuid4())
-        # Only first course (theory) is available initially
-        initial_status = CourseStatus.AVAILABLE if i == 0 else CourseStatus.LOCKED
-        
-        course_doc = {
-            "id": course_id,
-            "enrollment_id": enrollment_id,
-            "course_type": course_config["type"],
-            "status": initial_status,
-            "teacher_id": None,
-            "scheduled_sessions": [],
-            "completed_sessions": 0,
-            "total_sessions": course_config["sessions"],
-            "exam_status": ExamStatus.NOT_AVAILABLE,
-            "exam_score": None,
-            "created_at": datetime.utcnow(),
-            "updated_at": datetime.utcnow()
-        }
-        courses.append(course_doc)
-    
+    courses = build_sequential_courses(enrollment_id)
     await db.courses.insert_many(courses)
     return courses
 
-# Cloudinary upload function
-async def upload_to_cloudinary(file: UploadFile, folder: str, resource_type: str = "auto"):
-    """Upload file to Cloudinary"""
+# File upload function
+async def store_upload(file: UploadFile, folder: str, resource_type: str = "auto", upload_id: Optional[str] = None):
+    """Store an upload with the configured storage backend (Cloudinary or local).
+
+    The already spooled upload is streamed in chunks from a worker thread
+    instead of being read into memory. Images are stored without their
+    EXIF/XMP metadata.
+    """
+    size = upload_size(file.file)
+    if size > MAX_UPLOAD_BYTES:
+        upload_progress.update(upload_id, "failed", 0, size, error="too_large")
+        raise HTTPException(status_code=413, detail=f"File too large (max {MAX_UPLOAD_BYTES // (1024 * 1024)} MB)")
+    if size == 0:
+        raise HTTPException(status_code=400, detail="Empty file")
+    
     try:
-        file_content = await file.read()
-        
-        upload_result = cloudinary.uploader.upload(
-            file_content,
+        fileobj = file.file
+        fileobj.seek(0)
+        if image_service.is_image(file.content_type):
+            # Photos of ID cards and faces often carry the GPS position they were taken at
+            cleaned = await asyncio.to_thread(strip_image_metadata, fileobj)
+            if cleaned is not None:
+                fileobj, size = io.BytesIO(cleaned), len(cleaned)
+        upload_progress.update(upload_id, "uploading", 0, size)
+        
+        upload_result = await storage.save(
+            fileobj,
+            size,
             folder=folder,
+            filename=file.filename,
+            content_type=file.content_type,
             resource_type=resource_type,
-            public_id=f"{str(uuid.uuid4())}_{file.filename}",
-            overwrite=True
+            upload_id=upload_id
         )
         
-        return {
-            "file_url": upload_result["secure_url"],
-            "public_id": upload_result["public_id"],
-            "file_size": upload_result.get("bytes", 0),
-            "format": upload_result.get("format", ""),
-            "width": upload_result.get("width"),
-            "height": upload_result.get("height")
-        }
+        upload_progress.update(upload_id, "completed", size, size)
+        return upload_result
+    except ProviderUnavailableError as e:
+        upload_progress.update(upload_id, "failed", 0, size, error=str(e))
+        raise HTTPException(status_code=503, detail=f"File storage temporarily unavailable: {str(e)}")
+    except cloudinary.exceptions.Error as e:
+        # Rejected by Cloudinary itself (invalid file, bad parameters)
+        upload_progress.update(upload_id, "failed", 0, size, error=str(e))
+        raise HTTPException(status_code=400, detail=f"File rejected by storage: {str(e)}")
     except Exception as e:
+        upload_progress.update(upload_id, "failed", 0, size, error=str(e))
         raise HTTPException(status_code=500, detail=f"Failed to upload file: {str(e)}")
 
+async def create_daily_room(room_name: str, scheduled_at: datetime, duration_minutes: int) -> dict:
+    """Create a Daily.co room, falling back to a simulated room URL"""
+    simulated = {"room_url": f"https://daily.co/{room_name}", "daily_room_id": room_name, "simulation": True}
+    if not DAILY_API_KEY:
+        return simulated
+    
+    try:
+        client = get_provider_client("daily", base_url=DAILY_API_URL)
+        response = await client.request(
+            "POST",
+            "/rooms",
+            json={
+                "name": room_name,
+                "properties": {
+                    "nbf": int(scheduled_at.timestamp()),
+                    "exp": int((scheduled_at + timedelta(minutes=duration_minutes)).timestamp())
+                }
+            },
+            headers={"Authorization": f"Bearer {DAILY_API_KEY}"}
+        )
+        if response.status == 200 and response.data:
+            return {"room_url": response.data["url"], "daily_room_id": response.data.get("id", room_name), "simulation": False}
+        logger.error(f"Daily.co room creation failed: {response.text}")
+    except ProviderUnavailableError as e:
+        logger.warning(f"Daily.co unavailable, using simulated room: {str(e)}")
+    
+    return simulated
+
 # Enhanced Certificate Generation Functions
 async def generate_qr_code(data: str) -> str:
     """Generate QR code and return base64 encoded image"""
@@ -653,101 +889,47 @@ async def generate_qr_code(data: str) -> str:
     return img_str
 
 async def create_certificate_pdf(certificate_data: dict) -> bytes:
-    """Generate a professional PDF certificate"""
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=72, leftMargin=72, topMargin=72, bottomMargin=18)
-    
-    # Define styles
-    styles = getSampleStyleSheet()
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=24,
-        textColor=colors.darkblue,
-        alignment=1,  # Center alignment
-        spaceAfter=30
-    )
-    
-    subtitle_style = ParagraphStyle(
-        'CustomSubtitle',
-        parent=styles['Heading2'],
-        fontSize=18,
-        textColor=colors.blue,
-        alignment=1,
-        spaceAfter=20
+    """Generate a professional PDF certificate in the renderer process pool"""
+    return await certificate_renderer.render(certificate_data)
+
+def build_certificate_data(certificate: dict, student: dict, school: dict) -> dict:
+    """Fields overlaid on the certificate template"""
+    return {
+        "student_name": f"{student['first_name']} {student['last_name']}",
+        "school_name": school["name"],
+        "certificate_number": certificate["certificate_number"],
+        "issue_date": certificate["issue_date"],
+        "expiry_date": certificate["expiry_date"],
+        "student_id": certificate["student_id"],
+        "school_location": f"{school.get('address', '')}, {school.get('state', '')}".strip(", "),
+        "qr_payload": certificate_qr_content(certificate["qr_code"]) if certificate.get("qr_code") else None
+    }
+
+def sign_certificate(certificate: dict, holder_name: str) -> dict:
+    """Embed the signed verification token that the certificate's QR code carries"""
+    certificate["qr_code"] = certificate_signer.sign(
+        certificate["id"],
+        certificate["certificate_number"],
+        holder_name,
+        certificate["issue_date"],
+        certificate["expiry_date"]
     )
-    
-    content_style = ParagraphStyle(
-        'CustomContent',
-        parent=styles['Normal'],
-        fontSize=12,
-        alignment=1,
-        spaceAfter=10
+    return certificate
+
+async def store_certificate_pdf(certificate: dict, student: dict, school: dict) -> dict:
+    """Render a certificate once, store the PDF and record where it lives"""
+    pdf = await create_certificate_pdf(build_certificate_data(certificate, student, school))
+    stored = await storage.save(
+        BytesIO(pdf),
+        len(pdf),
+        folder="certificates",
+        filename=f"{certificate['certificate_number']}.pdf",
+        content_type="application/pdf",
+        resource_type="raw"
     )
-    
-    # Build certificate content
-    content = []
-    
-    # Certificate Header
-    content.append(Paragraph("🇩🇿 REPUBLIC OF ALGERIA", title_style))
-    content.append(Paragraph("MINISTRY OF TRANSPORT", subtitle_style))
-    content.append(Spacer(1, 20))
-    
-    # Certificate Title
-    content.append(Paragraph("DRIVING LICENSE CERTIFICATE", title_style))
-    content.append(Paragraph("شهادة رخصة القيادة", subtitle_style))
-    content.append(Spacer(1, 30))
-    
-    # Certificate Body
-    content.append(Paragraph(
-        f"This certifies that <b>{certificate_data['student_name']}</b> has successfully completed",
-        content_style
-    ))
-    content.append(Paragraph(
-        f"the comprehensive driving education program at <b>{certificate_data['school_name']}</b>",
-        content_style
-    ))
-    content.append(Spacer(1, 20))
-    
-    # Certificate Details Table
-    details_data = [
-        ['Certificate Number:', certificate_data['certificate_number']],
-        ['Issue Date:', certificate_data['issue_date'].strftime('%B %d, %Y')],
-        ['Valid Until:', certificate_data['expiry_date'].strftime('%B %d, %Y')],
-        ['Student ID:', certificate_data['student_id']],
-        ['School Location:', certificate_data['school_location']]
-    ]
-    
-    details_table = Table(details_data, colWidths=[2*inch, 3*inch])
-    details_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (0, -1), colors.lightblue),
-        ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
-        ('FONTSIZE', (0, 0), (-1, -1), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 12),
-        ('BACKGROUND', (1, 0), (1, -1), colors.white),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black)
-    ]))
-    
-    content.append(details_table)
-    content.append(Spacer(1, 30))
-    
-    # QR Code for verification
-    qr_code = await generate_qr_code(f"VERIFY:{certificate_data['certificate_number']}")
-    qr_image = Image(BytesIO(base64.b64decode(qr_code)), width=100, height=100)
-    content.append(Paragraph("Scan QR Code to Verify Certificate:", content_style))
-    content.append(qr_image)
-    content.append(Spacer(1, 20))
-    
-    # Signature section
-    content.append(Paragraph("Authorized by the Ministry of Transport, Algeria", content_style))
-    content.append(Paragraph("This certificate is valid for 5 years from the date of issue.", content_style))
-    
-    # Build PDF
-    doc.build(content)
-    buffer.seek(0)
-    return buffer.getvalue()
+    update = {"pdf_url": stored["file_url"], "pdf_storage_key": stored["storage_key"]}
+    await db.certificates.update_one({"id": certificate["id"]}, {"$set": update})
+    return update
 
 # Enhanced Analytics Functions
 async def generate_student_analytics_chart(student_data: dict) -> str:
@@ -898,6 +1080,7 @@ async def get_states():
 
 @api_router.post("/auth/register", response_model=dict)
 async def register_user(
+    background_tasks: BackgroundTasks,
     email: str = Form(...),
     password: str = Form(...),
     first_name: str = Form(...),
@@ -934,17 +1117,12 @@ async def register_user(
         
         # Handle profile photo upload
         profile_photo_url = None
+        profile_photo_key = None
         if profile_photo and profile_photo.size > 0:
             try:
-                # Only upload if Cloudinary is properly configured
-                if (os.environ.get('CLOUDINARY_CLOUD_NAME') and 
-                    os.environ.get('CLOUDINARY_API_KEY') and 
-                    os.environ.get('CLOUDINARY_API_SECRET') and
-                    os.environ.get('CLOUDINARY_CLOUD_NAME') != 'your-cloud-name'):
-                    upload_result = await upload_to_cloudinary(profile_photo, "profile_photos", "image")
-                    profile_photo_url = upload_result["file_url"]
-                else:
-                    logger.warning("Cloudinary not configured properly, skipping photo upload")
+                upload_result = await store_upload(profile_photo, "profile_photos", "image")
+                profile_photo_url = upload_result["file_url"]
+                profile_photo_key = upload_result["storage_key"]
             except Exception as e:
                 logger.warning(f"Failed to upload profile photo: {str(e)}")
         
@@ -962,12 +1140,19 @@ async def register_user(
             "role": "guest",
             "state": state,
             "profile_photo_url": profile_photo_url,
+            "profile_photo_key": profile_photo_key,
             "created_at": datetime.utcnow(),
             "is_active": True
         }
         
         await db.users.insert_one(user_data)
         
+        # Thumbnails are rendered after the response is sent
+        if profile_photo_key:
+            background_tasks.add_task(
+                image_service.attach, "users", {"id": user_data["id"]}, "profile_photo_derivatives", profile_photo_key
+            )
+        
         # Generate access token
         access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
         access_token = create_access_token(
@@ -1304,17 +1489,21 @@ async def get_dashboard_data(current_user = Depends(get_current_user)):
 
 @api_router.post("/documents/upload")
 async def upload_document(
+    request: Request,
+    background_tasks: BackgroundTasks,
     document_type: str = Form(...),
     file: UploadFile = File(...),
     current_user = Depends(get_current_user)
 ):
     try:
+        upload_id = request.headers.get("x-upload-id")
+        
         # Validate document type
         if document_type not in [doc.value for doc in DocumentType]:
             raise HTTPException(status_code=400, detail="Invalid document type")
         
-        # Upload file to Cloudinary
-        upload_result = await upload_to_cloudinary(file, f"documents/{document_type}", "auto")
+        # Upload file to the storage backend
+        upload_result = await store_upload(file, f"documents/{document_type}", "auto", upload_id=upload_id)
         
         # Create document record
         document_id = str(uuid.uuid4())
@@ -1325,11 +1514,25 @@ async def upload_document(
             "file_url": upload_result["file_url"],
             "file_name": file.filename,
             "file_size": upload_result["file_size"],
+            "content_type": upload_result["content_type"],
+            "storage_backend": upload_result["storage_backend"],
+            "storage_key": upload_result["storage_key"],
+            "sha256": upload_result.get("sha256"),
             "upload_date": datetime.utcnow(),
             "is_verified": False  # Manager needs to verify
         }
         
         await db.documents.insert_one(document_doc)
+        await db.users.update_one(
+            {"id": current_user["id"]},
+            {"$bit": {"uploaded_documents_mask": {"or": DOCUMENT_TYPE_BITS[document_type]}}}
+        )
+        
+        # Thumbnails are rendered after the response is sent
+        if image_service.is_image(upload_result["content_type"]):
+            background_tasks.add_task(
+                image_service.attach, "documents", {"id": document_id}, "derivatives", upload_result["storage_key"]
+            )
         
         return {
             "message": "Document uploaded successfully",
@@ -1343,6 +1546,72 @@ async def upload_document(
             raise e
         raise HTTPException(status_code=500, detail="Document upload failed")
 
+@api_router.get("/uploads/{upload_id}/progress")
+async def get_upload_progress(upload_id: str, current_user = Depends(get_current_user)):
+    """Progress of an upload sent with the same X-Upload-Id header"""
+    progress = upload_progress.get(upload_id)
+    if not progress:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    return progress
+
+@api_router.get("/files/{key}")
+async def get_stored_file(key: str, request: Request, current_user = Depends(get_current_user_or_token)):
+    """Serve a locally stored file with ETag revalidation and single Range requests"""
+    path = storage.path_for(key) if isinstance(storage, LocalStorage) else None
+    if path is None or not await aiofiles.os.path.exists(path):
+        raise HTTPException(status_code=404, detail="File not found")
+    await check_stored_file_access(key, current_user)
+    
+    size = (await aiofiles.os.stat(path)).st_size
+    # Content addressed: the hash is a strong validator and the bytes never change
+    etag = f'"{key[:64]}"'
+    headers = {
+        "ETag": etag,
+        "Accept-Ranges": "bytes",
+        # Private: the response depends on who is asking
+        "Cache-Control": "private, max-age=31536000, immutable"
+    }
+    
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    
+    start, end, status_code = 0, size - 1, 200
+    range_header = request.headers.get("range")
+    if range_header and request.headers.get("if-range", etag) == etag and size > 0:
+        try:
+            start, end = parse_range(range_header, size)
+        except ValueError:
+            raise HTTPException(status_code=416, detail="Requested range not satisfiable", headers={"Content-Range": f"bytes */{size}"})
+        status_code = 206
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    
+    headers["Content-Length"] = str(max(0, end - start + 1))
+    return StreamingResponse(
+        iter_file(path, start, end),
+        status_code=status_code,
+        media_type=mimetypes.guess_type(key)[0] or "application/octet-stream",
+        headers=headers
+    )
+
+@api_router.get("/files/{key:path}/derivatives/{variant}")
+async def get_file_derivative(key: str, variant: str, request: Request, current_user = Depends(get_current_user_or_token)):
+    """Redirect to a derivative of a stored image, rendering and caching it on first request"""
+    if variant not in IMAGE_VARIANTS:
+        raise HTTPException(status_code=404, detail="Unknown variant")
+    await check_stored_file_access(key, current_user)
+    try:
+        variants = await image_service.get_derivatives(key)
+    except Exception as e:
+        logger.error(f"Image derivative error: {str(e)}")
+        raise HTTPException(status_code=422, detail="File is not a supported image")
+    if not variants:
+        raise HTTPException(status_code=404, detail="File not found")
+    location = variants[variant]
+    if location.startswith("/") and request.query_params.get("token"):
+        # Local derivatives are access-checked too; keep the query token across the redirect
+        location = f"{location}?token={request.query_params['token']}"
+    return RedirectResponse(location, status_code=302)
+
 @api_router.get("/documents")
 async def get_user_documents(current_user = Depends(get_current_user)):
     try:
@@ -1357,7 +1626,10 @@ async def get_user_documents(current_user = Depends(get_current_user)):
 
 # Manager Routes
 @api_router.get("/manager/enrollments")
-async def get_pending_enrollments(current_user = Depends(get_current_user)):
+async def get_pending_enrollments(
+    documents_complete: Optional[bool] = None,
+    current_user = Depends(get_current_user)
+):
     try:
         if current_user["role"] != "manager":
             raise HTTPException(status_code=403, detail="Only managers can access this")
@@ -1374,13 +1646,26 @@ async def get_pending_enrollments(current_user = Depends(get_current_user)):
         })
         enrollments = await enrollments_cursor.to_list(length=None)
         
-        # Get student information for each enrollment
+        # Get student information for all enrollments in one query
+        required_mask = required_documents_mask("student")
+        students = {
+            student["id"]: student
+            async for student in db.users.find(
+                {"id": {"$in": [enrollment["student_id"] for enrollment in enrollments]}},
+                {"_id": 0, "id": 1, "first_name": 1, "last_name": 1, "email": 1, "phone": 1, "verified_documents_mask": 1}
+            )
+        }
         for enrollment in enrollments:
-            student = await db.users.find_one({"id": enrollment["student_id"]})
+            student = students.get(enrollment["student_id"])
             if student:
                 enrollment["student_name"] = f"{student['first_name']} {student['last_name']}"
                 enrollment["student_email"] = student["email"]
                 enrollment["student_phone"] = student["phone"]
+            mask = (student or {}).get("verified_documents_mask", 0)
+            enrollment["documents_complete"] = mask & required_mask == required_mask
+        
+        if documents_complete is not None:
+            enrollments = [e for e in enrollments if e["documents_complete"] == documents_complete]
         
         return {"enrollments": serialize_doc(enrollments)}
     
@@ -1433,7 +1718,7 @@ async def approve_enrollment(
         )
         
         # Update course availability
-        await update_course_availability(enrollment_id)
+        await progress_enrollments(db, [enrollment_id])
         
         # Send notification to student
         notification_doc = {
@@ -1446,7 +1731,7 @@ async def approve_enrollment(
             "metadata": {"enrollment_id": enrollment_id, "school_name": school["name"]},
             "created_at": datetime.utcnow()
         }
-        await db.notifications.insert_one(notification_doc)
+        await insert_notification(notification_doc)
         
         return {"message": "Enrollment approved successfully"}
     
@@ -1456,6 +1741,156 @@ async def approve_enrollment(
             raise e
         raise HTTPException(status_code=500, detail="Failed to approve enrollment")
 
+@api_router.post("/manager/enrollments/bulk-approve")
+async def bulk_approve_enrollments(
+    approval: BulkEnrollmentApproval,
+    current_user = Depends(get_current_user)
+):
+    """Approve many enrollments of the manager's schools in one request"""
+    try:
+        if current_user["role"] != "manager":
+            raise HTTPException(status_code=403, detail="Only managers can approve enrollments")
+        
+        enrollment_ids = list(dict.fromkeys(approval.enrollment_ids))
+        if len(enrollment_ids) > MAX_BULK_IDS:
+            raise HTTPException(status_code=400, detail=f"At most {MAX_BULK_IDS} enrollments per request")
+        
+        # Ownership: only enrollments of schools this manager runs are loaded
+        schools = {
+            school["id"]: school
+            async for school in db.driving_schools.find({"manager_id": current_user["id"]}, {"_id": 0, "id": 1, "name": 1})
+        }
+        enrollments = await db.enrollments.find({
+            "id": {"$in": enrollment_ids},
+            "driving_school_id": {"$in": list(schools)}
+        }).to_list(length=None)
+        
+        found = {enrollment["id"] for enrollment in enrollments}
+        failed = [{"id": enrollment_id, "reason": "not_found"} for enrollment_id in enrollment_ids if enrollment_id not in found]
+        
+        # Check all students' required documents at once
+        complete = await get_users_with_complete_documents(
+            [enrollment["student_id"] for enrollment in enrollments],
+            "student"
+        )
+        
+        to_approve = []
+        for enrollment in enrollments:
+            if enrollment["enrollment_status"] == EnrollmentStatus.APPROVED:
+                failed.append({"id": enrollment["id"], "reason": "already_approved"})
+            elif enrollment["student_id"] not in complete:
+                failed.append({"id": enrollment["id"], "reason": "documents_incomplete"})
+            else:
+                to_approve.append(enrollment)
+        
+        if to_approve:
+            now = datetime.utcnow()
+            # Tags the updates of this call so they can be told apart from a concurrent approval
+            approval_id = str(uuid.uuid4())
+            await db.enrollments.bulk_write([
+                UpdateOne(
+                    {"id": enrollment["id"], "enrollment_status": {"$ne": EnrollmentStatus.APPROVED}},
+                    {"$set": {"enrollment_status": EnrollmentStatus.APPROVED, "approved_at": now, "approval_id": approval_id}}
+                )
+                for enrollment in to_approve
+            ], ordered=False)
+            
+            # Only enrollments this call moved get courses and notifications
+            moved = set(await db.enrollments.distinct(
+                "id", {"id": {"$in": [enrollment["id"] for enrollment in to_approve]}, "approval_id": approval_id}
+            ))
+            failed += [{"id": enrollment["id"], "reason": "already_approved"} for enrollment in to_approve if enrollment["id"] not in moved]
+            to_approve = [enrollment for enrollment in to_approve if enrollment["id"] in moved]
+            approve_ids = [enrollment["id"] for enrollment in to_approve]
+        
+        if to_approve:
+            # Enrollments created before courses existed get them in one insert
+            with_courses = set(await db.courses.distinct("enrollment_id", {"enrollment_id": {"$in": approve_ids}}))
+            missing_courses = [
+                course
+                for enrollment_id in approve_ids if enrollment_id not in with_courses
+                for course in build_sequential_courses(enrollment_id)
+            ]
+            if missing_courses:
+                await db.courses.insert_many(missing_courses)
+            
+            await progress_enrollments(db, approve_ids)
+            
+            await insert_notifications([
+                {
+                    "id": str(uuid.uuid4()),
+                    "user_id": enrollment["student_id"],
+                    "type": NotificationType.ENROLLMENT_APPROVED,
+                    "title": "Enrollment Approved!",
+                    "message": f"Your enrollment at {schools[enrollment['driving_school_id']]['name']} has been approved. You can now start your courses!",
+                    "is_read": False,
+                    "metadata": {"enrollment_id": enrollment["id"], "school_name": schools[enrollment["driving_school_id"]]["name"]},
+                    "created_at": now
+                }
+                for enrollment in to_approve
+            ])
+        
+        return {
+            "message": f"{len(to_approve)} enrollments approved",
+            "approved": [enrollment["id"] for enrollment in to_approve],
+            "failed": failed
+        }
+    
+    except Exception as e:
+        logger.error(f"Bulk approve enrollments error: {str(e)}")
+        if isinstance(e, HTTPException):
+            raise e
+        raise HTTPException(status_code=500, detail="Failed to approve enrollments")
+
+@api_router.post("/manager/documents/bulk-verify")
+async def bulk_verify_documents(
+    verification: BulkDocumentVerification,
+    current_user = Depends(get_current_user)
+):
+    """Set the verification status of many documents of the manager's students and teachers"""
+    try:
+        if current_user["role"] != "manager":
+            raise HTTPException(status_code=403, detail="Only managers can verify documents")
+        
+        document_ids = list(dict.fromkeys(verification.document_ids))
+        if len(document_ids) > MAX_BULK_IDS:
+            raise HTTPException(status_code=400, detail=f"At most {MAX_BULK_IDS} documents per request")
+        
+        documents = await db.documents.find(
+            {"id": {"$in": document_ids}},
+            {"_id": 0, "id": 1, "user_id": 1, "document_type": 1}
+        ).to_list(length=None)
+        
+        school_ids = await db.driving_schools.distinct("id", {"manager_id": current_user["id"]})
+        members = await get_school_member_ids(list({doc["user_id"] for doc in documents}), school_ids)
+        
+        found = {doc["id"] for doc in documents}
+        failed = [{"id": document_id, "reason": "not_found"} for document_id in document_ids if document_id not in found]
+        failed += [{"id": doc["id"], "reason": "unauthorized"} for doc in documents if doc["user_id"] not in members]
+        allowed = [doc["id"] for doc in documents if doc["user_id"] in members]
+        
+        if allowed:
+            await db.documents.update_many(
+                {"id": {"$in": allowed}},
+                {"$set": {"is_verified": verification.is_verified}}
+            )
+            
+            await update_verified_documents(
+                [doc for doc in documents if doc["user_id"] in members], verification.is_verified
+            )
+        
+        return {
+            "message": f"{len(allowed)} documents updated",
+            "updated": allowed,
+            "failed": failed
+        }
+    
+    except Exception as e:
+        logger.error(f"Bulk verify documents error: {str(e)}")
+        if isinstance(e, HTTPException):
+            raise e
+        raise HTTPException(status_code=500, detail="Failed to verify documents")
+
 @api_router.post("/manager/enrollments/{enrollment_id}/reject")
 async def reject_enrollment(
     enrollment_id: str,
@@ -1496,7 +1931,7 @@ async def reject_enrollment(
             "metadata": {"enrollment_id": enrollment_id, "school_name": school["name"], "reason": reason},
             "created_at": datetime.utcnow()
         }
-        await db.notifications.insert_one(notification_doc)
+        await insert_notification(notification_doc)
         
         return {"message": "Enrollment rejected"}
     
@@ -1888,17 +2323,20 @@ async def create_video_room(
         room_id = str(uuid.uuid4())
         room_name = f"course-{course['id']}-{int(datetime.utcnow().timestamp())}"
         
+        scheduled_at = datetime.fromisoformat(room_data.scheduled_at)
+        daily_room = await create_daily_room(room_name, scheduled_at, room_data.duration_minutes)
+        
         room_doc = {
             "id": room_id,
             "course_id": room_data.course_id,
             "teacher_id": current_user["id"],
             "student_id": room_data.student_id,
-            "room_url": f"https://daily.co/{room_name}",
+            "room_url": daily_room["room_url"],
             "room_name": room_name,
-            "scheduled_at": datetime.fromisoformat(room_data.scheduled_at),
+            "scheduled_at": scheduled_at,
             "duration_minutes": room_data.duration_minutes,
             "is_active": True,
-            "daily_room_id": room_name,
+            "daily_room_id": daily_room["daily_room_id"],
             "created_at": datetime.utcnow()
         }
         
@@ -2025,6 +2463,9 @@ async def schedule_session(
         if not teacher:
             raise HTTPException(status_code=404, detail="Teacher not found or not approved")
         
+        if not 0 < session_data.duration_minutes <= MAX_SESSION_MINUTES:
+            raise HTTPException(status_code=400, detail=f"Session duration must be between 1 and {MAX_SESSION_MINUTES} minutes")
+        
         # Create session
         session_id = str(uuid.uuid4())
         session_doc = {
@@ -2042,7 +2483,7 @@ async def schedule_session(
             "updated_at": datetime.utcnow()
         }
         
-        await db.sessions.insert_one(session_doc)
+        await insert_sessions_without_conflicts([session_doc])
         
         return {"session_id": session_id, "message": "Session scheduled successfully"}
     
@@ -2052,6 +2493,307 @@ async def schedule_session(
             raise e
         raise HTTPException(status_code=500, detail="Failed to schedule session")
 
+@api_router.post("/sessions/series")
+async def schedule_session_series(
+    series_data: SessionSeriesCreate,
+    current_user = Depends(get_current_user)
+):
+    """Book all occurrences of a recurring session with one conflict check and one insert"""
+    try:
+        if current_user["role"] != "student":
+            raise HTTPException(status_code=403, detail="Only students can schedule sessions")
+        
+        course = await db.courses.find_one({"id": series_data.course_id})
+        enrollment = await db.enrollments.find_one({"id": course["enrollment_id"]}) if course else None
+        if not enrollment or enrollment["student_id"] != current_user["id"]:
+            raise HTTPException(status_code=404, detail="Course not found")
+        
+        teacher = await db.teachers.find_one({"id": series_data.teacher_id, "is_approved": True})
+        if not teacher:
+            raise HTTPException(status_code=404, detail="Teacher not found or not approved")
+        
+        if series_data.frequency not in ("daily", "weekly"):
+            raise HTTPException(status_code=400, detail="Frequency must be 'daily' or 'weekly'")
+        if not 1 <= series_data.interval <= 4:
+            raise HTTPException(status_code=400, detail="Interval must be between 1 and 4")
+        if series_data.weekdays and not all(0 <= day <= 6 for day in series_data.weekdays):
+            raise HTTPException(status_code=400, detail="Weekdays must be between 0 (Monday) and 6 (Sunday)")
+        if not 0 < series_data.duration_minutes <= MAX_SESSION_MINUTES:
+            raise HTTPException(status_code=400, detail=f"Session duration must be between 1 and {MAX_SESSION_MINUTES} minutes")
+        
+        # Sessions already booked on the course count against what is left to schedule
+        booked = await db.sessions.count_documents({"course_id": series_data.course_id, "status": {"$in": ACTIVE_SESSION_STATUSES}})
+        remaining = course["total_sessions"] - course["completed_sessions"] - booked
+        if remaining <= 0:
+            raise HTTPException(status_code=400, detail="Every remaining session of this course is already booked")
+        count = series_data.count or remaining
+        if not 0 < count <= remaining:
+            raise HTTPException(status_code=400, detail=f"A series can have between 1 and {remaining} sessions for this course")
+        
+        try:
+            first = datetime.fromisoformat(series_data.first_session_at)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid first_session_at, expected ISO format")
+        
+        series_id = str(uuid.uuid4())
+        now = datetime.utcnow()
+        session_docs = [
+            {
+                "id": str(uuid.uuid4()),
+                "course_id": series_data.course_id,
+                "teacher_id": series_data.teacher_id,
+                "student_id": current_user["id"],
+                "session_type": course["course_type"],
+                "scheduled_at": scheduled_at,
+                "duration_minutes": series_data.duration_minutes,
+                "location": series_data.location,
+                "status": SessionStatus.SCHEDULED,
+                "notes": None,
+                "series_id": series_id,
+                "created_at": now,
+                "updated_at": now
+            }
+            for scheduled_at in expand_recurrence(first, series_data.frequency, series_data.interval, series_data.weekdays, count)
+        ]
+        
+        series_doc = {
+            "id": series_id,
+            "course_id": series_data.course_id,
+            "teacher_id": series_data.teacher_id,
+            "student_id": current_user["id"],
+            "rule": {
+                "frequency": series_data.frequency,
+                "interval": series_data.interval,
+                "weekdays": series_data.weekdays,
+                "count": count
+            },
+            "duration_minutes": series_data.duration_minutes,
+            "location": series_data.location,
+            "created_at": now
+        }
+        
+        # The series exists before its sessions, so no session ever points at a missing series
+        await db.session_series.insert_one(series_doc)
+        
+        # Every occurrence is checked by one range query and stored by one insert_many
+        try:
+            await insert_sessions_without_conflicts(session_docs)
+        except Exception:
+            await db.session_series.delete_one({"id": series_id})
+            raise
+        
+        return {
+            "series_id": series_id,
+            "sessions": serialize_doc(session_docs),
+            "message": f"{len(session_docs)} sessions scheduled successfully"
+        }
+    
+    except Exception as e:
+        logger.error(f"Schedule session series error: {str(e)}")
+        if isinstance(e, HTTPException):
+            raise e
+        raise HTTPException(status_code=500, detail="Failed to schedule session series")
+
+@api_router.get("/sessions/series/{series_id}")
+async def get_session_series(series_id: str, current_user = Depends(get_current_user)):
+    try:
+        series = await get_series_for_user(series_id, current_user)
+        sessions = await db.sessions.find({"series_id": series_id}).sort("scheduled_at", 1).to_list(length=None)
+        series["sessions"] = sessions
+        return serialize_doc(series)
+    
+    except Exception as e:
+        logger.error(f"Get session series error: {str(e)}")
+        if isinstance(e, HTTPException):
+            raise e
+        raise HTTPException(status_code=500, detail="Failed to retrieve session series")
+
+@api_router.post("/sessions/series/{series_id}/cancel")
+async def cancel_session_series(
+    series_id: str,
+    from_date: Optional[str] = Form(None),
+    current_user = Depends(get_current_user)
+):
+    """Cancel every still scheduled occurrence of a series from a date on (default: now)"""
+    try:
+        await get_series_for_user(series_id, current_user)
+        
+        try:
+            since = datetime.fromisoformat(from_date) if from_date else datetime.utcnow()
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid from_date, expected ISO format")
+        
+        result = await db.sessions.update_many(
+            {"series_id": series_id, "status": SessionStatus.SCHEDULED, "scheduled_at": {"$gte": since}},
+            {"$set": {"status": SessionStatus.CANCELLED, "updated_at": datetime.utcnow()}}
+        )
+        
+        return {"series_id": series_id, "cancelled": result.modified_count, "message": "Session series cancelled"}
+    
+    except Exception as e:
+        logger.error(f"Cancel session series error: {str(e)}")
+        if isinstance(e, HTTPException):
+            raise e
+        raise HTTPException(status_code=500, detail="Failed to cancel session series")
+
+@api_router.post("/sessions/series/{series_id}/reschedule")
+async def reschedule_session_series(
+    series_id: str,
+    reschedule: SessionSeriesReschedule,
+    current_user = Depends(get_current_user)
+):
+    """Move every still scheduled occurrence from a date on by the same offset"""
+    try:
+        series = await get_series_for_user(series_id, current_user)
+        
+        try:
+            since = datetime.fromisoformat(reschedule.from_date) if reschedule.from_date else datetime.utcnow()
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid from_date, expected ISO format")
+        
+        sessions = await db.sessions.find(
+            {"series_id": series_id, "status": SessionStatus.SCHEDULED, "scheduled_at": {"$gte": since}},
+            {"_id": 0, "id": 1, "scheduled_at": 1, "duration_minutes": 1}
+        ).to_list(length=None)
+        if not sessions or not reschedule.offset_minutes:
+            return {"series_id": series_id, "rescheduled": 0, "message": "Nothing to reschedule"}
+        
+        offset = timedelta(minutes=reschedule.offset_minutes)
+        moved = [{**session, "scheduled_at": session["scheduled_at"] + offset} for session in sessions]
+        intervals = [(session["scheduled_at"], session_end(session)) for session in moved]
+        session_ids = [session["id"] for session in sessions]
+        
+        conflicts = await find_session_conflicts(series["teacher_id"], series["student_id"], intervals, exclude_ids=session_ids)
+        if conflicts:
+            raise HTTPException(status_code=409, detail=describe_session_conflict(conflicts[0], series["teacher_id"]))
+        
+        now = datetime.utcnow()
+        await db.sessions.bulk_write([
+            UpdateOne(
+                {"id": session["id"], "status": SessionStatus.SCHEDULED},
+                {"$set": {"scheduled_at": session["scheduled_at"], "updated_at": now}}
+            )
+            for session in moved
+        ], ordered=False)
+        
+        # A booking that raced into a new slot wins; put the series back
+        if await find_session_conflicts(series["teacher_id"], series["student_id"], intervals, exclude_ids=session_ids):
+            await db.sessions.bulk_write([
+                UpdateOne({"id": session["id"]}, {"$set": {"scheduled_at": session["scheduled_at"], "updated_at": now}})
+                for session in sessions
+            ], ordered=False)
+            raise HTTPException(status_code=409, detail="A conflicting session was booked meanwhile, please try again")
+        
+        return {"series_id": series_id, "rescheduled": len(moved), "message": "Session series rescheduled"}
+    
+    except Exception as e:
+        logger.error(f"Reschedule session series error: {str(e)}")
+        if isinstance(e, HTTPException):
+            raise e
+        raise HTTPException(status_code=500, detail="Failed to reschedule session series")
+
+@api_router.get("/courses/{course_id}/available-slots")
+async def get_available_slots(
+    course_id: str,
+    start_date: str,
+    days: int = 14,
+    duration_minutes: int = 60,
+    current_user = Depends(get_current_user)
+):
+    """Free session slots of every approved teacher of the student's school who may teach them"""
+    try:
+        if current_user["role"] != "student":
+            raise HTTPException(status_code=403, detail="Only students can search for session slots")
+        
+        course = await db.courses.find_one({"id": course_id})
+        enrollment = await db.enrollments.find_one({"id": course["enrollment_id"]}) if course else None
+        if not enrollment or enrollment["student_id"] != current_user["id"]:
+            raise HTTPException(status_code=404, detail="Course not found")
+        
+        try:
+            first_day = date.fromisoformat(start_date)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid start_date, expected YYYY-MM-DD")
+        if not 0 < days <= MAX_SLOT_SEARCH_DAYS:
+            raise HTTPException(status_code=400, detail=f"days must be between 1 and {MAX_SLOT_SEARCH_DAYS}")
+        if not 0 < duration_minutes <= MAX_SESSION_MINUTES:
+            raise HTTPException(status_code=400, detail=f"Session duration must be between 1 and {MAX_SESSION_MINUTES} minutes")
+        
+        teacher_query = {"driving_school_id": enrollment["driving_school_id"], "is_approved": True}
+        if current_user.get("gender") == "male":
+            teacher_query["can_teach_male"] = True
+        elif current_user.get("gender") == "female":
+            teacher_query["can_teach_female"] = True
+        teachers = await db.teachers.find(teacher_query, {"_id": 0, "id": 1, "user_id": 1, "rating": 1}).to_list(length=None)
+        if not teachers:
+            return []
+        
+        range_start = datetime.combine(first_day, datetime.min.time())
+        range_end = range_start + timedelta(days=days)
+        teacher_ids = [teacher["id"] for teacher in teachers]
+        
+        # One indexed range read of every booking involved, folded into per-day busy bitmaps
+        busy = {teacher_id: {} for teacher_id in teacher_ids}
+        student_busy = {}
+        async for session in db.sessions.find(
+            {
+                "$or": [
+                    {"teacher_id": {"$in": teacher_ids}},
+                    {"student_id": current_user["id"]}
+                ],
+                "scheduled_at": {"$gt": range_start - timedelta(minutes=MAX_SESSION_MINUTES), "$lt": range_end},
+                "status": {"$in": ACTIVE_SESSION_STATUSES}
+            },
+            {"_id": 0, "teacher_id": 1, "student_id": 1, "scheduled_at": 1, "duration_minutes": 1}
+        ):
+            if session["teacher_id"] in busy:
+                mark_busy_slots(busy[session["teacher_id"]], session["scheduled_at"], session_end(session))
+            if session["student_id"] == current_user["id"]:
+                mark_busy_slots(student_busy, session["scheduled_at"], session_end(session))
+        
+        # Nothing bookable before now
+        now = datetime.utcnow()
+        past = {}
+        if range_start < now:
+            mark_busy_slots(past, range_start, min(now, range_end))
+        
+        slots_needed = -(-duration_minutes // SESSION_SLOT_MINUTES)
+        users = {
+            user["id"]: user
+            async for user in db.users.find(
+                {"id": {"$in": [teacher["user_id"] for teacher in teachers]}},
+                {"_id": 0, "id": 1, "first_name": 1, "last_name": 1}
+            )
+        }
+        
+        results = []
+        for teacher in teachers:
+            slots = []
+            for offset in range(days):
+                day = first_day + timedelta(days=offset)
+                day_busy = busy[teacher["id"]].get(day, 0) | student_busy.get(day, 0) | past.get(day, 0)
+                day_start = datetime.combine(day, datetime.min.time()) + timedelta(hours=SESSION_DAY_START_HOUR)
+                slots.extend(
+                    day_start + timedelta(minutes=index * SESSION_SLOT_MINUTES)
+                    for index in free_slot_starts(day_busy, slots_needed)
+                )
+            user = users.get(teacher["user_id"], {})
+            results.append({
+                "teacher_id": teacher["id"],
+                "teacher_name": f"{user.get('first_name', '')} {user.get('last_name', '')}".strip(),
+                "rating": teacher.get("rating", 0.0),
+                "duration_minutes": duration_minutes,
+                "slots": slots
+            })
+        
+        return results
+    
+    except Exception as e:
+        logger.error(f"Get available slots error: {str(e)}")
+        if isinstance(e, HTTPException):
+            raise e
+        raise HTTPException(status_code=500, detail="Failed to retrieve available slots")
+
 @api_router.get("/sessions/my")
 async def get_my_sessions(current_user = Depends(get_current_user)):
     try:
@@ -2084,50 +2826,13 @@ async def complete_session(
         if current_user["role"] not in ["teacher", "manager"]:
             raise HTTPException(status_code=403, detail="Only teachers and managers can complete sessions")
         
-        # Get session
-        session = await db.sessions.find_one({"id": session_id})
+        # Complete the session only once, so repeated requests do not count twice
+        session = await record_session_completion(db, session_id, notes)
         if not session:
+            if await db.sessions.count_documents({"id": session_id}, limit=1):
+                raise HTTPException(status_code=409, detail="Session already completed")
             raise HTTPException(status_code=404, detail="Session not found")
         
-        # Update session
-        await db.sessions.update_one(
-            {"id": session_id},
-            {
-                "$set": {
-                    "status": SessionStatus.COMPLETED,
-                    "notes": notes,
-                    "updated_at": datetime.utcnow()
-                }
-            }
-        )
-        
-        # Update course progress
-        course = await db.courses.find_one({"id": session["course_id"]})
-        if course:
-            new_completed = course["completed_sessions"] + 1
-            await db.courses.update_one(
-                {"id": session["course_id"]},
-                {
-                    "$set": {
-                        "completed_sessions": new_completed,
-                        "updated_at": datetime.utcnow()
-                    }
-                }
-            )
-            
-            # Check if course is completed
-            if new_completed >= course["total_sessions"]:
-                await db.courses.update_one(
-                    {"id": session["course_id"]},
-                    {
-                        "$set": {
-                            "status": CourseStatus.COMPLETED,
-                            "exam_status": ExamStatus.AVAILABLE,
-                            "updated_at": datetime.utcnow()
-                        }
-                    }
-                )
-        
         return {"message": "Session completed successfully"}
     
     except Exception as e:
@@ -2155,18 +2860,25 @@ async def schedule_exam(
         if course["exam_status"] != ExamStatus.AVAILABLE:
             raise HTTPException(status_code=400, detail="Course is not ready for exam")
         
-        # Find available external expert
-        experts_cursor = db.external_experts.find({
-            "specialization": {"$in": [exam_data.exam_type]},
-            "is_available": True
-        })
-        experts = await experts_cursor.to_list(length=None)
-        
-        if not experts:
-            raise HTTPException(status_code=404, detail="No available external experts for this exam type")
-        
-        # Select first available expert (in real app, would have better logic)
-        expert = experts[0]
+        try:
+            preferred_times = [datetime.fromisoformat(value) for value in exam_data.preferred_dates]
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid preferred date, expected ISO format")
+        if not preferred_times:
+            raise HTTPException(status_code=400, detail="At least one preferred date is required")
+        
+        # Experts are matched on the state the school is in
+        enrollment = await db.enrollments.find_one({"id": course["enrollment_id"]})
+        school = await db.driving_schools.find_one({"id": enrollment["driving_school_id"]}) if enrollment else None
+        state = (school or {}).get("state") or current_user.get("state")
+        if not state:
+            raise HTTPException(status_code=400, detail="No state on file for your school or profile; experts are assigned by state")
+        
+        # Least-loaded eligible expert on the earliest preferred day with capacity
+        assignment = await expert_assignment.assign(exam_data.exam_type, state, preferred_times)
+        if not assignment:
+            raise HTTPException(status_code=409, detail="No external expert available in your state on the preferred dates")
+        expert, scheduled_at = assignment
         
         # Create exam
         exam_id = str(uuid.uuid4())
@@ -2176,8 +2888,10 @@ async def schedule_exam(
             "student_id": current_user["id"],
             "external_expert_id": expert["id"],
             "exam_type": exam_data.exam_type,
-            "scheduled_at": datetime.fromisoformat(exam_data.preferred_dates[0]),  # Use first preferred date
+            "scheduled_at": scheduled_at,
             "location": exam_data.location,
+            "state": state,
+            "school_id": school["id"] if school else None,
             "duration_minutes": 90,
             "status": ExamStatus.AVAILABLE,
             "score": None,
@@ -2185,9 +2899,18 @@ async def schedule_exam(
             "created_at": datetime.utcnow()
         }
         
-        await db.exam_schedules.insert_one(exam_doc)
+        try:
+            await db.exam_schedules.insert_one(exam_doc)
+        except Exception:
+            await expert_assignment.release(expert["id"], scheduled_at.date().isoformat())
+            raise
         
-        return {"exam_id": exam_id, "message": "Exam scheduled successfully"}
+        return {
+            "exam_id": exam_id,
+            "scheduled_at": scheduled_at,
+            "external_expert_id": expert["id"],
+            "message": "Exam scheduled successfully"
+        }
     
     except Exception as e:
         logger.error(f"Schedule exam error: {str(e)}")
@@ -2285,7 +3008,7 @@ async def complete_exam(
         )
         
         # Update course exam status
-        await db.courses.update_one(
+        course = await db.courses.find_one_and_update(
             {"id": exam["course_id"]},
             {
                 "$set": {
@@ -2296,10 +3019,11 @@ async def complete_exam(
             }
         )
         
-        # Update course availability for next course
-        course = await db.courses.find_one({"id": exam["course_id"]})
+        # Unlock the next course, or issue the certificate after the last exam
         if course and passed:
-            await update_course_availability(course["enrollment_id"])
+            cert_id = await progress_enrollment(course["enrollment_id"])
+            if cert_id:
+                logger.info(f"Certificate generated: {cert_id}")
         
         return {"message": "Exam completed successfully", "passed": passed}
     
@@ -2328,9 +3052,163 @@ async def get_my_certificates(current_user = Depends(get_current_user)):
             raise e
         raise HTTPException(status_code=500, detail="Failed to retrieve certificates")
 
+@api_router.get("/certificates/{cert_id}/download")
+async def download_certificate(cert_id: str, current_user = Depends(get_current_user)):
+    """Stream the stored certificate PDF, rendering it only if it was never stored"""
+    try:
+        certificate = await db.certificates.find_one({"id": cert_id})
+        if not certificate:
+            raise HTTPException(status_code=404, detail="Certificate not found")
+        
+        enrollment = await db.enrollments.find_one({"id": certificate["enrollment_id"]})
+        school = await db.driving_schools.find_one({"id": enrollment["driving_school_id"]}) if enrollment else None
+        is_owner = current_user["id"] == certificate["student_id"]
+        is_manager = school is not None and school.get("manager_id") == current_user["id"]
+        if not (is_owner or is_manager):
+            raise HTTPException(status_code=403, detail="Unauthorized to download this certificate")
+        
+        if not certificate.get("pdf_storage_key"):
+            student = await db.users.find_one({"id": certificate["student_id"]})
+            if not student or not school:
+                raise HTTPException(status_code=404, detail="Certificate holder or school not found")
+            certificate.update(await store_certificate_pdf(certificate, student, school))
+        
+        # Served from here rather than redirected, so the bytes stay behind this access check
+        return StreamingResponse(
+            storage.iter_content(certificate["pdf_storage_key"], certificate["pdf_url"]),
+            media_type="application/pdf",
+            headers={
+                "Content-Disposition": f'attachment; filename="certificate_{certificate["certificate_number"]}.pdf"',
+                "Cache-Control": "private, no-cache"
+            }
+        )
+    
+    except Exception as e:
+        logger.error(f"Download certificate error: {str(e)}")
+        if isinstance(e, HTTPException):
+            raise e
+        raise HTTPException(status_code=500, detail="Failed to download certificate")
+
+@api_router.post("/manager/certificates/cohort")
+async def create_cohort_certificates(current_user = Depends(get_current_user)):
+    """Issue certificates for all eligible students of the manager's school"""
+    try:
+        if current_user["role"] != "manager":
+            raise HTTPException(status_code=403, detail="Only managers can issue certificates")
+        
+        school = await db.driving_schools.find_one({"manager_id": current_user["id"]})
+        if not school:
+            raise HTTPException(status_code=404, detail="No driving school found for this manager")
+        
+        result = await generate_cohort_certificates(school)
+        return {"message": f"{result['certificates']} certificates issued", **result}
+    
+    except Exception as e:
+        logger.error(f"Cohort certificates error: {str(e)}")
+        if isinstance(e, HTTPException):
+            raise e
+        raise HTTPException(status_code=500, detail="Failed to issue certificates")
+
+@api_router.get("/manager/certificates/batches/{batch_id}/download")
+async def download_certificate_batch(batch_id: str, current_user = Depends(get_current_user)):
+    """Stream a batch's certificates as a ZIP archive"""
+    try:
+        if current_user["role"] != "manager":
+            raise HTTPException(status_code=403, detail="Only managers can download certificate batches")
+        
+        batch = await db.certificate_batches.find_one({"id": batch_id})
+        school = await db.driving_schools.find_one({"manager_id": current_user["id"]})
+        if not batch or not school or batch["school_id"] != school["id"]:
+            raise HTTPException(status_code=404, detail="Certificate batch not found")
+        
+        certificates_cursor = db.certificates.find(
+            {"batch_id": batch_id, "pdf_storage_key": {"$ne": None}},
+            {"_id": 0, "certificate_number": 1, "pdf_storage_key": 1, "pdf_url": 1}
+        ).sort("certificate_number", 1)
+        
+        return StreamingResponse(
+            stream_certificates_zip(certificates_cursor),
+            media_type="application/zip",
+            headers={"Content-Disposition": f'attachment; filename="certificates-{batch_id[:8]}.zip"'}
+        )
+    
+    except Exception as e:
+        logger.error(f"Download certificate batch error: {str(e)}")
+        if isinstance(e, HTTPException):
+            raise e
+        raise HTTPException(status_code=500, detail="Failed to download certificate batch")
+
+@api_router.post("/manager/certificates/{cert_id}/revoke")
+async def revoke_certificate(cert_id: str, revocation: CertificateRevocation, current_user = Depends(get_current_user)):
+    """Revoke a certificate issued by the manager's school"""
+    try:
+        if current_user["role"] != "manager":
+            raise HTTPException(status_code=403, detail="Only managers can revoke certificates")
+        
+        certificate = await db.certificates.find_one({"id": cert_id})
+        school = await db.driving_schools.find_one({"manager_id": current_user["id"]})
+        enrollment = await db.enrollments.find_one({"id": certificate["enrollment_id"]}) if certificate else None
+        if not school or not enrollment or enrollment["driving_school_id"] != school["id"]:
+            raise HTTPException(status_code=404, detail="Certificate not found")
+        
+        if certificate["status"] != CertificateStatus.REVOKED:
+            await db.certificates.update_one(
+                {"id": cert_id},
+                {"$set": {
+                    "status": CertificateStatus.REVOKED,
+                    "revoked_at": datetime.utcnow(),
+                    "revoked_by": current_user["id"],
+                    "revocation_reason": revocation.reason
+                }}
+            )
+        # Other workers pick it up on their next revocation refresh
+        revocation_list.add(cert_id)
+        
+        return {"message": "Certificate revoked", "certificate_id": cert_id}
+    
+    except Exception as e:
+        logger.error(f"Revoke certificate error: {str(e)}")
+        if isinstance(e, HTTPException):
+            raise e
+        raise HTTPException(status_code=500, detail="Failed to revoke certificate")
+
+@api_router.get("/certificates/verify")
+async def verify_certificate_token(token: str):
+    """Verify the token scanned from a certificate's QR code"""
+    try:
+        claims = certificate_signer.verify(token)
+    except InvalidCertificateToken as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return await verify_certificate(claims["certificate_id"], token)
+
 @api_router.get("/certificates/{cert_id}/verify")
-async def verify_certificate(cert_id: str):
+async def verify_certificate(cert_id: str, token: Optional[str] = None):
+    """Verify a certificate.
+
+    With the signed ``token`` from its QR code this needs no database
+    access; revoked certificates and legacy ones without a token are
+    looked up.
+    """
     try:
+        if token:
+            try:
+                claims = certificate_signer.verify(token)
+            except InvalidCertificateToken as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            if claims["certificate_id"] != cert_id:
+                raise HTTPException(status_code=400, detail="Token does not match certificate")
+            
+            # Stored certificates stay GENERATED until revoked, and revoked ones are looked up below
+            if cert_id not in revocation_list:
+                return {
+                    "certificate_number": claims["certificate_number"],
+                    "student_name": claims["student_name"],
+                    "issue_date": claims["issue_date"],
+                    "expiry_date": claims["expiry_date"],
+                    "status": CertificateStatus.GENERATED,
+                    "is_valid": datetime.utcnow() < claims["expiry_date"] + timedelta(days=1)
+                }
+        
         certificate = await db.certificates.find_one({"id": cert_id})
         if not certificate:
             raise HTTPException(status_code=404, detail="Certificate not found")
@@ -2344,10 +3222,13 @@ async def verify_certificate(cert_id: str):
             "issue_date": certificate["issue_date"],
             "expiry_date": certificate.get("expiry_date"),
             "status": certificate["status"],
-            "is_valid": certificate["status"] == "issued" and 
+            "is_valid": certificate["status"] in (CertificateStatus.GENERATED, CertificateStatus.ISSUED) and 
                        (not certificate.get("expiry_date") or 
                         datetime.utcnow() < certificate["expiry_date"])
         }
+        if certificate["status"] == CertificateStatus.REVOKED:
+            verification_data["revoked_at"] = certificate.get("revoked_at")
+            verification_data["revocation_reason"] = certificate.get("revocation_reason")
         
         return verification_data
     
@@ -2360,9 +3241,21 @@ async def verify_certificate(cert_id: str):
 # NOTIFICATION ENDPOINTS
 
 @api_router.get("/notifications/my")
-async def get_my_notifications(current_user = Depends(get_current_user)):
+async def get_my_notifications(
+    since: Optional[str] = None,
+    current_user = Depends(get_current_user)
+):
     try:
-        notifications_cursor = db.notifications.find({"user_id": current_user["id"]}).sort("created_at", -1)
+        query = {"user_id": current_user["id"]}
+        
+        # Only return notifications newer than the client's last known one
+        if since:
+            try:
+                query["created_at"] = {"$gt": datetime.fromisoformat(since)}
+            except ValueError:
+                raise HTTPException(status_code=400, detail="Invalid 'since' timestamp")
+        
+        notifications_cursor = db.notifications.find(query).sort("created_at", -1)
         notifications = await notifications_cursor.to_list(length=None)
         
         return serialize_doc(notifications)
@@ -2373,6 +3266,84 @@ async def get_my_notifications(current_user = Depends(get_current_user)):
             raise e
         raise HTTPException(status_code=500, detail="Failed to retrieve notifications")
 
+@api_router.get("/notifications/stream")
+async def stream_notifications(
+    request: Request,
+    token: Optional[str] = None,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security)
+):
+    """Server-Sent Events stream of new notifications for the current user.
+
+    EventSource cannot send headers, so the access token may also be passed
+    as the ``token`` query parameter. On reconnect the browser sends
+    ``Last-Event-ID``; notifications created after that one are replayed
+    before live events resume.
+    """
+    if credentials:
+        token = credentials.credentials
+    if not token:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    current_user = await get_user_from_token(token)
+    user_id = current_user["id"]
+    
+    # Subscribe before replaying so nothing inserted in between is missed
+    queue = notification_hub.subscribe(user_id)
+    
+    missed = []
+    last_event_id = request.headers.get("last-event-id")
+    if last_event_id:
+        # The last seen event may come from either notification collection
+        last_seen = None
+        for collection in NOTIFICATION_COLLECTIONS:
+            last_seen = await db[collection].find_one(
+                {"id": last_event_id, "user_id": user_id}, {"created_at": 1}
+            )
+            if last_seen:
+                break
+        if last_seen:
+            for collection in NOTIFICATION_COLLECTIONS:
+                missed_cursor = db[collection].find({
+                    "user_id": user_id,
+                    "created_at": {"$gt": last_seen["created_at"]}
+                }).sort("created_at", 1)
+                for notification in await missed_cursor.to_list(length=100):
+                    notification["source"] = collection
+                    missed.append(notification)
+            missed.sort(key=lambda notification: notification["created_at"])
+            missed = missed[:100]
+    
+    def format_event(notification: dict) -> str:
+        return f"event: notification\nid: {notification['id']}\ndata: {json.dumps(notification)}\n\n"
+    
+    async def event_stream():
+        # Inserts landing between subscribe and replay arrive both ways; send each id once
+        replayed_ids = {notification["id"] for notification in missed}
+        try:
+            yield f"retry: {SSE_RETRY_MS}\n\n"
+            for notification in serialize_doc(missed):
+                yield format_event(notification)
+            
+            while True:
+                if await request.is_disconnected():
+                    break
+                try:
+                    notification = await asyncio.wait_for(queue.get(), timeout=SSE_HEARTBEAT_SECONDS)
+                    if notification["id"] in replayed_ids:
+                        replayed_ids.discard(notification["id"])
+                        continue
+                    yield format_event(notification)
+                except asyncio.TimeoutError:
+                    # Comment line keeps proxies from closing an idle connection
+                    yield ": keep-alive\n\n"
+        finally:
+            notification_hub.unsubscribe(user_id, queue)
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @api_router.post("/notifications/{notification_id}/read")
 async def mark_notification_read(
     notification_id: str,
@@ -2390,7 +3361,7 @@ async def mark_notification_read(
         # Mark as read
         await db.notifications.update_one(
             {"id": notification_id},
-            {"$set": {"is_read": True}}
+            {"$set": {"is_read": True, "read_at": datetime.utcnow()}}
         )
         
         return {"message": "Notification marked as read"}
@@ -2406,7 +3377,7 @@ async def mark_all_notifications_read(current_user = Depends(get_current_user)):
     try:
         await db.notifications.update_many(
             {"user_id": current_user["id"], "is_read": False},
-            {"$set": {"is_read": True}}
+            {"$set": {"is_read": True, "read_at": datetime.utcnow()}}
         )
         
         return {"message": "All notifications marked as read"}
@@ -2646,29 +3617,18 @@ async def complete_course_session(
         if current_user["role"] not in ["student", "teacher", "manager"]:
             raise HTTPException(status_code=403, detail="Unauthorized to complete sessions")
         
-        # Get course
-        course = await db.courses.find_one({"id": course_id})
+        course = await advance_course_progress(db, course_id)
         if not course:
-            raise HTTPException(status_code=404, detail="Course not found")
-        
-        # Increment completed sessions
-        new_completed = course["completed_sessions"] + 1
+            existing = await db.courses.find_one({"id": course_id}, {"_id": 0, "status": 1})
+            if not existing:
+                raise HTTPException(status_code=404, detail="Course not found")
+            if existing["status"] == CourseStatus.LOCKED:
+                raise HTTPException(status_code=409, detail="Course is locked until the previous exam is passed")
+            raise HTTPException(status_code=409, detail="All sessions of this course are already completed")
         
-        # Update course
-        update_data = {
-            "completed_sessions": new_completed,
-            "updated_at": datetime.utcnow()
-        }
-        
-        # Check if course is completed
-        if new_completed >= course["total_sessions"]:
-            update_data["status"] = CourseStatus.COMPLETED
-            update_data["exam_status"] = ExamStatus.AVAILABLE
-        
-        await db.courses.update_one({"id": course_id}, {"$set": update_data})
-        
-        # Update course availability
-        await update_course_availability(course["enrollment_id"])
+        # Course availability only changes when this call completed the course
+        if course["just_completed"]:
+            await progress_enrollments(db, [course["enrollment_id"]])
         
         return {"message": "Session completed successfully"}
     
@@ -2712,9 +3672,9 @@ async def take_course_exam(
             }
         )
         
-        # Update course availability for next course
+        # Unlock the next course, or issue the certificate after the last exam
         if passed:
-            await update_course_availability(course["enrollment_id"])
+            await progress_enrollment(course["enrollment_id"])
         
         return {"message": "Exam completed successfully", "passed": passed, "score": score}
     
@@ -2800,6 +3760,84 @@ async def get_dashboard(
 
 # PAYMENT ENDPOINTS
 
+@api_router.post("/payments/webhook/{provider}")
+async def receive_payment_webhook(provider: str, request: Request):
+    """Persist a provider webhook and acknowledge it; state changes are applied by the webhook worker"""
+    try:
+        payload = await request.json()
+        signature = request.headers.get("x-signature", "")
+        
+        result = await payment_service.ingest_webhook(provider, payload, signature)
+        return {"received": True, **result}
+    
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Payment webhook error: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to receive webhook")
+
+@api_router.post("/payments/reconcile")
+async def reconcile_payment_statement(
+    statement: UploadFile = File(...),
+    source: str = Form("ccp"),
+    current_user = Depends(get_current_user)
+):
+    """Match a CCP/bank statement CSV against the school's pending payments"""
+    try:
+        if current_user["role"] != "manager":
+            raise HTTPException(status_code=403, detail="Only managers can reconcile payments")
+        
+        school = await db.driving_schools.find_one({"manager_id": current_user["id"]})
+        if not school:
+            raise HTTPException(status_code=404, detail="No driving school found for this manager")
+        
+        # The upload is spooled to disk by Starlette; decode it lazily row by row
+        stream = io.TextIOWrapper(statement.file, encoding="utf-8-sig", newline="")
+        try:
+            report = await payment_service.reconcile_statement(
+                iter_statement_batches(stream),
+                source=source,
+                school_id=school["id"]
+            )
+        finally:
+            stream.detach()
+        
+        return {"reconciliation": report}
+    
+    except Exception as e:
+        logger.error(f"Reconcile statement error: {str(e)}")
+        if isinstance(e, HTTPException):
+            raise e
+        raise HTTPException(status_code=500, detail="Failed to reconcile statement")
+
+@api_router.get("/payments/reconcile/{run_id}/unmatched")
+async def get_reconciliation_unmatched(
+    run_id: str,
+    skip: int = 0,
+    limit: int = 100,
+    current_user = Depends(get_current_user)
+):
+    try:
+        if current_user["role"] != "manager":
+            raise HTTPException(status_code=403, detail="Only managers can view reconciliations")
+        
+        school = await db.driving_schools.find_one({"manager_id": current_user["id"]})
+        run = await db.reconciliation_runs.find_one({"id": run_id})
+        if not school or not run or run.get("school_id") != school["id"]:
+            raise HTTPException(status_code=404, detail="Reconciliation run not found")
+        
+        rows = await db.reconciliation_unmatched.find(
+            {"run_id": run_id}
+        ).sort("row_number", 1).skip(skip).limit(min(limit, 1000)).to_list(length=None)
+        
+        return {"run": serialize_doc(run), "unmatched": serialize_doc(rows)}
+    
+    except Exception as e:
+        logger.error(f"Get reconciliation error: {str(e)}")
+        if isinstance(e, HTTPException):
+            raise e
+        raise HTTPException(status_code=500, detail="Failed to fetch reconciliation")
+
 @api_router.post("/payments/complete")
 async def complete_payment(
     enrollment_id: str = Form(...),
@@ -2833,7 +3871,7 @@ async def complete_payment(
                 "metadata": {"enrollment_id": enrollment_id},
                 "created_at": datetime.utcnow()
             }
-            await db.notifications.insert_one(notification_doc)
+            await insert_notification(notification_doc)
         
         return {"message": "Payment completed successfully"}
     
@@ -2911,6 +3949,8 @@ async def verify_document(
             {"$set": {"is_verified": is_verified}}
         )
         
+        await update_verified_documents([document], is_verified)
+        
         return {"message": "Document verification updated successfully"}
     
     except Exception as e:
@@ -2942,63 +3982,72 @@ async def get_student_progress_fixed(
             raise e
         raise HTTPException(status_code=500, detail="Failed to retrieve student progress")
 
+def certificate_state_code(state: Optional[str]) -> str:
+    """Two-digit wilaya code of a state, used to key and format certificate numbers.
+
+    Name prefixes are ambiguous (Béchar/Béjaïa, Bordj Bou Arréridj/Bordj
+    Badji Mokhtar), so states sharing one would share a counter.
+    """
+    if state not in ALGERIAN_STATES:
+        state = DEFAULT_CERTIFICATE_STATE
+    return f"{ALGERIAN_STATES.index(state) + 1:02d}"
+
 # AUTO-GENERATE CERTIFICATE FOR COMPLETED STUDENTS
-async def check_and_generate_certificate(enrollment_id: str):
-    """Check if student has completed all courses and generate certificate"""
+async def issue_certificate(enrollment_id: str) -> Optional[str]:
+    """Generate the certificate of an enrollment the progression engine found eligible"""
     try:
-        # Get all courses for this enrollment
-        courses_cursor = db.courses.find({"enrollment_id": enrollment_id})
-        courses = await courses_cursor.to_list(length=None)
-        
-        # Check if all courses are completed and exams passed
-        all_completed = True
-        for course in courses:
-            if course["exam_status"] != ExamStatus.PASSED:
-                all_completed = False
-                break
+        # Get enrollment and student details
+        enrollment = await db.enrollments.find_one({"id": enrollment_id})
+        student = await db.users.find_one({"id": enrollment["student_id"]})
+        school = await db.driving_schools.find_one({"id": enrollment["driving_school_id"]})
         
-        if all_completed:
-            # Get enrollment and student details
-            enrollment = await db.enrollments.find_one({"id": enrollment_id})
-            student = await db.users.find_one({"id": enrollment["student_id"]})
-            school = await db.driving_schools.find_one({"id": enrollment["driving_school_id"]})
+        # Check if certificate already exists
+        existing_cert = await db.certificates.find_one({"enrollment_id": enrollment_id})
+        if not existing_cert:
+            # Generate certificate
+            cert_id = str(uuid.uuid4())
+            cert_number = (await certificate_numbers.allocate(certificate_state_code(student.get("state"))))[0]
             
-            # Check if certificate already exists
-            existing_cert = await db.certificates.find_one({"enrollment_id": enrollment_id})
-            if not existing_cert:
-                # Generate certificate
-                cert_id = str(uuid.uuid4())
-                cert_number = f"DZ-{student['state'][:3].upper()}-{int(datetime.utcnow().timestamp())}"
-                
-                certificate_doc = {
-                    "id": cert_id,
-                    "student_id": enrollment["student_id"],
-                    "enrollment_id": enrollment_id,
-                    "certificate_number": cert_number,
-                    "issue_date": datetime.utcnow(),
-                    "expiry_date": datetime.utcnow() + timedelta(days=5*365),  # 5 years
-                    "status": CertificateStatus.GENERATED,
-                    "pdf_url": None,
-                    "qr_code": None,
-                    "created_at": datetime.utcnow()
-                }
-                
+            certificate_doc = {
+                "id": cert_id,
+                "student_id": enrollment["student_id"],
+                "enrollment_id": enrollment_id,
+                "certificate_number": cert_number,
+                "issue_date": datetime.utcnow(),
+                "expiry_date": datetime.utcnow() + timedelta(days=5*365),  # 5 years
+                "status": CertificateStatus.GENERATED,
+                "pdf_url": None,
+                "qr_code": None,
+                "created_at": datetime.utcnow()
+            }
+            sign_certificate(certificate_doc, f"{student['first_name']} {student['last_name']}")
+            
+            try:
                 await db.certificates.insert_one(certificate_doc)
-                
-                # Send notification
-                notification_doc = {
-                    "id": str(uuid.uuid4()),
-                    "user_id": enrollment["student_id"],
-                    "type": NotificationType.CERTIFICATE_READY,
-                    "title": "Certificate Ready!",
-                    "message": f"Congratulations! Your driving certificate is ready for download.",
-                    "is_read": False,
-                    "metadata": {"certificate_id": cert_id, "certificate_number": cert_number},
-                    "created_at": datetime.utcnow()
-                }
-                await db.notifications.insert_one(notification_doc)
-                
-                return cert_id
+            except DuplicateKeyError:
+                # Issued concurrently by another worker (enrollment_id is unique)
+                return None
+            
+            try:
+                await store_certificate_pdf(certificate_doc, student, school)
+            except Exception as e:
+                # The download endpoint renders it on first request instead
+                logger.error(f"Certificate PDF rendering error: {str(e)}")
+            
+            # Send notification
+            notification_doc = {
+                "id": str(uuid.uuid4()),
+                "user_id": enrollment["student_id"],
+                "type": NotificationType.CERTIFICATE_READY,
+                "title": "Certificate Ready!",
+                "message": "Congratulations! Your driving certificate is ready for download.",
+                "is_read": False,
+                "metadata": {"certificate_id": cert_id, "certificate_number": cert_number},
+                "created_at": datetime.utcnow()
+            }
+            await insert_notification(notification_doc)
+            
+            return cert_id
         
         return None
     
@@ -3006,73 +4055,182 @@ async def check_and_generate_certificate(enrollment_id: str):
         logger.error(f"Certificate generation error: {str(e)}")
         return None
 
-# Updated exam completion to trigger certificate generation
-@api_router.post("/exams/{exam_id}/complete")
-async def complete_exam_updated(
-    exam_id: str,
-    score: float = Form(...),
-    notes: str = Form(""),
-    current_user = Depends(get_current_user)
-):
-    try:
-        if current_user["role"] != "external_expert":
-            raise HTTPException(status_code=403, detail="Only external experts can complete exams")
-        
-        # Get exam
-        exam = await db.exam_schedules.find_one({"id": exam_id})
-        if not exam:
-            raise HTTPException(status_code=404, detail="Exam not found")
-        
-        # Verify expert ownership
-        expert = await db.external_experts.find_one({"user_id": current_user["id"]})
-        if not expert or exam["external_expert_id"] != expert["id"]:
-            raise HTTPException(status_code=403, detail="Unauthorized to complete this exam")
-        
-        # Determine pass/fail
-        passing_score = 70.0
-        passed = score >= passing_score
-        
-        # Update exam
-        await db.exam_schedules.update_one(
-            {"id": exam_id},
-            {
-                "$set": {
-                    "status": ExamStatus.PASSED if passed else ExamStatus.FAILED,
-                    "score": score,
-                    "notes": notes
-                }
-            }
-        )
-        
-        # Update course exam status
-        await db.courses.update_one(
-            {"id": exam["course_id"]},
-            {
-                "$set": {
-                    "exam_status": ExamStatus.PASSED if passed else ExamStatus.FAILED,
-                    "exam_score": score,
-                    "updated_at": datetime.utcnow()
-                }
-            }
+async def find_certificate_eligible_enrollments(school_id: str, limit: int) -> List[dict]:
+    """Approved enrollments of a school with every exam passed and no certificate yet, in one aggregation"""
+    pipeline = [
+        {"$match": {"driving_school_id": school_id, "enrollment_status": EnrollmentStatus.APPROVED}},
+        {"$lookup": {"from": "certificates", "localField": "id", "foreignField": "enrollment_id", "as": "certificates"}},
+        {"$match": {"certificates": {"$size": 0}}},
+        {"$lookup": {"from": "courses", "localField": "id", "foreignField": "enrollment_id", "as": "courses"}},
+        {"$match": {
+            "courses.0": {"$exists": True},
+            "courses": {"$not": {"$elemMatch": {"exam_status": {"$ne": ExamStatus.PASSED}}}}
+        }},
+        {"$limit": limit},
+        {"$lookup": {"from": "users", "localField": "student_id", "foreignField": "id", "as": "student"}},
+        {"$unwind": "$student"},
+        {"$project": {
+            "_id": 0,
+            "id": 1,
+            "student_id": 1,
+            "student.first_name": 1,
+            "student.last_name": 1,
+            "student.state": 1
+        }}
+    ]
+    return await db.enrollments.aggregate(pipeline).to_list(length=None)
+
+async def generate_cohort_certificates(school: dict, limit: int = MAX_COHORT_CERTIFICATES) -> dict:
+    """Issue certificates for every eligible enrollment of a school as one batch"""
+    enrollments = await find_certificate_eligible_enrollments(school["id"], limit)
+    batch_id = str(uuid.uuid4())
+    if not enrollments:
+        return {"batch_id": None, "certificates": 0}
+    
+    # At most one counter round trip per state
+    by_state = {}
+    for enrollment in enrollments:
+        by_state.setdefault(certificate_state_code(enrollment["student"].get("state")), []).append(enrollment)
+    
+    now = datetime.utcnow()
+    certificates = []
+    students = {}
+    for state_code, state_enrollments in by_state.items():
+        numbers = await certificate_numbers.allocate(state_code, len(state_enrollments))
+        for enrollment, cert_number in zip(state_enrollments, numbers):
+            student = enrollment["student"]
+            students[enrollment["student_id"]] = student
+            certificates.append(sign_certificate({
+                "id": str(uuid.uuid4()),
+                "student_id": enrollment["student_id"],
+                "enrollment_id": enrollment["id"],
+                "certificate_number": cert_number,
+                "issue_date": now,
+                "expiry_date": now + timedelta(days=5*365),  # 5 years
+                "status": CertificateStatus.GENERATED,
+                "pdf_url": None,
+                "qr_code": None,
+                "batch_id": batch_id,
+                "created_at": now
+            }, f"{student['first_name']} {student['last_name']}"))
+    
+    # Render and store in bounded groups, so only one group of PDFs is held in memory at a time;
+    # groups stay small so the storage bulkhead is not overrun
+    for i in range(0, len(certificates), COHORT_CERTIFICATE_GROUP_SIZE):
+        group = certificates[i:i + COHORT_CERTIFICATE_GROUP_SIZE]
+        pdfs = await certificate_renderer.render_many(
+            [build_certificate_data(certificate, students[certificate["student_id"]], school) for certificate in group],
+            chunk_size=-(-len(group) // certificate_renderer.max_workers)
         )
-        
-        # Update course availability for next course
-        course = await db.courses.find_one({"id": exam["course_id"]})
-        if course and passed:
-            await update_course_availability(course["enrollment_id"])
-            
-            # Check if all courses completed and generate certificate
-            cert_id = await check_and_generate_certificate(course["enrollment_id"])
-            if cert_id:
-                logger.info(f"Certificate generated: {cert_id}")
-        
-        return {"message": "Exam completed successfully", "passed": passed}
+        stored = await asyncio.gather(*(
+            storage.save(
+                BytesIO(pdf),
+                len(pdf),
+                folder="certificates",
+                filename=f"{certificate['certificate_number']}.pdf",
+                content_type="application/pdf",
+                resource_type="raw"
+            )
+            for certificate, pdf in zip(group, pdfs)
+        ))
+        for certificate, result in zip(group, stored):
+            certificate["pdf_url"] = result["file_url"]
+            certificate["pdf_storage_key"] = result["storage_key"]
     
-    except Exception as e:
-        logger.error(f"Complete exam error: {str(e)}")
-        if isinstance(e, HTTPException):
-            raise e
-        raise HTTPException(status_code=500, detail="Failed to complete exam")
+    try:
+        await db.certificates.insert_many(certificates, ordered=False)
+    except BulkWriteError as e:
+        # enrollment_id is unique: certificates issued concurrently since the lookup count as already issued
+        if any(error.get("code") != 11000 for error in e.details.get("writeErrors", [])):
+            raise
+        failed = {error["index"] for error in e.details.get("writeErrors", [])}
+        certificates = [certificate for i, certificate in enumerate(certificates) if i not in failed]
+        if not certificates:
+            return {"batch_id": None, "certificates": 0}
+    
+    await db.certificate_batches.insert_one({
+        "id": batch_id,
+        "school_id": school["id"],
+        "certificate_count": len(certificates),
+        "created_at": now
+    })
+    
+    await insert_notifications([
+        {
+            "id": str(uuid.uuid4()),
+            "user_id": certificate["student_id"],
+            "type": NotificationType.CERTIFICATE_READY,
+            "title": "Certificate Ready!",
+            "message": "Congratulations! Your driving certificate is ready for download.",
+            "is_read": False,
+            "metadata": {"certificate_id": certificate["id"], "certificate_number": certificate["certificate_number"]},
+            "created_at": now
+        }
+        for certificate in certificates
+    ])
+    
+    return {"batch_id": batch_id, "certificates": len(certificates)}
+
+class _ZipSink:
+    """Unseekable write target for zipfile; collects bytes until they are streamed out"""
+    
+    def __init__(self):
+        self._chunks = []
+    
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+    
+    def flush(self):
+        pass
+    
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+async def stream_certificates_zip(certificates_cursor):
+    """Yield a ZIP of certificate PDFs as it is built; memory stays at one chunk"""
+    sink = _ZipSink()
+    # zipfile writes data descriptors instead of seeking back on unseekable targets
+    with zipfile.ZipFile(sink, "w", zipfile.ZIP_STORED) as archive:
+        async for certificate in certificates_cursor:
+            with archive.open(f"{certificate['certificate_number']}.pdf", "w") as entry:
+                async for chunk in storage.iter_content(certificate["pdf_storage_key"], certificate["pdf_url"]):
+                    entry.write(chunk)
+                    data = sink.drain()
+                    if data:
+                        yield data
+            yield sink.drain()
+    # Central directory
+    yield sink.drain()
+
+# Periodic maintenance jobs (interval in seconds)
+scheduler.add_job("process_payment_webhooks", payment_service.process_webhook_events,
+                  float(os.environ.get('WEBHOOK_WORKER_INTERVAL_SECONDS', '2')))
+scheduler.add_job("expire_payments", payment_service.cleanup_expired_payments,
+                  int(os.environ.get('PAYMENT_CLEANUP_INTERVAL_SECONDS', '60')))
+scheduler.add_job("flush_notification_digests", notification_service.flush_digests,
+                  int(os.environ.get('DIGEST_FLUSH_INTERVAL_SECONDS', '60')))
+scheduler.add_job("schedule_reminders", notification_service.schedule_reminders,
+                  int(os.environ.get('REMINDER_INTERVAL_SECONDS', '3600')), initial_delay=30)
+scheduler.add_job("archive_read_notifications", notification_service.archive_read_notifications,
+                  int(os.environ.get('NOTIFICATION_ARCHIVE_INTERVAL_SECONDS', '86400')), initial_delay=300)
+
+@app.on_event("startup")
+async def start_background_services():
+    await notification_hub.start(db)
+    await scheduler.start(db)
+    await revocation_list.start(db)
+
+@app.on_event("shutdown")
+async def stop_background_services():
+    await scheduler.stop()
+    await revocation_list.stop()
+    await notification_hub.stop()
+    await close_provider_clients()
+    image_service.shutdown()
+    certificate_renderer.shutdown()
 
 # Include the API router
 app.include_router(api_router)
@@ -0,0 +1,54 @@
+# Bookable session slots as per-day bitmaps, and recurring session times
+import os
+from datetime import datetime, date, timedelta
+from typing import Dict, List, Optional
+
+# Bookable hours and slot granularity of the free-slot search
+SESSION_DAY_START_HOUR = int(os.environ.get('SESSION_DAY_START_HOUR', '8'))
+SESSION_DAY_END_HOUR = int(os.environ.get('SESSION_DAY_END_HOUR', '18'))
+SESSION_SLOT_MINUTES = int(os.environ.get('SESSION_SLOT_MINUTES', '30'))
+DAY_SLOT_COUNT = (SESSION_DAY_END_HOUR - SESSION_DAY_START_HOUR) * 60 // SESSION_SLOT_MINUTES
+
+def mark_busy_slots(bitmaps: Dict[date, int], start: datetime, end: datetime):
+    """Set the bit of every bookable slot that [start, end) touches, one bitmap per day"""
+    slot = timedelta(minutes=SESSION_SLOT_MINUTES)
+    day = start.date()
+    while day <= end.date():
+        day_start = datetime.combine(day, datetime.min.time()) + timedelta(hours=SESSION_DAY_START_HOUR)
+        first = max(0, int((start - day_start) // slot))
+        last = min(DAY_SLOT_COUNT, -int(-(end - day_start) // slot))  # ceiling division
+        if first < last:
+            bitmaps[day] = bitmaps.get(day, 0) | (((1 << (last - first)) - 1) << first)
+        day += timedelta(days=1)
+
+def free_slot_starts(busy: int, slots_needed: int) -> List[int]:
+    """Indices of the slots where ``slots_needed`` consecutive free slots begin"""
+    free = ~busy & ((1 << DAY_SLOT_COUNT) - 1)
+    # After the loop bit i is set only if slots i .. i + slots_needed - 1 are all free
+    starts = free
+    for shift in range(1, slots_needed):
+        starts &= free >> shift
+    indices = []
+    while starts:
+        low = starts & -starts
+        indices.append(low.bit_length() - 1)
+        starts ^= low
+    return indices
+
+def expand_recurrence(first: datetime, frequency: str, interval: int,
+                      weekdays: Optional[List[int]], count: int) -> List[datetime]:
+    """Start times of a daily or weekly recurrence, beginning with ``first``"""
+    if frequency == "daily":
+        return [first + timedelta(days=i * interval) for i in range(count)]
+
+    weekdays = sorted(set(weekdays or [first.weekday()]))
+    week_start = first - timedelta(days=first.weekday())
+    occurrences = []
+    week = 0
+    while len(occurrences) < count:
+        for weekday in weekdays:
+            occurrence = week_start + timedelta(weeks=week * interval, days=weekday)
+            if occurrence >= first and len(occurrences) < count:
+                occurrences.append(occurrence)
+        week += 1
+    return occurrences
@@ -0,0 +1,210 @@
+# Pluggable file storage: Cloudinary or a local content-addressed store
+import os
+import re
+import abc
+import uuid
+import asyncio
+import hashlib
+import logging
+import mimetypes
+import tempfile
+from pathlib import Path
+from typing import AsyncIterator, BinaryIO, Optional
+
+import aiofiles
+import cloudinary.uploader
+
+from uploads import ProgressReader, UPLOAD_CHUNK_BYTES
+from external_integrations.http_client import get_provider_client
+
+logger = logging.getLogger(__name__)
+
+# <sha256><optional extension>, as produced by LocalStorage.save
+LOCAL_KEY_PATTERN = re.compile(r"^([0-9a-f]{64})(\.[a-z0-9]{1,8})?$")
+
+class StorageBackend(abc.ABC):
+    """Stores uploaded files and returns their metadata.
+
+    ``save`` returns a dict with ``file_url``, ``storage_backend``,
+    ``storage_key``, ``file_size``, ``content_type`` and, when known,
+    ``sha256``, ``format``, ``width`` and ``height``.
+    """
+
+    name = "base"
+
+    @abc.abstractmethod
+    async def save(self, fileobj: BinaryIO, size: int, folder: str, filename: str,
+                   content_type: Optional[str] = None, resource_type: str = "auto",
+                   upload_id: Optional[str] = None) -> dict:
+        """Store a file and return its metadata"""
+
+    @abc.abstractmethod
+    def iter_content(self, key: str, url: str) -> AsyncIterator[bytes]:
+        """Stream a stored file's bytes"""
+
+class CloudinaryStorage(StorageBackend):
+    """Chunked upload to Cloudinary from a worker thread, bounded by the provider bulkhead"""
+
+    name = "cloudinary"
+
+    async def save(self, fileobj, size, folder, filename, content_type=None, resource_type="auto", upload_id=None):
+        upload_result = await get_provider_client("cloudinary").run_sync(
+            cloudinary.uploader.upload_large,
+            ProgressReader(fileobj, upload_id, size),
+            folder=folder,
+            resource_type=resource_type,
+            public_id=f"{str(uuid.uuid4())}_{filename}",
+            filename=filename,
+            chunk_size=UPLOAD_CHUNK_BYTES,
+            overwrite=True
+        )
+
+        return {
+            "file_url": upload_result["secure_url"],
+            "storage_backend": self.name,
+            "storage_key": upload_result["public_id"],
+            "public_id": upload_result["public_id"],
+            "file_size": upload_result.get("bytes", size),
+            "content_type": content_type,
+            "format": upload_result.get("format", ""),
+            "width": upload_result.get("width"),
+            "height": upload_result.get("height")
+        }
+
+    def iter_content(self, key, url):
+        return get_provider_client("cloudinary").iter_bytes(url)
+
+class LocalStorage(StorageBackend):
+    """Content-addressed files on the local disk.
+
+    Files live at ``root/ab/cd/<sha256>``; identical re-uploads hash to the
+    same path and are stored once. Keys carry the original extension so the
+    file endpoint can pick a content type without a database lookup.
+    """
+
+    name = "local"
+
+    def __init__(self, root: str, url_prefix: str = "/api/files", max_concurrency: int = 8):
+        self.root = Path(root)
+        self.url_prefix = url_prefix.rstrip("/")
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+
+    def path_for(self, key: str) -> Optional[Path]:
+        """Resolve a storage key to its file path, or None for malformed keys"""
+        match = LOCAL_KEY_PATTERN.match(key)
+        if not match:
+            return None
+        digest = match.group(1)
+        return self.root / digest[:2] / digest[2:4] / digest
+
+    async def save(self, fileobj, size, folder, filename, content_type=None, resource_type="auto", upload_id=None):
+        async with self.semaphore:
+            digest, written, created = await asyncio.to_thread(self._store, ProgressReader(fileobj, upload_id, size))
+
+        extension = Path(filename or "").suffix.lower()
+        if not re.fullmatch(r"\.[a-z0-9]{1,8}", extension):
+            extension = mimetypes.guess_extension(content_type or "") or ""
+        key = f"{digest}{extension}"
+
+        if not created:
+            logger.info(f"Deduplicated upload {filename} -> {digest}")
+
+        return {
+            "file_url": f"{self.url_prefix}/{key}",
+            "storage_backend": self.name,
+            "storage_key": key,
+            "sha256": digest,
+            "file_size": written,
+            "content_type": content_type or mimetypes.guess_type(key)[0],
+            "format": extension.lstrip("."),
+            "width": None,
+            "height": None
+        }
+
+    async def iter_content(self, key, url=None):
+        path = self.path_for(key)
+        if path is None or not path.exists():
+            raise FileNotFoundError(key)
+        async for chunk in iter_file(path, 0, path.stat().st_size - 1):
+            yield chunk
+
+    def _store(self, reader: ProgressReader):
+        """Copy to a temp file while hashing, then move into place unless already stored"""
+        sha256 = hashlib.sha256()
+        written = 0
+        (self.root / "tmp").mkdir(parents=True, exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=self.root / "tmp", delete=False) as temp:
+            try:
+                while True:
+                    chunk = reader.read(1024 * 1024)
+                    if not chunk:
+                        break
+                    sha256.update(chunk)
+                    temp.write(chunk)
+                    written += len(chunk)
+            except Exception:
+                os.unlink(temp.name)
+                raise
+
+        digest = sha256.hexdigest()
+        target = self.path_for(digest)
+        if target.exists():
+            os.unlink(temp.name)
+            return digest, written, False
+
+        target.parent.mkdir(parents=True, exist_ok=True)
+        # Atomic on the same filesystem; a concurrent identical upload just replaces equal bytes
+        os.replace(temp.name, target)
+        return digest, written, True
+
+FILE_STREAM_CHUNK_BYTES = 64 * 1024
+
+def parse_range(range_header: str, size: int) -> Optional[tuple]:
+    """Parse a single ``bytes=`` range into inclusive (start, end).
+
+    Raises ValueError for unsatisfiable or multi-part ranges.
+    """
+    match = re.fullmatch(r"bytes=(\d*)-(\d*)", range_header.strip())
+    if not match or not (match.group(1) or match.group(2)):
+        raise ValueError("Unsupported range")
+    if match.group(1):
+        start = int(match.group(1))
+        end = min(int(match.group(2)), size - 1) if match.group(2) else size - 1
+    else:
+        # Suffix range: the last N bytes
+        start = max(0, size - int(match.group(2)))
+        end = size - 1
+    if start > end or start >= size:
+        raise ValueError("Unsatisfiable range")
+    return start, end
+
+async def iter_file(path: Path, start: int, end: int):
+    """Yield bytes start..end (inclusive) of a file without blocking the loop"""
+    remaining = end - start + 1
+    async with aiofiles.open(path, "rb") as f:
+        await f.seek(start)
+        while remaining > 0:
+            chunk = await f.read(min(FILE_STREAM_CHUNK_BYTES, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+def cloudinary_configured() -> bool:
+    return bool(
+        os.environ.get('CLOUDINARY_CLOUD_NAME') and
+        os.environ.get('CLOUDINARY_API_KEY') and
+        os.environ.get('CLOUDINARY_API_SECRET') and
+        os.environ.get('CLOUDINARY_CLOUD_NAME') != 'your-cloud-name'
+    )
+
+def create_storage() -> StorageBackend:
+    """Pick the backend from STORAGE_BACKEND; defaults to Cloudinary when configured, else local"""
+    backend = os.environ.get('STORAGE_BACKEND') or ("cloudinary" if cloudinary_configured() else "local")
+    if backend == "cloudinary":
+        return CloudinaryStorage()
+    if backend == "local":
+        return LocalStorage(os.environ.get('LOCAL_STORAGE_DIR', 'storage'))
+    raise ValueError(f"Unknown STORAGE_BACKEND: {backend}")
+
+storage = create_storage()
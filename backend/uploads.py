@@ -0,0 +1,159 @@
+# Upload size limits and progress tracking for multipart file uploads
+import os
+import time
+from typing import BinaryIO, Dict, Optional
+
+MAX_UPLOAD_BYTES = int(os.environ.get('MAX_UPLOAD_SIZE_MB', '20')) * 1024 * 1024
+# Bank/CCP statements for reconciliation run to hundreds of MB
+MAX_STATEMENT_UPLOAD_BYTES = int(os.environ.get('MAX_STATEMENT_SIZE_MB', '1024')) * 1024 * 1024
+# Cloudinary requires chunks of at least 5 MB for chunked uploads
+UPLOAD_CHUNK_BYTES = int(os.environ.get('UPLOAD_CHUNK_SIZE_MB', '6')) * 1024 * 1024
+# Headroom for the other form fields and multipart boundaries
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+UPLOAD_ID_HEADER = b"x-upload-id"
+
+class UploadProgressTracker:
+    """In-memory progress of uploads in this process, keyed by a client supplied upload id.
+
+    Phases: ``receiving`` (request body arriving), ``uploading`` (sent to
+    storage), then ``completed`` or ``failed``. Finished entries expire.
+    """
+
+    def __init__(self, retention_seconds: int = 600):
+        self.retention_seconds = retention_seconds
+        self._uploads: Dict[str, dict] = {}
+
+    def update(self, upload_id: Optional[str], phase: str, done_bytes: int, total_bytes: Optional[int] = None, error: str = None):
+        if not upload_id:
+            return
+        entry = self._uploads.setdefault(upload_id, {"upload_id": upload_id, "total_bytes": None})
+        entry["phase"] = phase
+        entry["done_bytes"] = done_bytes
+        if total_bytes is not None:
+            entry["total_bytes"] = total_bytes
+        entry["error"] = error
+        entry["updated_at"] = time.time()
+
+    def get(self, upload_id: str) -> Optional[dict]:
+        self._prune()
+        entry = self._uploads.get(upload_id)
+        if not entry:
+            return None
+        total = entry["total_bytes"]
+        return {**entry, "percent": round(entry["done_bytes"] * 100 / total, 1) if total else None}
+
+    def _prune(self):
+        cutoff = time.time() - self.retention_seconds
+        for upload_id in [key for key, entry in self._uploads.items() if entry["updated_at"] < cutoff]:
+            del self._uploads[upload_id]
+
+upload_progress = UploadProgressTracker()
+
+class UploadSizeLimitMiddleware:
+    """Reject multipart bodies over a per-route cap while they stream in.
+
+    ``limits`` maps request paths to their maximum file size; other paths
+    are not capped here. Requests announcing a larger Content-Length are
+    refused before any byte is read; chunked bodies are cut off as soon as
+    the cap is crossed, so oversized uploads are never fully spooled. Also
+    records receive progress for requests that carry an ``X-Upload-Id``
+    header.
+    """
+
+    def __init__(self, app, limits: Dict[str, int]):
+        self.app = app
+        self.limits = limits
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in ("POST", "PUT", "PATCH"):
+            return await self.app(scope, receive, send)
+
+        limit = self.limits.get(scope["path"].rstrip("/"))
+        headers = dict(scope["headers"])
+        if limit is None or not headers.get(b"content-type", b"").startswith(b"multipart/form-data"):
+            return await self.app(scope, receive, send)
+
+        max_bytes = limit + MULTIPART_OVERHEAD_BYTES
+        content_length = headers.get(b"content-length")
+        total = int(content_length) if content_length and content_length.isdigit() else None
+        if total is not None and total > max_bytes:
+            await self._reject(send, limit)
+            return
+
+        upload_id = headers.get(UPLOAD_ID_HEADER, b"").decode() or None
+        received = 0
+        response_started = False
+        rejected = False
+
+        async def limited_receive():
+            nonlocal received, rejected
+            if rejected:
+                return {"type": "http.disconnect"}
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > max_bytes:
+                    upload_progress.update(upload_id, "failed", received, total, error="too_large")
+                    if not response_started:
+                        await self._reject(send, limit)
+                    rejected = True
+                    # Looks like a client disconnect to the app, which stops reading the body
+                    return {"type": "http.disconnect"}
+                upload_progress.update(upload_id, "receiving", received, total)
+            return message
+
+        async def guarded_send(message):
+            nonlocal response_started
+            if rejected:
+                # The 413 is already out; drop the app's answer to the cut-off body
+                return
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        await self.app(scope, limited_receive, guarded_send)
+
+    async def _reject(self, send, limit: int):
+        body = ('{"detail": "File too large (max %d MB)"}' % (limit // (1024 * 1024))).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 413,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+        })
+        await send({"type": "http.response.body", "body": body})
+
+class ProgressReader:
+    """File wrapper that reports bytes read by a blocking uploader.
+
+    Leaves the underlying file open on exit so the caller keeps ownership.
+    """
+
+    def __init__(self, fileobj: BinaryIO, upload_id: Optional[str], total_bytes: int):
+        self.fileobj = fileobj
+        self.upload_id = upload_id
+        self.total_bytes = total_bytes
+
+    def read(self, size: int = -1) -> bytes:
+        chunk = self.fileobj.read(size)
+        upload_progress.update(self.upload_id, "uploading", self.fileobj.tell(), self.total_bytes)
+        return chunk
+
+    def tell(self) -> int:
+        return self.fileobj.tell()
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        return self.fileobj.seek(offset, whence)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+def upload_size(fileobj: BinaryIO) -> int:
+    """Size of a spooled upload without reading it"""
+    position = fileobj.tell()
+    fileobj.seek(0, os.SEEK_END)
+    size = fileobj.tell()
+    fileobj.seek(position)
+    return size
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+import asyncio
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "backend"))
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne
+from document_types import DOCUMENT_TYPE_BITS, document_mask
+
+async def backfill_document_masks():
+    """Recompute every user's uploaded/verified document bitmasks and verified document ids from the documents collection"""
+    client = AsyncIOMotorClient(os.environ.get('MONGO_URL', 'mongodb://localhost:27017'))
+    db = client.driving_school_platform
+    
+    try:
+        pipeline = [
+            {"$match": {"document_type": {"$in": list(DOCUMENT_TYPE_BITS)}}},
+            {"$group": {
+                "_id": "$user_id",
+                "uploaded": {"$addToSet": "$document_type"},
+                "verified": {"$addToSet": {"$cond": ["$is_verified", {"type": "$document_type", "id": "$id"}, None]}}
+            }}
+        ]
+        
+        updates = []
+        users = 0
+        async for row in db.documents.aggregate(pipeline, allowDiskUse=True):
+            verified_ids = {}
+            for document in row["verified"]:
+                if document:
+                    verified_ids.setdefault(document["type"], []).append(document["id"])
+            updates.append(UpdateOne({"id": row["_id"]}, {"$set": {
+                "uploaded_documents_mask": document_mask(row["uploaded"]),
+                "verified_documents_mask": document_mask(verified_ids),
+                "verified_document_ids": verified_ids
+            }}))
+            if len(updates) >= 1000:
+                await db.users.bulk_write(updates, ordered=False)
+                users += len(updates)
+                updates = []
+        if updates:
+            await db.users.bulk_write(updates, ordered=False)
+            users += len(updates)
+        
+        # Users without any document start from empty masks
+        await db.users.update_many(
+            {"verified_documents_mask": {"$exists": False}},
+            {"$set": {"uploaded_documents_mask": 0, "verified_documents_mask": 0, "verified_document_ids": {}}}
+        )
+        
+        print(f"✓ Backfilled document masks for {users} users")
+    except Exception as e:
+        print(f"❌ Error backfilling document masks: {e}")
+    finally:
+        client.close()
+
+if __name__ == "__main__":
+    asyncio.run(backfill_document_masks())
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""Benchmark the batch exam planner on a synthetic state.
+
+Generates exams with requested times clustered on popular days, experts
+with one or two specializations and some slots already taken elsewhere,
+then times plan_exam_days. No database is involved.
+
+    python benchmark_exam_planner.py --exams 10000 --experts 60 --days 30
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import date, timedelta
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "backend"))
+
+from exam_planner import plan_exam_days, slot_time, SLOTS_PER_DAY
+
+EXAM_TYPES = ["theory", "park", "road"]
+
+def synthetic_state(args, rng):
+    start = date(2026, 1, 5)
+    days = [start + timedelta(days=i) for i in range(args.days)]
+    locations = [f"center-{i}" for i in range(args.locations)]
+    experts = [
+        {"id": f"expert-{i}", "specialization": rng.sample(EXAM_TYPES, rng.choice([1, 2]))}
+        for i in range(args.experts)
+    ]
+    # Early days of the horizon are requested more often
+    weights = [1 / (1 + i / 7) for i in range(len(days))]
+    exams = []
+    for i in range(args.exams):
+        exam_type = rng.choice(EXAM_TYPES)
+        day = rng.choices(days, weights)[0]
+        exams.append({
+            "id": f"exam-{i}",
+            "exam_type": exam_type,
+            "location": rng.choice(locations),
+            "scheduled_at": slot_time(day, rng.randrange(SLOTS_PER_DAY)),
+            "external_expert_id": rng.choice(experts)["id"]
+        })
+    busy = {}
+    for expert in experts:
+        for day in days:
+            if rng.random() < args.busy_ratio:
+                busy[(expert["id"], day)] = {rng.randrange(SLOTS_PER_DAY)}
+    return exams, experts, days, busy
+
+def run_benchmark(args):
+    rng = random.Random(args.seed)
+    exams, experts, days, busy = synthetic_state(args, rng)
+
+    started = time.perf_counter()
+    plan = plan_exam_days(exams, experts, days, busy, max_per_day=args.max_per_day)
+    elapsed = time.perf_counter() - started
+
+    loads = {}
+    locations = {}
+    exams_by_id = {exam["id"]: exam for exam in exams}
+    for exam_id, (expert_id, scheduled_at) in plan["assignments"].items():
+        key = (expert_id, scheduled_at.date())
+        loads[key] = loads.get(key, 0) + 1
+        locations.setdefault(key, set()).add(exams_by_id[exam_id]["location"])
+    slots = {(expert_id, scheduled_at) for expert_id, scheduled_at in plan["assignments"].values()}
+
+    print(f"Dataset:     {len(exams)} exams, {len(experts)} experts, {len(days)} days, {SLOTS_PER_DAY} slots/day")
+    print(f"Planned in:  {elapsed * 1000:.0f} ms ({len(exams) / elapsed:.0f} exams/s)")
+    print(f"Assigned:    {len(plan['assignments'])}, unassigned: {len(plan['unassigned'])}")
+    print(f"Repairs:     {plan['repaired']} rebalanced, {plan['moved_days']} moved to another day")
+    print(f"Daily load:  mean {statistics.mean(loads.values()):.2f}, stdev {statistics.pstdev(loads.values()):.2f}, max {max(loads.values())}")
+    print(f"Locations:   {statistics.mean(len(v) for v in locations.values()):.2f} per expert-day")
+    print(f"Double-booked slots: {len(plan['assignments']) - len(slots)}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--exams", type=int, default=10000)
+    parser.add_argument("--experts", type=int, default=60)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--locations", type=int, default=12)
+    parser.add_argument("--max-per-day", type=int, default=SLOTS_PER_DAY)
+    parser.add_argument("--busy-ratio", type=float, default=0.1)
+    parser.add_argument("--seed", type=int, default=42)
+    run_benchmark(parser.parse_args())
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""Benchmark the shared outbound client against the fake provider.
+
+Starts the fake provider in-process, fires concurrent payment creations and
+reports throughput, latency percentiles and how many calls were refused by
+the bulkhead or circuit breaker (those fall back to simulation in the app).
+
+    python benchmark_outbound.py --requests 2000 --latency-ms 200 --failure-rate 0.2
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "backend"))
+
+from aiohttp import web
+from external_integrations.fake_provider import create_app, FaultConfig
+from external_integrations.http_client import ProviderClient, ProviderUnavailableError, CircuitOpenError, BulkheadFullError
+
+async def run_benchmark(args):
+    app = create_app(FaultConfig(args.latency_ms, args.jitter_ms, args.failure_rate, args.hang_rate))
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", args.port)
+    await site.start()
+
+    client = ProviderClient(
+        "baridimob",
+        base_url=f"http://127.0.0.1:{args.port}",
+        timeout=args.timeout,
+        max_concurrency=args.concurrency,
+        pool_size=args.concurrency
+    )
+
+    latencies = []
+    outcomes = {"ok": 0, "failed": 0, "circuit_open": 0, "bulkhead_full": 0}
+
+    async def one_call(i):
+        started = time.perf_counter()
+        try:
+            await client.request("POST", "/v1/payments", json={"order_id": f"bench-{i}", "amount": 100})
+            outcomes["ok"] += 1
+        except CircuitOpenError:
+            outcomes["circuit_open"] += 1
+        except BulkheadFullError:
+            outcomes["bulkhead_full"] += 1
+        except ProviderUnavailableError:
+            outcomes["failed"] += 1
+        latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one_call(i) for i in range(args.requests)))
+    elapsed = time.perf_counter() - started
+
+    await client.close()
+    await runner.cleanup()
+
+    latencies.sort()
+    def percentile(p):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000
+
+    print(f"Requests:     {args.requests} in {elapsed:.2f}s ({args.requests / elapsed:.0f} req/s)")
+    print(f"Outcomes:     {outcomes}")
+    print(f"Latency (ms): p50={percentile(0.5):.1f} p95={percentile(0.95):.1f} p99={percentile(0.99):.1f} max={latencies[-1] * 1000:.1f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--timeout", type=float, default=2.0)
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--hang-rate", type=float, default=0.0)
+    asyncio.run(run_benchmark(parser.parse_args()))
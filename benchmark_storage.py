@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""Benchmark the local content-addressed storage upload and download paths.
+
+Saves files concurrently (a share of them duplicates, to exercise dedupe),
+then streams them back whole and as random byte ranges. No network or
+database is involved.
+
+    python benchmark_storage.py --files 200 --size-kb 2048 --duplicate-ratio 0.3
+"""
+import argparse
+import asyncio
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "backend"))
+
+from storage import LocalStorage, iter_file
+
+async def run_benchmark(args):
+    root = args.root or tempfile.mkdtemp(prefix="storage-bench-")
+    store = LocalStorage(root, max_concurrency=args.concurrency)
+
+    unique = max(1, int(args.files * (1 - args.duplicate_ratio)))
+    payloads = [os.urandom(args.size_kb * 1024) for _ in range(unique)]
+    uploads = [payloads[i % unique] for i in range(args.files)]
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(
+        store.save(io.BytesIO(data), len(data), folder="bench", filename=f"file{i}.bin")
+        for i, data in enumerate(uploads)
+    ))
+    upload_elapsed = time.perf_counter() - started
+    keys = sorted({result["storage_key"] for result in results})
+
+    started = time.perf_counter()
+    total = 0
+    for key in keys:
+        async for chunk in iter_file(store.path_for(key), 0, args.size_kb * 1024 - 1):
+            total += len(chunk)
+    download_elapsed = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for _ in range(args.ranges):
+        start = random.randrange(args.size_kb * 1024)
+        async for chunk in iter_file(store.path_for(random.choice(keys)), start, start + 64 * 1024 - 1):
+            pass
+    range_elapsed = time.perf_counter() - started
+
+    uploaded_mb = args.files * args.size_kb / 1024
+    print(f"Storage root: {root}")
+    print(f"Uploads:      {args.files} files, {uploaded_mb:.0f} MB in {upload_elapsed:.2f}s ({uploaded_mb / upload_elapsed:.0f} MB/s)")
+    print(f"Stored:       {len(keys)} unique blobs ({args.files - len(keys)} deduplicated)")
+    print(f"Downloads:    {total / 1024 / 1024:.0f} MB in {download_elapsed:.2f}s ({total / 1024 / 1024 / download_elapsed:.0f} MB/s)")
+    print(f"Range reads:  {args.ranges} x 64 KB in {range_elapsed:.2f}s ({args.ranges / range_elapsed:.0f} req/s)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=100)
+    parser.add_argument("--size-kb", type=int, default=1024)
+    parser.add_argument("--duplicate-ratio", type=float, default=0.3)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--ranges", type=int, default=500)
+    parser.add_argument("--root", help="Storage directory (defaults to a temporary one)")
+    asyncio.run(run_benchmark(parser.parse_args()))
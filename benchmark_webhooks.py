@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""Benchmark payment webhook intake and processing against a running backend.
+
+Seeds simulation-mode BaridiMob payments, posts signed webhooks for them
+(with a share of provider-style retries of the same event) and reports
+intake throughput, then how fast the webhook worker applies the events.
+
+    python benchmark_webhooks.py --payments 2000 --retries 0.3 --concurrency 50
+"""
+import argparse
+import asyncio
+import hashlib
+import hmac
+import json
+import os
+import random
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import aiohttp
+from motor.motor_asyncio import AsyncIOMotorClient
+
+def sign(payload: dict, secret: str) -> str:
+    return hmac.new(secret.encode(), json.dumps(payload, sort_keys=True).encode(), hashlib.sha256).hexdigest()
+
+async def seed_payments(db, count: int, run_id: str) -> list:
+    now = datetime.utcnow()
+    payments = [{
+        "id": str(uuid.uuid4()),
+        "user_id": f"bench-user-{run_id}",
+        "enrollment_id": f"bench-enrollment-{run_id}-{i}",
+        "school_id": f"bench-school-{run_id}",
+        "amount": 35000.0,
+        "currency": "DZD",
+        "payment_method": "baridimob",
+        "status": "pending",
+        "metadata": {"benchmark_run": run_id},
+        "expires_at": now + timedelta(hours=1),
+        "created_at": now,
+        "updated_at": now,
+        "payment_attempts": [],
+        "refund_status": "not_requested",
+        "payment_gateway_data": {"simulation": True}
+    } for i in range(count)]
+    await db.enhanced_payments.insert_many(payments)
+    return payments
+
+async def run_benchmark(args):
+    client = AsyncIOMotorClient(os.environ.get('MONGO_URL', 'mongodb://localhost:27017'))
+    db = client.driving_school_platform
+    run_id = uuid.uuid4().hex[:8]
+    secret = os.environ.get('BARIDIMOB_SECRET') or "test-secret"
+    
+    payments = await seed_payments(db, args.payments, run_id)
+    
+    # Every payment gets "pending" then "completed"; a share of events is delivered twice
+    webhooks = []
+    for payment in payments:
+        for step, status in enumerate(("pending", "completed")):
+            payload = {
+                "event_id": f"bench-{run_id}-{payment['id']}-{step}",
+                "order_id": payment["id"],
+                "status": status,
+                "transaction_id": f"TX{payment['id'][:8]}",
+                "reference": f"BM{payment['id'][:8].upper()}"
+            }
+            webhooks.append(payload)
+            if random.random() < args.retries:
+                webhooks.append(payload)
+    
+    semaphore = asyncio.Semaphore(args.concurrency)
+    outcomes = {}
+    
+    async with aiohttp.ClientSession() as session:
+        async def post(payload):
+            async with semaphore:
+                async with session.post(
+                    f"{args.base_url}/api/payments/webhook/baridimob",
+                    json=payload,
+                    headers={"X-Signature": sign(payload, secret)}
+                ) as resp:
+                    body = await resp.json()
+                    key = body.get("status", str(resp.status))
+                    outcomes[key] = outcomes.get(key, 0) + 1
+        
+        started = time.perf_counter()
+        await asyncio.gather(*(post(payload) for payload in webhooks))
+        intake_elapsed = time.perf_counter() - started
+    
+    print(f"Intake:     {len(webhooks)} webhooks in {intake_elapsed:.2f}s ({len(webhooks) / intake_elapsed:.0f}/s) {outcomes}")
+    
+    # Wait for the worker to apply everything
+    payment_ids = [payment["id"] for payment in payments]
+    started = time.perf_counter()
+    while True:
+        completed = await db.enhanced_payments.count_documents({"id": {"$in": payment_ids}, "status": "completed"})
+        if completed == len(payment_ids) or time.perf_counter() - started > args.wait:
+            break
+        await asyncio.sleep(0.5)
+    apply_elapsed = time.perf_counter() - started
+    print(f"Processing: {completed}/{len(payment_ids)} payments completed {apply_elapsed:.2f}s after intake finished")
+    
+    if args.cleanup:
+        await db.enhanced_payments.delete_many({"metadata.benchmark_run": run_id})
+        await db.payment_webhook_events.delete_many({"event_id": {"$regex": f"^bench-{run_id}-"}})
+        await db.enhanced_notifications.delete_many({"user_id": f"bench-user-{run_id}"})
+    client.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8001")
+    parser.add_argument("--payments", type=int, default=1000)
+    parser.add_argument("--retries", type=float, default=0.2, help="Share of events delivered twice")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--wait", type=float, default=120, help="Seconds to wait for processing")
+    parser.add_argument("--cleanup", action="store_true")
+    asyncio.run(run_benchmark(parser.parse_args()))
@@ -1,4 +1,5 @@
 #!/usr/bin/env python3
+import os
 import asyncio
 from motor.motor_asyncio import AsyncIOMotorClient
 
@@ -11,6 +12,8 @@ async def create_indexes():
         # Users collection indexes
         await db.users.create_index("email", unique=True)
         await db.users.create_index("role")
+        await db.users.create_index("id", unique=True)
+        await db.users.create_index([("role", 1), ("verified_documents_mask", 1)])
         print("✓ Created users indexes")
         
         # Driving schools collection indexes
@@ -25,6 +28,8 @@ async def create_indexes():
         await db.enrollments.create_index("student_id")
         await db.enrollments.create_index("driving_school_id")
         await db.enrollments.create_index("enrollment_status")
+        await db.enrollments.create_index([("payment_status", 1), ("created_at", 1)])
+        await db.enrollments.create_index("id", unique=True)
         print("✓ Created enrollments indexes")
         
         # Courses collection indexes
@@ -33,15 +38,25 @@ async def create_indexes():
         await db.courses.create_index("status")
         print("✓ Created courses indexes")
         
+        # Teachers collection indexes
+        await db.teachers.create_index([("user_id", 1), ("driving_school_id", 1)])
+        print("✓ Created teachers indexes")
+        
         # Sessions collection indexes
-        await db.sessions.create_index("student_id")
-        await db.sessions.create_index("teacher_id")
+        # Overlap checks scan a bounded scheduled_at range per teacher and per student
+        await db.sessions.create_index([("student_id", 1), ("scheduled_at", 1)])
+        await db.sessions.create_index([("teacher_id", 1), ("scheduled_at", 1)])
         await db.sessions.create_index("scheduled_at")
+        await db.sessions.create_index([("status", 1), ("scheduled_at", 1)])
+        await db.sessions.create_index([("series_id", 1), ("scheduled_at", 1)])
+        await db.sessions.create_index([("course_id", 1), ("status", 1)])
+        await db.session_series.create_index("id", unique=True)
         print("✓ Created sessions indexes")
         
         # Documents collection indexes
         await db.documents.create_index("user_id")
         await db.documents.create_index("document_type")
+        await db.documents.create_index("id", unique=True)
         print("✓ Created documents indexes")
         
         # Quizzes collection indexes
@@ -54,6 +69,90 @@ async def create_indexes():
         await db.quiz_attempts.create_index("quiz_id")
         print("✓ Created quiz_attempts indexes")
         
+        # Enhanced payments collection indexes
+        await db.enhanced_payments.create_index("id", unique=True)
+        await db.enhanced_payments.create_index([("user_id", 1), ("created_at", -1)])
+        await db.enhanced_payments.create_index([("status", 1), ("expires_at", 1)])
+        await db.enhanced_payments.create_index("payment_gateway_data.reference")
+        print("✓ Created enhanced_payments indexes")
+        
+        # Payment webhook events: one row per provider event, worked off in arrival order
+        await db.payment_webhook_events.create_index([("provider", 1), ("event_id", 1)], unique=True)
+        await db.payment_webhook_events.create_index([("status", 1), ("received_at", 1)])
+        await db.payment_webhook_events.create_index([("payment_id", 1), ("received_at", 1)])
+        print("✓ Created payment_webhook_events indexes")
+        
+        # Daily payment statistics buckets
+        await db.payment_stats_daily.create_index([("school_id", 1), ("day", 1), ("status", 1)], unique=True)
+        await db.payment_stats_daily.create_index([("day", 1), ("status", 1)])
+        print("✓ Created payment_stats_daily indexes")
+        
+        # Statement reconciliation indexes
+        await db.reconciliation_runs.create_index("id", unique=True)
+        await db.reconciliation_unmatched.create_index([("run_id", 1), ("row_number", 1)])
+        print("✓ Created reconciliation indexes")
+        
+        # Certificates collection indexes
+        await db.certificates.create_index("id", unique=True)
+        await db.certificates.create_index("student_id")
+        await db.certificates.create_index("enrollment_id", unique=True)
+        await db.certificates.create_index("certificate_number", unique=True)
+        await db.certificates.create_index([("batch_id", 1), ("certificate_number", 1)])
+        # Revocation list refresh in every API worker
+        await db.certificates.create_index([("status", 1), ("revoked_at", 1)])
+        await db.certificate_batches.create_index("id", unique=True)
+        print("✓ Created certificates indexes")
+        
+        # Exam scheduling indexes
+        await db.external_experts.create_index("id", unique=True)
+        await db.external_experts.create_index("user_id")
+        # Eligibility lookup; specialization is also an array and cannot share a compound index
+        await db.external_experts.create_index([("available_states", 1), ("is_available", 1)])
+        await db.exam_schedules.create_index("id", unique=True)
+        await db.exam_schedules.create_index("student_id")
+        await db.exam_schedules.create_index([("external_expert_id", 1), ("scheduled_at", 1)])
+        # Batch planner: ungraded exams of a state in the horizon
+        await db.exam_schedules.create_index([("state", 1), ("status", 1), ("scheduled_at", 1)])
+        await db.expert_daily_load.create_index("date")
+        print("✓ Created exam scheduling indexes")
+        
+        # Image derivative cache
+        await db.file_derivatives.create_index("source_key", unique=True)
+        print("✓ Created file_derivatives indexes")
+        
+        # Enhanced notifications collection indexes
+        await db.enhanced_notifications.create_index(
+            "idempotency_key",
+            unique=True,
+            partialFilterExpression={"idempotency_key": {"$type": "string"}}
+        )
+        await db.enhanced_notifications.create_index([("type", 1), ("metadata.session_id", 1)])
+        await db.enhanced_notifications.create_index([("type", 1), ("metadata.enrollment_id", 1), ("created_at", -1)])
+        await db.enhanced_notifications.create_index([("user_id", 1), ("created_at", -1)])
+        # Documents are removed once expires_at passes; rows without a date never expire
+        await db.enhanced_notifications.create_index("expires_at", expireAfterSeconds=0)
+        await db.enhanced_notifications.create_index([("is_read", 1), ("read_at", 1)])
+        for channel in ("email", "sms", "push"):
+            pending_field = f"delivery_status.{channel}.digest_pending"
+            await db.enhanced_notifications.create_index(
+                [(pending_field, 1), ("user_id", 1)],
+                partialFilterExpression={pending_field: True}
+            )
+        print("✓ Created enhanced_notifications indexes")
+        
+        # Notifications collection indexes
+        await db.notifications.create_index([("user_id", 1), ("created_at", -1)])
+        await db.notifications.create_index([("is_read", 1), ("read_at", 1)])
+        print("✓ Created notifications indexes")
+        
+        # Notification archives keep read history for a year
+        archive_ttl_seconds = int(os.environ.get('NOTIFICATION_ARCHIVE_TTL_DAYS', '365')) * 24 * 3600
+        await db.enhanced_notifications_archive.create_index("archived_at", expireAfterSeconds=archive_ttl_seconds)
+        await db.enhanced_notifications_archive.create_index("user_id")
+        await db.notifications_archive.create_index("archived_at", expireAfterSeconds=archive_ttl_seconds)
+        await db.notifications_archive.create_index("user_id")
+        print("✓ Created notification archive indexes")
+        
         print("\n🎉 All database indexes created successfully!")
         
     except Exception as e:
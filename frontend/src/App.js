@@ -1,5 +1,6 @@
 import React, { useState, useEffect } from 'react';
 import axios from 'axios';
+import { subscribeToNotifications } from './utils/api';
 import './App.css';
 import 'bootstrap/dist/css/bootstrap.min.css';
 
@@ -538,6 +539,15 @@ function App() {
     }
   };
 
+  // Refresh the dashboard when the server pushes a notification (enrollment, exam, certificate updates)
+  useEffect(() => {
+    if (!user || currentPage !== 'dashboard') return;
+    return subscribeToNotifications(
+      () => fetchDashboardData(),
+      localStorage.getItem('authToken')
+    );
+  }, [user, currentPage]);
+
   // Driving schools fetch
   const fetchDrivingSchools = async (params = {}) => {
     setLoading(true);
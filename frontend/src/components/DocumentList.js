@@ -93,7 +93,7 @@ const DocumentList = ({ onClose }) => {
                         {doc.is_verified ? 'Verified' : 'Pending'}
                       </span>
                       <a
-                        href={doc.file_url}
+                        href={doc.file_url.startsWith('/') ? `${process.env.REACT_APP_BACKEND_URL}${doc.file_url}?token=${encodeURIComponent(localStorage.getItem('auth_token') || '')}` : doc.file_url}
                         target="_blank"
                         rel="noopener noreferrer"
                         className="text-blue-600 hover:text-blue-800"
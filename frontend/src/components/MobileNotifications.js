@@ -1,4 +1,5 @@
 import React, { useState, useEffect } from 'react';
+import { subscribeToNotifications } from '../utils/api';
 
 const MobileNotifications = ({ 
   notifications = [], 
@@ -7,11 +8,31 @@ const MobileNotifications = ({
   onMarkAllAsRead, 
   onDeleteNotification,
   onToggleNotifications,
+  onNewNotification,
   showNotifications = false 
 }) => {
   const [pushSupported, setPushSupported] = useState(false);
   const [pushPermission, setPushPermission] = useState('default');
   const [subscribedToPush, setSubscribedToPush] = useState(false);
+  const [liveNotifications, setLiveNotifications] = useState([]);
+
+  useEffect(() => {
+    // New notifications are pushed by the server; no polling needed
+    return subscribeToNotifications((notification) => {
+      setLiveNotifications(prev => (
+        prev.some(n => n.id === notification.id) ? prev : [notification, ...prev]
+      ));
+      if (onNewNotification) {
+        onNewNotification(notification);
+      }
+    });
+  }, []);
+
+  // Pushed notifications the parent has not loaded yet go on top
+  const knownIds = new Set(notifications.map(n => n.id));
+  const newNotifications = liveNotifications.filter(n => !knownIds.has(n.id));
+  const allNotifications = [...newNotifications, ...notifications];
+  const totalUnread = unreadCount + newNotifications.filter(n => !n.is_read).length;
 
   useEffect(() => {
     // Check if push notifications are supported
@@ -183,9 +204,9 @@ const MobileNotifications = ({
         aria-label="Notifications"
       >
         <i className="bi bi-bell fs-5"></i>
-        {unreadCount > 0 && (
+        {totalUnread > 0 && (
           <span className="position-absolute top-0 start-100 translate-middle badge rounded-pill bg-danger">
-            {unreadCount > 99 ? '99+' : unreadCount}
+            {totalUnread > 99 ? '99+' : totalUnread}
           </span>
         )}
       </button>
@@ -205,9 +226,9 @@ const MobileNotifications = ({
             ></button>
           </div>
           
-          {unreadCount > 0 && (
+          {totalUnread > 0 && (
             <div className="d-flex align-items-center justify-content-between mt-2">
-              <span className="small opacity-75">{unreadCount} unread</span>
+              <span className="small opacity-75">{totalUnread} unread</span>
               <button
                 onClick={onMarkAllAsRead}
                 className="btn btn-sm btn-light bg-opacity-25 text-white border-0"
@@ -253,7 +274,7 @@ const MobileNotifications = ({
 
         {/* Notifications List */}
         <div className="overflow-auto" style={{height: 'calc(100vh - 200px)'}}>
-          {notifications.length === 0 ? (
+          {allNotifications.length === 0 ? (
             <div className="d-flex flex-column align-items-center justify-content-center text-muted" style={{height: '300px'}}>
               <i className="bi bi-bell fs-1 opacity-50 mb-3"></i>
               <p className="text-center mb-1">No notifications yet</p>
@@ -261,7 +282,7 @@ const MobileNotifications = ({
             </div>
           ) : (
             <div>
-              {notifications.map((notification) => (
+              {allNotifications.map((notification) => (
                 <div
                   key={notification.id}
                   className={`p-3 border-bottom ${
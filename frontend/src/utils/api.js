@@ -59,4 +59,36 @@ export async function uploadFile(file, onProgress) {
     console.error('File upload failed:', error);
     throw error;
   }
-}
\ No newline at end of file
+}
+// Subscribe to pushed notifications instead of polling /api/notifications/my.
+// Returns a function that closes the stream.
+export function subscribeToNotifications(onNotification, token = localStorage.getItem('authToken') || localStorage.getItem('auth_token') || localStorage.getItem('token')) {
+  if (!token || typeof EventSource === 'undefined') {
+    return () => {};
+  }
+
+  const url = `${API_BASE_URL}/api/notifications/stream?token=${encodeURIComponent(token)}`;
+  const source = new EventSource(url);
+  const seen = new Set();
+
+  source.addEventListener('notification', (event) => {
+    try {
+      const notification = JSON.parse(event.data);
+      // A reconnect can replay events this page already handled
+      if (seen.has(notification.id)) {
+        return;
+      }
+      seen.add(notification.id);
+      onNotification(notification);
+    } catch (error) {
+      console.error('Invalid notification event:', error);
+    }
+  });
+
+  source.onerror = (error) => {
+    // EventSource reconnects on its own and replays missed events via Last-Event-ID
+    console.error('Notification stream error:', error);
+  };
+
+  return () => source.close();
+}
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""Re-plan the ungraded exams of a state (wilaya) across its external experts.
+
+Exams requested in the horizon are assigned to experts, days and 90 minute
+slots in one pass and written back with a single bulk write. Use
+--dry-run to only print the plan summary.
+
+    python plan_exam_days.py Oran --start 2026-11-02 --days 14
+"""
+import argparse
+import asyncio
+import os
+import sys
+from datetime import date
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "backend"))
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from exam_planner import ExamPlanner
+
+async def plan(args):
+    client = AsyncIOMotorClient(os.environ.get('MONGO_URL', 'mongodb://localhost:27017'))
+    
+    try:
+        result = await ExamPlanner(client).plan_state(
+            args.state,
+            date.fromisoformat(args.start) if args.start else date.today(),
+            args.days,
+            apply=not args.dry_run,
+            max_per_day=args.max_per_day
+        )
+        if not result["exams"]:
+            print(f"✓ No exams to plan in {args.state}")
+            return
+        
+        action = "Planned (dry run)" if args.dry_run else f"Plan {result['plan_id']} applied"
+        print(f"✓ {action}: {result['assigned']}/{result['exams']} exams assigned")
+        print(f"  rebalanced to another expert: {result['repaired']}, moved to another day: {result['moved_days']}")
+        if result["unassigned"]:
+            print(f"❌ {len(result['unassigned'])} exams could not be placed in the horizon:")
+            for exam_id in result["unassigned"][:20]:
+                print(f"  {exam_id}")
+    except Exception as e:
+        print(f"❌ Error planning exams: {e}")
+    finally:
+        client.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("state")
+    parser.add_argument("--start", help="First day of the horizon (YYYY-MM-DD, default today)")
+    parser.add_argument("--days", type=int, default=14)
+    parser.add_argument("--max-per-day", type=int, help="Exams per expert and day (default EXPERT_MAX_EXAMS_PER_DAY)")
+    parser.add_argument("--dry-run", action="store_true")
+    asyncio.run(plan(parser.parse_args()))
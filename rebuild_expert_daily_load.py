@@ -0,0 +1,24 @@
+#!/usr/bin/env python3
+import asyncio
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "backend"))
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from expert_assignment import ExpertAssignmentService
+
+async def rebuild_expert_daily_load():
+    """Backfill the per-expert daily exam counts used for expert assignment from existing exams"""
+    client = AsyncIOMotorClient(os.environ.get('MONGO_URL', 'mongodb://localhost:27017'))
+    
+    try:
+        days = await ExpertAssignmentService(client).rebuild_daily_loads()
+        print(f"✓ Rebuilt {days} expert daily load counters")
+    except Exception as e:
+        print(f"❌ Error rebuilding expert daily loads: {e}")
+    finally:
+        client.close()
+
+if __name__ == "__main__":
+    asyncio.run(rebuild_expert_daily_load())
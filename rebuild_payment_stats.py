@@ -0,0 +1,24 @@
+#!/usr/bin/env python3
+import asyncio
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "backend"))
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from enhanced_payments import EnhancedPaymentService
+
+async def rebuild_payment_stats():
+    """Backfill the daily payment statistics buckets from existing payments"""
+    client = AsyncIOMotorClient(os.environ.get('MONGO_URL', 'mongodb://localhost:27017'))
+    
+    try:
+        buckets = await EnhancedPaymentService(client).rebuild_payment_statistics()
+        print(f"✓ Rebuilt {buckets} payment statistics buckets")
+    except Exception as e:
+        print(f"❌ Error rebuilding payment statistics: {e}")
+    finally:
+        client.close()
+
+if __name__ == "__main__":
+    asyncio.run(rebuild_payment_stats())
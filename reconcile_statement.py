@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""Reconcile a CCP/bank statement CSV against pending payments.
+
+The file is streamed in row batches, so multi-hundred-MB statements run in
+constant memory. Expected columns: reference, amount and optionally
+transaction_id, date, description.
+
+    python reconcile_statement.py statement.csv --source ccp --unmatched-out unmatched.csv
+"""
+import argparse
+import asyncio
+import csv
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "backend"))
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from enhanced_payments import EnhancedPaymentService, iter_statement_batches
+
+async def reconcile(args):
+    client = AsyncIOMotorClient(os.environ.get('MONGO_URL', 'mongodb://localhost:27017'))
+    
+    try:
+        with open(args.path, encoding="utf-8-sig", newline="") as stream:
+            report = await EnhancedPaymentService(client).reconcile_statement(
+                iter_statement_batches(stream, args.batch_size),
+                source=args.source,
+                school_id=args.school_id
+            )
+        
+        print(f"✓ Run {report['id']}: {report['matched']} matched, {report['unmatched']} unmatched of {report['rows']} rows")
+        for reason, count in report["unmatched_by_reason"].items():
+            print(f"  {reason}: {count}")
+        
+        if args.unmatched_out and report["unmatched"]:
+            db = client.driving_school_platform
+            with open(args.unmatched_out, "w", newline="") as out:
+                writer = None
+                async for item in db.reconciliation_unmatched.find({"run_id": report["id"]}).sort("row_number", 1):
+                    row = {"row_number": item["row_number"], "reason": item["reason"], **item["row"]}
+                    if writer is None:
+                        writer = csv.DictWriter(out, fieldnames=list(row), extrasaction="ignore")
+                        writer.writeheader()
+                    writer.writerow(row)
+            print(f"✓ Unmatched rows written to {args.unmatched_out}")
+    except Exception as e:
+        print(f"❌ Error reconciling statement: {e}")
+    finally:
+        client.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path")
+    parser.add_argument("--source", default="ccp", choices=["ccp", "bank"])
+    parser.add_argument("--school-id")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--unmatched-out")
+    asyncio.run(reconcile(parser.parse_args()))
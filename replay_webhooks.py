@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""Re-queue stored payment webhook events for the webhook worker.
+
+    python replay_webhooks.py --provider baridimob --since 2024-06-01T00:00:00
+    python replay_webhooks.py --payment-id <payment id>
+    python replay_webhooks.py --event-id evt_1 --event-id evt_2
+    python replay_webhooks.py --since 2024-06-01 --now    # apply immediately instead of waiting for the worker
+"""
+import argparse
+import asyncio
+import os
+import sys
+from datetime import datetime
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "backend"))
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from enhanced_payments import EnhancedPaymentService
+
+async def replay(args):
+    client = AsyncIOMotorClient(os.environ.get('MONGO_URL', 'mongodb://localhost:27017'))
+    service = EnhancedPaymentService(client)
+    
+    try:
+        queued = await service.replay_webhook_events(
+            provider=args.provider,
+            payment_id=args.payment_id,
+            since=datetime.fromisoformat(args.since) if args.since else None,
+            event_ids=args.event_id
+        )
+        print(f"✓ Re-queued {queued} webhook events")
+        
+        if args.now:
+            applied = failed = 0
+            while True:
+                result = await service.process_webhook_events()
+                applied += result["processed"]
+                failed += result["failed"]
+                # Failed payments wait for the worker's next run instead of being retried here
+                if not result["processed"] or result["failed"]:
+                    break
+            print(f"✓ Applied {applied} webhook events")
+            if failed:
+                print(f"❌ {failed} webhook events failed and were left for retry")
+    finally:
+        client.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--provider")
+    parser.add_argument("--payment-id")
+    parser.add_argument("--since", help="ISO date/time of the earliest event to replay")
+    parser.add_argument("--event-id", action="append")
+    parser.add_argument("--now", action="store_true", help="Process the queue in this process")
+    args = parser.parse_args()
+    
+    if not any([args.provider, args.payment_id, args.since, args.event_id]):
+        parser.error("Refusing to replay every event; pass at least one filter")
+    asyncio.run(replay(args))
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""Fire hundreds of simultaneous session completions at one course and check nothing is lost.
+
+Runs against a scratch database (dropped afterwards) on MONGO_URL. Every
+session is completed twice concurrently; the course must end up with
+exactly one increment per session and be completed exactly once.
+
+    python stress_session_completion.py --sessions 500
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+import uuid
+from datetime import datetime
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "backend"))
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from course_progress import (
+    CourseStatus, ExamStatus, SessionStatus, build_sequential_courses, record_session_completion
+)
+
+async def stress_session_completion(args):
+    client = AsyncIOMotorClient(os.environ.get('MONGO_URL', 'mongodb://localhost:27017'))
+    db = client[args.database]
+
+    try:
+        enrollment_id = str(uuid.uuid4())
+        courses = build_sequential_courses(enrollment_id)
+        course = courses[0]
+        course["total_sessions"] = args.sessions
+        await db.courses.insert_many(courses)
+        await db.sessions.insert_many([
+            {
+                "id": str(uuid.uuid4()),
+                "course_id": course["id"],
+                "status": SessionStatus.SCHEDULED,
+                "scheduled_at": datetime.utcnow()
+            }
+            for _ in range(args.sessions)
+        ])
+        session_ids = [s["id"] async for s in db.sessions.find({"course_id": course["id"]}, {"id": 1})]
+
+        async def complete(session_id):
+            return "completed" if await record_session_completion(db, session_id) else "duplicate"
+
+        started = time.perf_counter()
+        results = await asyncio.gather(*(complete(sid) for sid in session_ids * 2))
+        elapsed = time.perf_counter() - started
+
+        final = await db.courses.find_one({"id": course["id"]})
+        completed = results.count("completed")
+        conflicts = results.count("duplicate")
+
+        print(f"{len(results)} completion requests in {elapsed:.2f}s ({len(results) / elapsed:.0f} req/s)")
+        print(f"Accepted: {completed}, rejected as duplicates: {conflicts}")
+        print(f"Course: {final['completed_sessions']}/{final['total_sessions']} sessions, "
+              f"status {final['status']}, exam {final['exam_status']}")
+
+        ok = (
+            completed == args.sessions and
+            conflicts == args.sessions and
+            final["completed_sessions"] == args.sessions and
+            final["status"] == CourseStatus.COMPLETED and
+            final["exam_status"] == ExamStatus.AVAILABLE
+        )
+        print("✓ No lost or double-counted completions" if ok else "❌ Course progress does not match the completions")
+        return ok
+
+    finally:
+        await client.drop_database(args.database)
+        client.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=300)
+    parser.add_argument("--database", default="driving_school_stress")
+    ok = asyncio.run(stress_session_completion(parser.parse_args()))
+    sys.exit(0 if ok else 1)
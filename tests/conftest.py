@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Backend modules import each other by bare name, as they do when the server runs
+sys.path.append(os.path.join(os.path.dirname(__file__), os.pardir, "backend"))
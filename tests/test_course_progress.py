@@ -0,0 +1,56 @@
+from course_progress import (
+    CourseType, CourseStatus, ExamStatus, build_sequential_courses, plan_enrollment_progression
+)
+
+def make_course(course_type, status=CourseStatus.LOCKED, completed=0, total=10, exam=ExamStatus.NOT_AVAILABLE):
+    return {
+        "id": course_type.value,
+        "course_type": course_type,
+        "status": status,
+        "completed_sessions": completed,
+        "total_sessions": total,
+        "exam_status": exam
+    }
+
+def test_new_enrollment_opens_only_theory():
+    courses = {course["course_type"]: course for course in build_sequential_courses("enrollment")}
+    assert courses[CourseType.THEORY]["status"] == CourseStatus.AVAILABLE
+    assert courses[CourseType.PARK]["status"] == CourseStatus.LOCKED
+    assert courses[CourseType.ROAD]["status"] == CourseStatus.LOCKED
+
+def test_finished_sessions_complete_course_and_open_exam():
+    changes, eligible = plan_enrollment_progression([
+        make_course(CourseType.THEORY, CourseStatus.IN_PROGRESS, completed=10),
+        make_course(CourseType.PARK),
+        make_course(CourseType.ROAD)
+    ])
+    assert changes == {"theory": {"status": CourseStatus.COMPLETED, "exam_status": ExamStatus.AVAILABLE}}
+    assert not eligible
+
+def test_passed_exam_unlocks_next_course_regardless_of_input_order():
+    changes, _ = plan_enrollment_progression([
+        make_course(CourseType.ROAD),
+        make_course(CourseType.PARK),
+        make_course(CourseType.THEORY, CourseStatus.COMPLETED, completed=10, exam=ExamStatus.PASSED)
+    ])
+    assert changes == {"park": {"status": CourseStatus.AVAILABLE}}
+
+def test_course_after_unpassed_exam_is_locked_again():
+    changes, _ = plan_enrollment_progression([
+        make_course(CourseType.THEORY, CourseStatus.COMPLETED, completed=10, exam=ExamStatus.FAILED),
+        make_course(CourseType.PARK, CourseStatus.AVAILABLE),
+        make_course(CourseType.ROAD)
+    ])
+    assert changes == {"park": {"status": CourseStatus.LOCKED}}
+
+def test_course_without_sessions_is_not_completed():
+    changes, _ = plan_enrollment_progression([make_course(CourseType.THEORY, CourseStatus.AVAILABLE, total=0)])
+    assert changes == {}
+
+def test_certificate_needs_every_course_passed():
+    passed = [
+        make_course(course_type, CourseStatus.COMPLETED, completed=10, exam=ExamStatus.PASSED)
+        for course_type in (CourseType.THEORY, CourseType.PARK, CourseType.ROAD)
+    ]
+    assert plan_enrollment_progression(passed) == ({}, True)
+    assert not plan_enrollment_progression(passed[:2])[1]
@@ -0,0 +1,85 @@
+from datetime import datetime, date
+
+from exam_planner import SLOTS_PER_DAY, plan_exam_days, slot_time
+
+DAY = date(2026, 3, 2)
+NEXT_DAY = date(2026, 3, 3)
+
+def make_exam(exam_id, hour=9, exam_type="theory", location="Centre", expert_id=None, day=DAY):
+    return {
+        "id": exam_id,
+        "exam_type": exam_type,
+        "location": location,
+        "scheduled_at": datetime(day.year, day.month, day.day, hour),
+        "external_expert_id": expert_id
+    }
+
+def test_keeps_current_expert_when_it_has_room():
+    plan = plan_exam_days(
+        [make_exam("e1", expert_id="b")],
+        [{"id": "a", "specialization": ["theory"]}, {"id": "b", "specialization": ["theory"]}],
+        [DAY]
+    )
+    assert plan["assignments"]["e1"][0] == "b"
+    assert plan["unassigned"] == []
+
+def test_spreads_exams_over_experts_within_daily_capacity():
+    exams = [make_exam(f"e{i}", hour=8 + i) for i in range(4)]
+    plan = plan_exam_days(
+        exams, [{"id": "a", "specialization": ["theory"]}, {"id": "b", "specialization": ["theory"]}], [DAY],
+        max_per_day=2
+    )
+    experts = [expert_id for expert_id, _ in plan["assignments"].values()]
+    assert sorted(experts) == ["a", "a", "b", "b"]
+
+def test_repair_moves_an_exam_to_free_a_specialist():
+    # "a" takes the earlier theory exam first; "c" is booked all day, so the road
+    # exam only fits once the theory exam moves to "b"
+    exams = [make_exam("theory", hour=8, expert_id="a"), make_exam("road", hour=10, exam_type="road")]
+    plan = plan_exam_days(
+        exams,
+        [
+            {"id": "a", "specialization": ["theory", "road"]},
+            {"id": "b", "specialization": ["theory"]},
+            {"id": "c", "specialization": ["road"]}
+        ],
+        [DAY], busy={("c", DAY): set(range(SLOTS_PER_DAY))}, max_per_day=1
+    )
+    assert plan["assignments"]["road"][0] == "a"
+    assert plan["assignments"]["theory"][0] == "b"
+    assert plan["repaired"] == 1
+
+def test_overflow_moves_to_the_nearest_day_then_gives_up():
+    exams = [make_exam(f"e{i}", hour=8 + i) for i in range(3)]
+    experts = [{"id": "a", "specialization": ["theory"]}]
+    plan = plan_exam_days(exams, experts, [DAY, NEXT_DAY], max_per_day=1)
+    days = sorted(scheduled_at.date() for _, scheduled_at in plan["assignments"].values())
+    assert days == [DAY, NEXT_DAY]
+    assert plan["moved_days"] == 1
+    assert len(plan["unassigned"]) == 1
+
+def test_exam_without_eligible_expert_is_unassigned():
+    plan = plan_exam_days([make_exam("e1", exam_type="road")], [{"id": "a", "specialization": ["theory"]}], [DAY])
+    assert plan["unassigned"] == ["e1"]
+
+def test_busy_slots_are_not_reused():
+    plan = plan_exam_days(
+        [make_exam("e1", hour=8)], [{"id": "a", "specialization": ["theory"]}], [DAY],
+        busy={("a", DAY): {0}}
+    )
+    assert plan["assignments"]["e1"] == ("a", slot_time(DAY, 1))
+
+def test_requested_times_are_kept_when_free():
+    exams = [make_exam("e1", hour=14), make_exam("e2", hour=11)]
+    exams[0]["scheduled_at"] = exams[0]["scheduled_at"].replace(minute=15)
+    plan = plan_exam_days(exams, [{"id": "a", "specialization": ["theory"]}], [DAY])
+    assert plan["assignments"]["e1"] == ("a", datetime(2026, 3, 2, 14, 15))
+    assert plan["assignments"]["e2"] == ("a", datetime(2026, 3, 2, 11))
+
+def test_clashing_request_gets_the_nearest_free_slot():
+    # Both ask for 11:00; one keeps it and the other takes the earlier of the two adjacent slots
+    plan = plan_exam_days(
+        [make_exam("e1", hour=11), make_exam("e2", hour=11)], [{"id": "a", "specialization": ["theory"]}], [DAY]
+    )
+    times = sorted(scheduled_at for _, scheduled_at in plan["assignments"].values())
+    assert times == [datetime(2026, 3, 2, 9, 30), datetime(2026, 3, 2, 11)]
@@ -0,0 +1,37 @@
+from datetime import datetime, date
+
+from session_slots import DAY_SLOT_COUNT, mark_busy_slots, free_slot_starts, expand_recurrence
+
+def test_free_day_offers_every_start_that_fits():
+    assert free_slot_starts(0, 1) == list(range(DAY_SLOT_COUNT))
+    assert free_slot_starts(0, 3) == list(range(DAY_SLOT_COUNT - 2))
+
+def test_starts_skip_busy_slots():
+    busy = 0b1100  # slots 2 and 3
+    assert free_slot_starts(busy, 2)[:3] == [0, 4, 5]
+    assert 1 not in free_slot_starts(busy, 2)
+
+def test_full_day_has_no_starts():
+    assert free_slot_starts((1 << DAY_SLOT_COUNT) - 1, 1) == []
+
+def test_busy_slots_round_outwards():
+    bitmaps = {}
+    # 09:15-10:15 touches the 09:00, 09:30 and 10:00 slots (indices 2-4 from 08:00)
+    mark_busy_slots(bitmaps, datetime(2026, 3, 2, 9, 15), datetime(2026, 3, 2, 10, 15))
+    assert bitmaps == {date(2026, 3, 2): 0b11100}
+
+def test_daily_recurrence():
+    first = datetime(2026, 3, 2, 10)
+    assert expand_recurrence(first, "daily", 2, None, 3) == [
+        datetime(2026, 3, 2, 10), datetime(2026, 3, 4, 10), datetime(2026, 3, 6, 10)
+    ]
+
+def test_weekly_recurrence_starts_at_first_and_keeps_weekday_order():
+    first = datetime(2026, 3, 4, 10)  # a Wednesday
+    assert expand_recurrence(first, "weekly", 1, [4, 0, 2], 4) == [
+        datetime(2026, 3, 4, 10), datetime(2026, 3, 6, 10), datetime(2026, 3, 9, 10), datetime(2026, 3, 11, 10)
+    ]
+
+def test_weekly_recurrence_defaults_to_weekday_of_first():
+    first = datetime(2026, 3, 4, 10)
+    assert expand_recurrence(first, "weekly", 2, None, 2) == [datetime(2026, 3, 4, 10), datetime(2026, 3, 18, 10)]
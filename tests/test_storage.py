@@ -0,0 +1,21 @@
+import pytest
+
+from storage import parse_range
+
+def test_explicit_range():
+    assert parse_range("bytes=0-99", 1000) == (0, 99)
+
+def test_open_range_runs_to_the_end():
+    assert parse_range("bytes=900-", 1000) == (900, 999)
+
+def test_end_past_size_is_clamped():
+    assert parse_range("bytes=900-5000", 1000) == (900, 999)
+
+def test_suffix_range():
+    assert parse_range("bytes=-100", 1000) == (900, 999)
+    assert parse_range("bytes=-5000", 1000) == (0, 999)
+
+@pytest.mark.parametrize("header", ["bytes=1000-", "bytes=50-10", "bytes=-", "bytes=0-1,5-9", "items=0-1"])
+def test_unsatisfiable_or_unsupported_ranges(header):
+    with pytest.raises(ValueError):
+        parse_range(header, 1000)